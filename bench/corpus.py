@@ -0,0 +1,118 @@
+import random
+
+# Deterministic synthetic literature shared by the mock server (which answers
+# queries from it) and the bibliography generator (which cites it)
+
+SYLLABLES = ['ka', 'ro', 'mi', 'ten', 'su', 'lo', 'var', 'ne', 'dis', 'qua', 'tor', 'pe',
+             'lin', 'ga', 'mo', 'rex', 'chi', 'ba', 'ul', 'fen', 'do', 'sta', 'ri', 'vo']
+SURNAMES = ['Smith', 'Wang', 'Garcia', 'Muller', 'Kim', 'Rossi', 'Silva', 'Nguyen', 'Ivanov',
+            'Tanaka', 'Cohen', 'Novak', 'Larsen', 'Okafor', 'Dubois', 'Kowalski', 'Haddad',
+            'Zhang', 'Patel', 'Jensen', 'Moreau', 'Sato', 'Fischer', 'Costa', 'Reyes']
+GIVEN = ['Anna', 'Wei', 'Luis', 'Sara', 'Jin', 'Marco', 'Ada', 'Tomas', 'Mei', 'Omar', 'Lena', 'Raj']
+VOCABULARY_SIZE = 2000
+ARXIV_FRACTION = 0.3
+# Share of title-only entries without an arXiv ID cited as conference papers
+PROCEEDINGS_FRACTION = 0.3
+CS_VENUES = ['NeurIPS', 'ICML', 'ICLR', 'CVPR', 'ACL', 'KDD']
+
+# Share of generated bibliography entries per kind
+ENTRY_MIX = (
+    ("doi", 0.35),
+    ("arxiv", 0.15),
+    ("title", 0.30),
+    ("wrong_year", 0.05),
+    ("fabricated", 0.15),
+)
+
+_vocabulary = None
+
+
+def vocabulary():
+    global _vocabulary
+    if _vocabulary is None:
+        rng = random.Random("vocabulary")
+        words = set()
+        while len(words) < VOCABULARY_SIZE:
+            words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+        _vocabulary = sorted(words)
+    return _vocabulary
+
+
+def make_title(rng):
+    words = rng.sample(vocabulary(), rng.randint(5, 10))
+    return ' '.join(w.capitalize() if i == 0 or rng.random() < 0.5 else w for i, w in enumerate(words))
+
+
+def make_paper(seed, i):
+    rng = random.Random(f"{seed}:{i}")
+    year = rng.randint(1995, 2024)
+    paper = {
+        "index": i,
+        "title": make_title(rng),
+        "authors": [(rng.choice(SURNAMES), rng.choice(GIVEN)) for _ in range(rng.randint(1, 5))],
+        "year": year,
+        "doi": f"10.5555/bench.{seed}.{i}",
+        "arxiv": None,
+    }
+    # New-style arXiv IDs carry five digits after the dot, which bounds how many get one
+    if i < 100000 and rng.random() < ARXIV_FRACTION:
+        paper["arxiv"] = f"{year % 100:02d}{rng.randint(1, 12):02d}.{i:05d}"
+    return paper
+
+
+def corpus(seed, size):
+    return [make_paper(seed, i) for i in range(size)]
+
+
+def bib_authors(authors):
+    return ' and '.join(f"{family}, {given}" for family, given in authors)
+
+
+def generate_entries(seed, count):
+    # Entry i cites paper i of the corpus (or a fabricated one), so a corpus
+    # of `count` papers on the server covers the whole bibliography
+    rng = random.Random(f"{seed}:bib")
+    kinds = [k for k, _ in ENTRY_MIX]
+    weights = [w for _, w in ENTRY_MIX]
+    entries = []
+    for i in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "fabricated":
+            fake = random.Random(f"{seed}:fake:{i}")
+            paper = {"title": make_title(fake), "authors": [(fake.choice(SURNAMES), fake.choice(GIVEN))],
+                     "year": fake.randint(1995, 2024), "doi": None, "arxiv": None}
+        else:
+            paper = make_paper(seed, i)
+        if kind == "arxiv" and not paper["arxiv"]:
+            kind = "title"
+
+        entry = {
+            "ENTRYTYPE": "article",
+            "ID": f"ref{i}",
+            "title": paper["title"],
+            "author": bib_authors(paper["authors"]),
+            "year": str(paper["year"] + (3 if kind == "wrong_year" else 0)),
+        }
+        if kind == "doi":
+            entry["doi"] = paper["doi"]
+        elif kind == "arxiv":
+            entry["eprint"] = paper["arxiv"]
+            entry["archiveprefix"] = "arXiv"
+        elif kind == "title" and paper["arxiv"]:
+            # As dblp exports preprints
+            entry["journal"] = "CoRR"
+            entry["volume"] = f"abs/{paper['arxiv']}"
+        elif kind == "title":
+            venue = random.Random(f"{seed}:venue:{i}")
+            if venue.random() < PROCEEDINGS_FRACTION:
+                entry["ENTRYTYPE"] = "inproceedings"
+                entry["booktitle"] = f"Proceedings of {venue.choice(CS_VENUES)} {paper['year']}"
+        entries.append(entry)
+    return entries
+
+
+def write_bib(entries, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            fields = [f"  {k} = {{{v}}}" for k, v in entry.items() if k not in ('ENTRYTYPE', 'ID')]
+            f.write(f"@{entry['ENTRYTYPE']}{{{entry['ID']},\n" + ",\n".join(fields) + "\n}\n\n")
@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import verifier
+from src.identifiers import extract_identifiers
+from src.local_index import LocalIndex, build_index
+from bench.corpus import corpus, generate_entries
+
+# Measures lookups per second against an offline index built from the
+# synthetic corpus, on one thread and without any network:
+#
+#   python -m bench.index_bench --records 50000 --queries 5000
+#
+# "title search" is LocalIndex.search alone, "DOI lookup" LocalIndex.by_doi,
+# and "local verify" the whole verify_with_local_index step per entry.
+
+
+def write_snapshot(papers, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for p in papers:
+            item = {"title": [p["title"]], "DOI": p["doi"], "issued": {"date-parts": [[p["year"]]]},
+                    "author": [{"family": family, "given": given} for family, given in p["authors"]]}
+            f.write(json.dumps(item) + "\n")
+
+
+def timed(label, queries, lookup):
+    started = time.perf_counter()
+    for q in queries:
+        lookup(q)
+    elapsed = time.perf_counter() - started
+    print(f"    {label:<14} {len(queries) / elapsed:9.0f} lookups/s  ({elapsed * 1e6 / len(queries):7.1f} µs each)")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark of offline index lookups")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--index", help="Reuse this index file instead of building one from the corpus")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.index
+        if not path:
+            snapshot = os.path.join(tmp, "crossref.jsonl")
+            path = os.path.join(tmp, "index.db")
+            write_snapshot(corpus(args.seed, args.records), snapshot)
+            build_index(path, crossref_paths=[snapshot])
+
+        rng = random.Random(args.seed)
+        entries = [e for e in generate_entries(args.seed, args.records)]
+        entries = [rng.choice(entries) for _ in range(args.queries)]
+        titles = [verifier.clean_title(e['title']) for e in entries]
+        dois = [e['doi'] for e in entries if 'doi' in e]
+
+        index = verifier.load_local_index(path)
+        print(f"[*] {index.stats()['records']} records, {args.queries} queries")
+        timed("title search", titles, index.search)
+        timed("DOI lookup", dois, index.by_doi)
+        timed("local verify", entries, lambda e: verifier.verify_with_local_index(
+            extract_identifiers(e), *verifier.entry_query(e)))
+        verifier.load_local_index(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote, urlencode
+from xml.sax.saxutils import escape
+
+from bench.corpus import corpus, vocabulary
+
+# Local stand-in for the Crossref, arXiv and Semantic Scholar APIs. Each API
+# gets its own port and answers on the same paths as the real service, from a
+# synthetic corpus, from recorded fixtures, or by recording real responses.
+
+SOURCES = ("crossref", "arxiv", "s2")
+UPSTREAMS = {
+    "crossref": "https://api.crossref.org",
+    "arxiv": "http://export.arxiv.org",
+    "s2": "https://api.semanticscholar.org",
+}
+# Path of each client-facing URL constant on its mock server
+API_PATHS = {
+    "CROSSREF_API_URL": ("crossref", "/works"),
+    "ARXIV_API_URL": ("arxiv", "/api/query"),
+    "SEMANTIC_SCHOLAR_API_URL": ("s2", "/graph/v1/paper/search"),
+    "SEMANTIC_SCHOLAR_BATCH_URL": ("s2", "/graph/v1/paper/batch"),
+}
+TOKEN_RE = re.compile(r'\w+')
+QUERY_WORDS = {'ti', 'au', 'all', 'and', 'or', 'andnot'}
+FORWARDED_HEADERS = ('Retry-After', 'X-Rate-Limit-Limit', 'X-Rate-Limit-Interval')
+OUTAGE_HANG = 120
+# With --rank-noise the best match is sometimes moved down to one of the next ranks
+RANK_NOISE_DEPTH = 3
+# Sizes of the metadata real records carry besides what the clients read
+REFERENCES = (15, 60)
+ABSTRACT_WORDS = (100, 250)
+# Fields Semantic Scholar returns when the request names none
+S2_DEFAULT_FIELDS = "title"
+
+
+class Scenario:
+    def __init__(self, args):
+        self.latency = args.latency / 1000
+        self.jitter = args.jitter / 1000
+        self.error_rate = args.error_rate
+        self.throttle_rate = args.throttle_rate
+        self.retry_after = args.retry_after
+        self.max_rps = args.max_rps
+        self.rank_noise = args.rank_noise
+        self.crossref_coverage = args.crossref_coverage
+        self.outages = dict(spec.partition(':')[::2] for spec in args.outage)
+        self.fixtures = args.fixtures
+        self.record = args.record
+        self.strict = args.strict
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.windows = defaultdict(list)
+        self.rng = random.Random(args.seed)
+
+        self.papers = corpus(args.seed, args.corpus_size)
+        self.by_doi = {p["doi"]: p for p in self.papers}
+        self.by_arxiv = {p["arxiv"]: p for p in self.papers if p["arxiv"]}
+        # arXiv papers that Crossref's search does not find, as with preprints and CS proceedings
+        self.not_in_crossref = {p["index"] for p in self.papers
+                                if p["arxiv"] and random.Random(f"{args.seed}:coverage:{p['index']}").random() >= self.crossref_coverage}
+        self.postings = defaultdict(list)
+        for p in self.papers:
+            for token in set(TOKEN_RE.findall(p["title"].lower())):
+                self.postings[token].append(p["index"])
+
+    def count(self, source, endpoint, status):
+        with self.lock:
+            self.counts[f"{source}.{endpoint}.{status}"] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+    def over_limit(self, source):
+        if not self.max_rps:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            window = [t for t in self.windows[source] if now - t < 1.0]
+            throttled = len(window) >= self.max_rps
+            if not throttled:
+                window.append(now)
+            self.windows[source] = window
+        return throttled
+
+    def fault(self, source):
+        # Returns the status of an injected failure, or None
+        if self.over_limit(source) or self.rng.random() < self.throttle_rate:
+            return 429
+        if self.rng.random() < self.error_rate:
+            return 500
+        return None
+
+    def search(self, text, limit, arxiv_only=False, skip=()):
+        hits = Counter()
+        for token in set(TOKEN_RE.findall(text.lower())) - QUERY_WORDS:
+            hits.update(self.postings.get(token, ()))
+        papers = []
+        wanted = max(limit, RANK_NOISE_DEPTH) if self.rank_noise else limit
+        for index, _ in hits.most_common():
+            paper = self.papers[index]
+            if (arxiv_only and not paper["arxiv"]) or index in skip:
+                continue
+            papers.append(paper)
+            if len(papers) >= wanted:
+                break
+        if len(papers) > 1 and self.rng.random() < self.rank_noise:
+            # Real search engines sometimes rank a similar paper above the cited one
+            papers.insert(self.rng.randint(1, min(len(papers), RANK_NOISE_DEPTH) - 1), papers.pop(0))
+        return papers[:limit]
+
+
+def words(rng, bounds):
+    return ' '.join(rng.choice(vocabulary()) for _ in range(rng.randint(*bounds)))
+
+
+@lru_cache(maxsize=None)
+def crossref_extras(doi, year):
+    # The rest of a full Crossref work record: references, funders, licenses, ...
+    rng = random.Random(f"crossref:{doi}")
+    return {
+        "abstract": f"<jats:p>{words(rng, ABSTRACT_WORDS)}</jats:p>",
+        "reference": [{"key": f"{doi}_ref{i}", "doi-asserted-by": "crossref", "DOI": f"10.5555/ref.{rng.randint(1, 10 ** 6)}",
+                       "unstructured": f"{words(rng, (2, 3)).title()} ({rng.randint(1990, year)}). {words(rng, (5, 10))}. "
+                                       f"{words(rng, (2, 4)).title()}, {rng.randint(1, 80)}, {rng.randint(1, 900)}-{rng.randint(901, 999)}."}
+                      for i in range(rng.randint(*REFERENCES))],
+        "funder": [{"DOI": f"10.13039/{rng.randint(10 ** 8, 10 ** 9)}", "name": f"{words(rng, (2, 4)).title()} Foundation",
+                    "doi-asserted-by": "publisher", "award": [str(rng.randint(10 ** 5, 10 ** 7))]}
+                   for _ in range(rng.randint(0, 3))],
+        "license": [{"start": {"date-parts": [[year, 1, 1]], "date-time": f"{year}-01-01T00:00:00Z", "timestamp": 0},
+                     "content-version": version, "delay-in-days": 0, "URL": "https://www.elsevier.com/tdm/userlicense/1.0/"}
+                    for version in ("tdm", "vor")],
+        "link": [{"URL": f"https://api.example.org/{doi}/{kind}", "content-type": kind, "content-version": "vor",
+                  "intended-application": "text-mining"} for kind in ("text/xml", "text/plain")],
+        "container-title": [f"Journal of {words(rng, (1, 3)).title()}"],
+        "publisher": f"{words(rng, (1, 2)).title()} Press",
+        "member": str(rng.randint(1, 30000)),
+        "ISSN": [f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"],
+        "subject": [words(rng, (1, 2)).title() for _ in range(3)],
+        "reference-count": 0,
+        "is-referenced-by-count": rng.randint(0, 5000),
+        "indexed": {"date-parts": [[2024, 1, 1]], "date-time": "2024-01-01T00:00:00Z", "timestamp": 1704067200000},
+        "deposited": {"date-parts": [[year, 6, 1]], "date-time": f"{year}-06-01T00:00:00Z", "timestamp": 0},
+        "score": 1.0,
+    }
+
+
+def selected(item, query):
+    # Crossref list queries return only the fields named by select=
+    if "select" not in query:
+        return item
+    fields = query["select"][0].split(",")
+    return {k: v for k, v in item.items() if k in fields}
+
+
+def crossref_item(paper, query=None):
+    item = {
+        "DOI": paper["doi"].upper(),
+        "title": [paper["title"]],
+        "author": [{"family": f, "given": g, "sequence": "additional", "affiliation": []} for f, g in paper["authors"]],
+        "issued": {"date-parts": [[paper["year"]]]},
+        "published": {"date-parts": [[paper["year"]]]},
+        "URL": f"https://doi.org/{paper['doi']}",
+        "type": "journal-article",
+    }
+    item.update(crossref_extras(paper["doi"], paper["year"]))
+    item["reference-count"] = len(item["reference"])
+    return selected(item, query or {})
+
+
+def arxiv_entry(paper):
+    rng = random.Random(f"arxiv:{paper['arxiv']}")
+    link = f"http://arxiv.org/abs/{paper['arxiv']}v1"
+    authors = ''.join(f"<author><name>{escape(g)} {escape(f)}</name>"
+                      f"<arxiv:affiliation>University of {escape(words(rng, (1, 2)).title())}</arxiv:affiliation></author>"
+                      for f, g in paper["authors"])
+    return (f"<entry><id>{link}</id>"
+            f"<updated>{paper['year']}-03-01T00:00:00Z</updated>"
+            f"<published>{paper['year']}-01-15T00:00:00Z</published>"
+            f"<title>{escape(paper['title'])}</title>"
+            f"<summary>{escape(words(rng, ABSTRACT_WORDS))}</summary>{authors}"
+            f"<arxiv:comment>{rng.randint(8, 40)} pages, {rng.randint(1, 12)} figures</arxiv:comment>"
+            f'<link href="{link}" rel="alternate" type="text/html"/>'
+            f'<link title="pdf" href="{link.replace("/abs/", "/pdf/")}" rel="related" type="application/pdf"/>'
+            f'<arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>'
+            f'<category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>'
+            f'<category term="stat.ML" scheme="http://arxiv.org/schemas/atom"/></entry>')
+
+
+def arxiv_feed(entries):
+    entries = list(entries)
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            '<link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>'
+            '<title type="html">ArXiv Query</title><id>http://arxiv.org/api/bench</id>'
+            '<updated>2024-01-01T00:00:00-05:00</updated>'
+            f'<opensearch:totalResults>{len(entries)}</opensearch:totalResults>'
+            '<opensearch:startIndex>0</opensearch:startIndex>'
+            f'<opensearch:itemsPerPage>{len(entries)}</opensearch:itemsPerPage>' + ''.join(entries) + '</feed>')
+
+
+def s2_item(paper, fields):
+    # Semantic Scholar always returns paperId, and otherwise only the fields asked for
+    rng = random.Random(f"s2:{paper['doi']}")
+    record = {
+        "paperId": hashlib.sha1(paper["doi"].encode()).hexdigest(),
+        "externalIds": {"DOI": paper["doi"], "CorpusId": paper["index"], "MAG": str(rng.randint(10 ** 9, 10 ** 10)),
+                        **({"ArXiv": paper["arxiv"]} if paper["arxiv"] else {})},
+        "url": f"https://www.semanticscholar.org/paper/{paper['index']}",
+        "title": paper["title"],
+        "abstract": words(rng, ABSTRACT_WORDS),
+        "venue": f"Journal of {words(rng, (1, 3)).title()}",
+        "year": paper["year"],
+        "referenceCount": rng.randint(15, 60),
+        "citationCount": rng.randint(0, 5000),
+        "influentialCitationCount": rng.randint(0, 100),
+        "isOpenAccess": rng.random() < 0.5,
+        "fieldsOfStudy": ["Computer Science"],
+        "publicationTypes": ["JournalArticle"],
+        "publicationDate": f"{paper['year']}-01-15",
+        "authors": [{"authorId": str(rng.randint(10 ** 6, 10 ** 8)), "name": f"{g} {f}"} for f, g in paper["authors"]],
+    }
+    return {k: v for k, v in record.items() if k == "paperId" or k in fields}
+
+
+def s2_fields(query):
+    return query.get("fields", [S2_DEFAULT_FIELDS])[0].split(",")
+
+
+def synthetic_response(scenario, source, method, path, query, body):
+    # Returns (endpoint, status, content type, body)
+    if source == "crossref" and path.startswith("/works/"):
+        paper = scenario.by_doi.get(path[len("/works/"):].lower())
+        if not paper:
+            return "doi", 404, "text/plain", "Resource not found."
+        return "doi", 200, "application/json", json.dumps({"status": "ok", "message": crossref_item(paper)})
+
+    if source == "crossref" and path == "/works":
+        rows = int(query.get("rows", ["20"])[0])
+        if "filter" in query:
+            items = []
+            if query.get("cursor", ["*"])[0] == "*":
+                dois = [d[4:].lower() for d in query["filter"][0].split(",") if d.startswith("doi:")]
+                items = [crossref_item(scenario.by_doi[d], query) for d in dois if d in scenario.by_doi][:rows]
+            message = {"items": items, "total-results": len(items), "next-cursor": "bench-next"}
+            return "doi_batch", 200, "application/json", json.dumps({"status": "ok", "message": message})
+        text = query.get("query.bibliographic", query.get("query", [""]))[0]
+        items = [crossref_item(p, query) for p in scenario.search(text, rows, skip=scenario.not_in_crossref)]
+        return "search", 200, "application/json", json.dumps({"status": "ok", "message": {"items": items}})
+
+    if source == "arxiv" and path == "/api/query":
+        if "id_list" in query:
+            ids = query["id_list"][0].split(",")
+            return "id_batch", 200, "application/atom+xml", arxiv_feed(
+                arxiv_entry(scenario.by_arxiv[i]) for i in ids if i in scenario.by_arxiv)
+        limit = int(query.get("max_results", ["10"])[0])
+        papers = scenario.search(query.get("search_query", [""])[0], limit, arxiv_only=True)
+        return "search", 200, "application/atom+xml", arxiv_feed(arxiv_entry(p) for p in papers)
+
+    if source == "s2" and path == "/graph/v1/paper/search":
+        limit = int(query.get("limit", ["10"])[0])
+        data = [s2_item(p, s2_fields(query)) for p in scenario.search(query.get("query", [""])[0], limit)]
+        return "search", 200, "application/json", json.dumps({"total": len(data), "data": data})
+
+    if source == "s2" and path == "/graph/v1/paper/batch" and method == "POST":
+        items = []
+        for s2_id in json.loads(body or b'{}').get("ids", []):
+            kind, _, value = s2_id.partition(":")
+            paper = None
+            if kind.upper() == "DOI":
+                paper = scenario.by_doi.get(value.lower())
+            elif kind.upper() == "ARXIV":
+                paper = scenario.by_arxiv.get(value)
+            items.append(s2_item(paper, s2_fields(query)) if paper else None)
+        return "batch", 200, "application/json", json.dumps(items)
+
+    return "unknown", 404, "text/plain", "Not found"
+
+
+def fixture_path(directory, source, method, path, query, body):
+    raw = f"{method} {path}?{urlencode(sorted(query.items()), doseq=True)}\n".encode() + (body or b'')
+    return os.path.join(directory, source, hashlib.sha1(raw).hexdigest() + ".json")
+
+
+def endpoint_name(source, path, query):
+    if source == "crossref":
+        return "doi" if path.startswith("/works/") else "doi_batch" if "filter" in query else "search"
+    if source == "arxiv":
+        return "id_batch" if "id_list" in query else "search"
+    return "batch" if path.endswith("/batch") else "search"
+
+
+def make_handler(scenario, source):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; with Nagle's algorithm the
+        # body waits for the client's delayed ACK, adding ~40 ms to every response
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, content_type, body, headers=None):
+            data = body.encode('utf-8') if isinstance(body, str) else body
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def handle_admin(self, path):
+            if path == "/__stats":
+                self.reply(200, "application/json", json.dumps(scenario.stats()))
+            else:
+                scenario.reset()
+                self.reply(200, "application/json", "{}")
+
+        def handle_api(self, method):
+            parts = urlsplit(self.path)
+            if parts.path in ("/__stats", "/__reset"):
+                return self.handle_admin(parts.path)
+            query = parse_qs(parts.query)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+
+            if scenario.record:
+                return self.forward(method, parts, query, body)
+
+            endpoint = endpoint_name(source, parts.path, query)
+            outage = scenario.outages.get(source)
+            if outage == "hang":
+                # Never answers within any client timeout
+                time.sleep(OUTAGE_HANG)
+            scenario.delay()
+            if outage is not None:
+                scenario.count(source, endpoint, 503)
+                return self.reply(503, "text/plain", "Service Unavailable")
+            status = scenario.fault(source)
+            if status == 429:
+                scenario.count(source, endpoint, 429)
+                return self.reply(429, "text/plain", "Too Many Requests", {"Retry-After": str(scenario.retry_after)})
+            if status:
+                scenario.count(source, endpoint, status)
+                return self.reply(status, "text/plain", "Internal Server Error")
+
+            if scenario.fixtures:
+                path = fixture_path(scenario.fixtures, source, method, parts.path, query, body)
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        fixture = json.load(f)
+                    scenario.count(source, endpoint, fixture["status"])
+                    return self.reply(fixture["status"], fixture["content_type"], fixture["body"], fixture["headers"])
+                if scenario.strict:
+                    scenario.count(source, endpoint, "missing")
+                    return self.reply(404, "text/plain", "No fixture recorded for this request")
+
+            endpoint, status, content_type, payload = synthetic_response(scenario, source, method, parts.path, query, body)
+            headers = {}
+            if source == "crossref" and scenario.max_rps:
+                headers = {"X-Rate-Limit-Limit": str(scenario.max_rps), "X-Rate-Limit-Interval": "1s"}
+            scenario.count(source, endpoint, status)
+            self.reply(status, content_type, payload, headers)
+
+        def forward(self, method, parts, query, body):
+            import requests
+
+            endpoint = endpoint_name(source, parts.path, query)
+            url = UPSTREAMS[source] + quote(parts.path, safe="/:@") + (f"?{parts.query}" if parts.query else "")
+            headers = {"User-Agent": self.headers.get("User-Agent", "CitationAIHLNCheck-bench")}
+            if body:
+                headers["Content-Type"] = "application/json"
+            try:
+                response = requests.request(method, url, data=body, headers=headers, timeout=60)
+            except requests.RequestException as e:
+                scenario.count(source, endpoint, "upstream_error")
+                return self.reply(502, "text/plain", str(e))
+
+            content_type = response.headers.get("Content-Type", "application/octet-stream")
+            kept = {k: response.headers[k] for k in FORWARDED_HEADERS if k in response.headers}
+            # Throttled and failed answers are passed through but never become fixtures
+            if response.status_code in (200, 404):
+                path = fixture_path(scenario.fixtures, source, method, parts.path, query, body)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump({"request": f"{method} {self.path}", "status": response.status_code,
+                               "content_type": content_type, "headers": kept, "body": response.text}, f)
+            scenario.count(source, endpoint, response.status_code)
+            self.reply(response.status_code, content_type, response.content, kept)
+
+        def do_GET(self):
+            self.handle_api("GET")
+
+        def do_POST(self):
+            self.handle_api("POST")
+
+    return Handler
+
+
+def start_servers(scenario, host="127.0.0.1", ports=None):
+    servers = {}
+    for source in SOURCES:
+        server = ThreadingHTTPServer((host, (ports or {}).get(source, 0)), make_handler(scenario, source))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[source] = server
+    return servers
+
+
+def base_urls(servers):
+    return {source: f"http://{s.server_address[0]}:{s.server_address[1]}" for source, s in servers.items()}
+
+
+def api_urls(bases):
+    return {name: bases[source] + path for name, (source, path) in API_PATHS.items()}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mock Crossref/arXiv/Semantic Scholar server for benchmarks")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic corpus (default: 1)")
+    parser.add_argument("--corpus-size", type=int, default=1000, help="Papers in the synthetic corpus (default: 1000)")
+    parser.add_argument("--latency", type=float, default=50, help="Mean response latency in ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=10, help="Standard deviation of the latency in ms (default: 10)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 (default: 1)")
+    parser.add_argument("--max-rps", type=float, default=0, help="Per-API request rate above which 429 is returned")
+    parser.add_argument("--rank-noise", type=float, default=0.0,
+                        help="Fraction of searches where the best match is not ranked first")
+    parser.add_argument("--crossref-coverage", type=float, default=1.0,
+                        help="Fraction of arXiv papers that Crossref search finds (default: 1)")
+    parser.add_argument("--outage", action="append", default=[], metavar="SOURCE[:hang]",
+                        help="Make one API fail every request with 503, or hang (repeatable, e.g. arxiv:hang)")
+    parser.add_argument("--fixtures", help="Directory of recorded responses to replay (or to record into)")
+    parser.add_argument("--record", action="store_true", help="Forward to the real APIs and save responses as fixtures")
+    parser.add_argument("--strict", action="store_true", help="Answer 404 for requests without a fixture instead of synthesizing")
+    parser.add_argument("--exit-on-eof", action="store_true", help="Stop when stdin closes (used by run_bench)")
+    for source in SOURCES:
+        parser.add_argument(f"--{source}-port", type=int, default=0, help=f"Port of the {source} stand-in (default: any)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.record and not args.fixtures:
+        sys.exit("[-] --record needs --fixtures DIR")
+    scenario = Scenario(args)
+    servers = start_servers(scenario, ports={s: getattr(args, f"{s}_port") for s in SOURCES})
+    # The first line tells a parent process where to point the clients
+    print(json.dumps(api_urls(base_urls(servers))), flush=True)
+    try:
+        if args.exit_on_eof:
+            # Goes away together with the benchmark process, even if that is killed
+            sys.stdin.read()
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
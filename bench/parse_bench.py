@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src import verifier
+from src.http_client import STREAM_CHUNK_SIZE
+from bench.corpus import corpus
+from bench.mock_server import arxiv_entry, arxiv_feed, crossref_item, s2_item
+
+# Measures the size and parse time of the responses the search clients read,
+# built by the mock server the way the real APIs answer, without any network:
+#
+#   python -m bench.parse_bench --responses 500
+#
+# Crossref pages are compared as whole records and with select=; arXiv feeds
+# with the element tree the parser used to build and with the streaming parser,
+# fed in the chunks the HTTP clients read.
+# Parse time includes json.loads / XML parsing but not scoring.
+
+ARXIV_NS = {'atom': 'http://www.w3.org/2005/Atom'}
+
+
+def tree_arxiv_feed(content):
+    entries = []
+    for entry in ET.fromstring(content).findall('atom:entry', ARXIV_NS):
+        published = entry.find('atom:published', ARXIV_NS)
+        entries.append({
+            "title": re.sub(r'\s+', ' ', entry.find('atom:title', ARXIV_NS).text.strip()),
+            "url": entry.find('atom:id', ARXIV_NS).text,
+            "authors": [a.find('atom:name', ARXIV_NS).text for a in entry.findall('atom:author', ARXIV_NS)],
+            "year": published.text[:4] if published is not None else None,
+        })
+    return entries
+
+
+def stream_arxiv_feed(content):
+    # In the pieces the HTTP clients hand over as the body arrives
+    chunks = (content[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(content), STREAM_CHUNK_SIZE))
+    return [verifier.arxiv_candidate(entry) for entry in verifier.parse_arxiv_feed(chunks)]
+
+
+def crossref_items(data):
+    return [((item.get('title') or [''])[0], item.get('author', []), verifier.extract_crossref_year(item))
+            for item in json.loads(data)['message']['items']]
+
+
+def pages(papers, count, size):
+    return [[papers[(i * size + j) % len(papers)] for j in range(size)] for i in range(count)]
+
+
+def timed(label, responses, parse, repeat, baseline=None):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for response in responses:
+            parse(response)
+    elapsed = (time.perf_counter() - started) / (repeat * len(responses))
+    size = sum(len(r) for r in responses) / len(responses)
+    line = f"    {label:<26} {size / 1024:7.1f} KB/response  {elapsed * 1e6:8.1f} µs/response"
+    if baseline:
+        line += f"  ({baseline / elapsed:.1f}x)"
+    print(line)
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark of response size and parsing")
+    parser.add_argument("--responses", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=verifier.SEARCH_CANDIDATES, help="Items per response")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    papers = corpus(args.seed, max(args.responses * args.rows, 1000))
+    preprints = [p for p in papers if p["arxiv"]]
+    select = {"select": [verifier.CROSSREF_SELECT]}
+    s2_fields = verifier.S2_SEARCH_FIELDS.split(',')
+
+    full = [json.dumps({"status": "ok", "message": {"items": [crossref_item(p) for p in page]}}).encode()
+            for page in pages(papers, args.responses, args.rows)]
+    trimmed = [json.dumps({"status": "ok", "message": {"items": [crossref_item(p, select) for p in page]}}).encode()
+               for page in pages(papers, args.responses, args.rows)]
+    feeds = [arxiv_feed(arxiv_entry(p) for p in page).encode() for page in pages(preprints, args.responses, args.rows)]
+    s2 = [json.dumps({"total": args.rows, "data": [s2_item(p, s2_fields) for p in page]}).encode()
+          for page in pages(papers, args.responses, args.rows)]
+
+    print(f"[*] {args.responses} responses x {args.rows} items")
+    print("[*] Crossref search")
+    whole = timed("whole records", full, crossref_items, args.repeat)
+    timed("selected fields", trimmed, crossref_items, args.repeat, whole)
+    print("[*] arXiv search")
+    tree = timed("element tree", feeds, tree_arxiv_feed, args.repeat)
+    timed("streaming", feeds, stream_arxiv_feed, args.repeat, tree)
+    print("[*] Semantic Scholar search")
+    timed("requested fields", s2, lambda data: json.loads(data)['data'], args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.request import urlopen, Request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main as cli
+from src import verifier
+from src.bib_parser import parse_bibtex_file
+from src.planner import RunPlan
+from src.metrics import METRICS
+from src import scheduler
+from src.rate_limiter import RATE_LIMITS, configure_rate_limit, host_of
+from bench.corpus import generate_entries, write_bib
+
+# Runs the verification pipeline against the local mock server and reports
+# throughput, per-entry latency percentiles and the requests each API received.
+#
+#   python -m bench.run_bench --entries 100 1000 10000 --latency 80
+#   python -m bench.run_bench --bib example.bib --record --fixtures bench/fixtures/example
+#   python -m bench.run_bench --bib example.bib --fixtures bench/fixtures/example --strict
+
+REAL_HOSTS = {
+    "CROSSREF_API_URL": "api.crossref.org",
+    "ARXIV_API_URL": "export.arxiv.org",
+    "SEMANTIC_SCHOLAR_API_URL": "api.semanticscholar.org",
+    "SEMANTIC_SCHOLAR_BATCH_URL": "api.semanticscholar.org",
+}
+UNLIMITED_RATE = (10000.0, 10000)
+SERVER_OPTIONS = ("latency", "jitter", "error_rate", "throttle_rate", "retry_after", "max_rps", "rank_noise",
+                  "crossref_coverage", "fixtures")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def start_mock_server(args, corpus_size):
+    command = [sys.executable, "-m", "bench.mock_server", "--exit-on-eof", "--seed", str(args.seed), "--corpus-size", str(corpus_size)]
+    for option in SERVER_OPTIONS:
+        value = getattr(args, option)
+        if value is not None:
+            command += [f"--{option.replace('_', '-')}", str(value)]
+    if args.record:
+        command.append("--record")
+    if args.strict:
+        command.append("--strict")
+    for outage in args.outage:
+        command += ["--outage", outage]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=root, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        sys.exit("[-] Mock server failed to start")
+    return process, json.loads(line)
+
+
+def point_clients_at(urls, limits):
+    for name, url in urls.items():
+        setattr(verifier, name, url)
+        rate, burst = RATE_LIMITS.get(REAL_HOSTS[name]) if limits == "real" else UNLIMITED_RATE
+        configure_rate_limit(host_of(url), rate, burst)
+
+
+def server_call(urls, path):
+    base = urls["CROSSREF_API_URL"].rsplit("/works", 1)[0]
+    with urlopen(Request(base + path, method="POST" if path == "/__reset" else "GET"), timeout=10) as response:
+        return json.loads(response.read())
+
+
+def instrument(latencies):
+    # Per-entry latency is measured around the verification call itself,
+    # so it includes rate limiter waits and retries but not queueing for a worker
+    original = verifier.verify_citation
+
+    def timed(entry):
+        started = time.perf_counter()
+        try:
+            return original(entry)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    cli.verify_citation = timed
+    if cli.ENGINE == "async":
+        from src import async_engine
+        original_async = async_engine.verify_citation_async
+
+        async def timed_async(client, entry):
+            started = time.perf_counter()
+            try:
+                return await original_async(client, entry)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+        async_engine.verify_citation_async = timed_async
+
+
+def run_once(bib_path, urls):
+    latencies = []
+    instrument(latencies)
+    server_call(urls, "/__reset")
+    METRICS.reset()
+    scheduler.SCHEDULER.reset()
+
+    started = time.perf_counter()
+    entries = parse_bibtex_file(bib_path)
+    parsed = time.perf_counter()
+    plan = RunPlan()
+    plan.add_file(bib_path, entries)
+    pending = plan.pending_entries()
+    if cli.PROCESSES > 1:
+        # Worker processes resolve their own shards
+        resolved = time.perf_counter()
+        cli.verify_entries(cli.entry_batches(pending), plan.record, Counter())
+    else:
+        verifier.resolve_identifiers(pending)
+        pending = scheduler.SCHEDULER.order_entries(pending)
+        resolved = time.perf_counter()
+        cli.verify_entries([pending], plan.record)
+    finished = time.perf_counter()
+
+    verdicts = Counter()
+    for file_plan in plan.files:
+        verdicts.update(r['status'] for r in file_plan.results if r is not None)
+        if file_plan.errors:
+            verdicts["exception"] += len(file_plan.errors)
+
+    requests_by_endpoint = server_call(urls, "/__stats")
+    sources = METRICS.summary()["sources"]
+    elapsed = finished - started
+    return {
+        "entries": len(entries),
+        "unique": len(pending),
+        "seconds": round(elapsed, 3),
+        "entries_per_sec": round(len(entries) / elapsed, 1) if elapsed else None,
+        "parse_seconds": round(parsed - started, 3),
+        "batch_resolve_seconds": round(resolved - parsed, 3),
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 1) for p in (50, 95, 99)},
+        "verdicts": dict(verdicts),
+        "requests": sum(requests_by_endpoint.values()),
+        "requests_by_endpoint": requests_by_endpoint,
+        "bytes": sum(m["bytes"] for m in sources.values()),
+        "sources": sources,
+    }
+
+
+def print_result(label, result):
+    latency = result["latency_ms"]
+    print(f"\n[+] {label}: {result['entries']} entries ({result['unique']} unique) in {result['seconds']:.2f}s"
+          f" = {result['entries_per_sec']} entries/s")
+    print(f"    latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms;"
+          f" parse {result['parse_seconds']}s, batch resolve {result['batch_resolve_seconds']}s")
+    print(f"    verdicts: {', '.join(f'{k} {v}' for k, v in sorted(result['verdicts'].items()))}")
+    by_endpoint = ', '.join(f"{k} {v}" for k, v in sorted(result['requests_by_endpoint'].items()))
+    print(f"    requests: {result['requests']} ({by_endpoint}), {cli.human_bytes(result['bytes'])} received")
+    cli.report_metrics()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark citation verification against a local mock of the APIs")
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000], help="Generated bibliography sizes (default: 1000)")
+    parser.add_argument("--bib", help="Benchmark an existing .bib file instead of generated ones")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the synthetic corpus and bibliographies")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per size; later runs reuse the cache (default: 1)")
+    parser.add_argument("--engine", choices=["threads", "async"], default=cli.ENGINE)
+    parser.add_argument("--workers", type=int, default=cli.MAX_WORKERS)
+    parser.add_argument("--concurrency", type=int, default=cli.CONCURRENCY)
+    parser.add_argument("--processes", type=int, default=cli.PROCESSES,
+                        help="Worker processes; per-entry latency is only measured with 1 (default: 1)")
+    parser.add_argument("--sources", choices=verifier.SOURCE_MODES, default=verifier.SOURCE_MODE)
+    parser.add_argument("--hedge-delay", type=float, default=verifier.HEDGE_DELAY)
+    parser.add_argument("--schedule", choices=scheduler.SCHEDULES, default=scheduler.SCHEDULE)
+    parser.add_argument("--full-records", action="store_true",
+                        help="Ask Crossref for whole work records instead of the fields the parsers read, for comparison")
+    parser.add_argument("--limits", choices=["unlimited", "real"], default="unlimited",
+                        help="Client rate limits: effectively off, or those of the real APIs (default: unlimited)")
+    parser.add_argument("--latency", type=float, help="Mean mock response latency in ms")
+    parser.add_argument("--jitter", type=float, help="Standard deviation of the mock latency in ms")
+    parser.add_argument("--error-rate", type=float, help="Fraction of mock responses that are 500")
+    parser.add_argument("--throttle-rate", type=float, help="Fraction of mock responses that are 429")
+    parser.add_argument("--retry-after", type=int, help="Retry-After seconds sent with 429")
+    parser.add_argument("--max-rps", type=float, help="Per-API rate above which the mock answers 429")
+    parser.add_argument("--rank-noise", type=float, help="Fraction of mock searches where the best match is not ranked first")
+    parser.add_argument("--crossref-coverage", type=float,
+                        help="Fraction of arXiv papers the mock Crossref search finds, as for preprints")
+    parser.add_argument("--outage", action="append", default=[], metavar="SOURCE[:hang]",
+                        help="Simulate a failing (503) or hanging API: crossref, arxiv or s2")
+    parser.add_argument("--entry-timeout", type=float, help="Per-entry lookup deadline in seconds")
+    parser.add_argument("--fixtures", help="Replay recorded responses from this directory")
+    parser.add_argument("--record", action="store_true", help="Record real API responses into --fixtures")
+    parser.add_argument("--strict", action="store_true", help="Fail requests that have no recorded fixture")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.record and not (args.fixtures and args.bib):
+        parser.error("--record needs --fixtures DIR and --bib FILE")
+    if args.record:
+        # Recording talks to the real services, so keep to their limits
+        args.limits = "real"
+
+    cli.ENGINE = args.engine
+    cli.MAX_WORKERS = args.workers
+    cli.CONCURRENCY = args.concurrency
+    cli.PROCESSES = args.processes
+    cli.METRICS_PATH = None
+    verifier.SOURCE_MODE = args.sources
+    verifier.HEDGE_DELAY = args.hedge_delay
+    verifier.ENTRY_DEADLINE = args.entry_timeout
+    scheduler.SCHEDULE = args.schedule
+    if args.full_records:
+        verifier.CROSSREF_SELECT = None
+
+    workdir = tempfile.mkdtemp(prefix="citation-bench-")
+    if args.bib:
+        jobs = [(args.bib, args.bib)]
+    else:
+        jobs = []
+        for size in args.entries:
+            path = os.path.join(workdir, f"bench_{size}.bib")
+            write_bib(generate_entries(args.seed, size), path)
+            jobs.append((f"{size} generated", path))
+
+    corpus_size = max(args.entries) if not args.bib else 1
+    process, urls = start_mock_server(args, corpus_size)
+    results = []
+    try:
+        point_clients_at(urls, args.limits)
+        print(f"[*] Mock APIs: {', '.join(urls.values())}")
+        print(f"[*] Engine: {args.engine} x {args.processes} process(es), sources: {args.sources}, client limits: {args.limits}")
+        for i, (label, path) in enumerate(jobs):
+            # Worker processes each open the cache, so they need one on disk to share
+            if args.processes > 1:
+                verifier.load_cache("sqlite", os.path.join(workdir, f"cache_{i}.db"))
+            else:
+                verifier.load_cache("memory")
+            for run in range(1, args.runs + 1):
+                result = run_once(path, urls)
+                result.update({"label": label, "run": run})
+                print_result(f"{label}, run {run}" + (" (warm cache)" if run > 1 else ""), result)
+                results.append(result)
+    finally:
+        process.terminate()
+        process.wait()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"\n[+] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
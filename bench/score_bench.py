@@ -0,0 +1,92 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rapidfuzz import fuzz
+from src import verifier
+from bench.corpus import corpus, generate_entries
+
+# Measures the CPU cost of scoring search candidates, without any network:
+#
+#   python -m bench.score_bench --entries 2000 --candidates 5
+#
+# "per pair" normalizes both sides again for every candidate, as the scorer
+# used to; "record per call" builds the entry's normalized record on each
+# call; "shared record" reuses one record per entry, as the sources do.
+
+
+def legacy_score(title, author, year, candidates):
+    best = None
+    for candidate in candidates:
+        similarity = fuzz.token_sort_ratio(verifier.clean_title(title).lower(), verifier.clean_title(candidate['title']).lower())
+        matched = True
+        if author:
+            surname = verifier.entry_surname(author).lower()
+            matched = False
+            for name in verifier.candidate_surnames(candidate['authors']):
+                if surname in name or name in surname or fuzz.partial_ratio(surname, name) > 85:
+                    matched = True
+                    break
+        y1 = re.search(r'\d{4}', str(year)) if year else None
+        y2 = re.search(r'\d{4}', str(candidate['year'])) if candidate['year'] else None
+        mismatch = bool(y1 and y2 and abs(int(y1.group()) - int(y2.group())) > 2)
+        final = 0 if (author and not matched) or mismatch else min(similarity + (15 if matched else 0), 100)
+        if best is None or (final, similarity) > (best['final_score'], best['score']):
+            best = dict(candidate, score=similarity, final_score=final)
+    return best
+
+
+def make_candidates(papers, entries, count, seed):
+    rng = random.Random(seed)
+    batches = []
+    for i in range(len(entries)):
+        picks = [papers[i % len(papers)]] + rng.sample(papers, count - 1)
+        rng.shuffle(picks)
+        batches.append([{"title": p["title"], "url": "", "doi": p["doi"], "source": "bench",
+                         "authors": [{"family": f, "given": g} for f, g in p["authors"]], "year": p["year"]}
+                        for p in picks])
+    return batches
+
+
+def timed(label, entries, batches, score, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry, candidates in zip(entries, batches):
+            score(entry, candidates)
+    elapsed = time.perf_counter() - started
+    pairs = repeat * sum(len(c) for c in batches)
+    print(f"    {label:<18} {elapsed * 1e6 / pairs:7.2f} µs/comparison  ({pairs} comparisons in {elapsed:.2f}s)")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark of candidate scoring")
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--candidates", type=int, default=verifier.SEARCH_CANDIDATES)
+    parser.add_argument("--sources", type=int, default=3, help="Sources scoring each entry (default: 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    papers = corpus(args.seed, args.entries)
+    entries = generate_entries(args.seed, args.entries)
+    batches = make_candidates(papers, entries, args.candidates, args.seed)
+
+    print(f"[*] {args.entries} entries x {args.candidates} candidates x {args.sources} sources")
+    legacy = timed("per pair", entries, batches,
+                   lambda e, c: legacy_score(e['title'], e['author'], e['year'], c), args.sources)
+    fresh = timed("record per call", entries, batches,
+                  lambda e, c: verifier.score_candidates(verifier.Citation(e['title'], e['author'], e['year']), c), args.sources)
+    verifier.citation_record.cache_clear()
+    shared = timed("shared record", entries, batches,
+                   lambda e, c: verifier.score_candidates(verifier.citation_record(e['title'], e['author'], e['year']), c), args.sources)
+    print(f"[+] Against the shared record, per-pair normalization takes {legacy / shared:.1f}x as long "
+          f"and a record per call {fresh / shared:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
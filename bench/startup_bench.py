@@ -0,0 +1,86 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Start-up time of the CLI for the tiny invocations a pre-commit hook makes.
+# Each command runs in a fresh interpreter from an empty directory; the bare
+# interpreter is measured too, since only the time above it is ours to cut.
+#
+#   python -m bench.startup_bench
+#   python -m bench.startup_bench --runs 20 --budget-ms 100
+#   python -m bench.startup_bench --importtime
+
+COMMANDS = {
+    "python": ["-c", "pass"],
+    "--version": [os.path.join(ROOT, "main.py"), "--version"],
+    "--help": [os.path.join(ROOT, "main.py"), "--help"],
+    "report --help": [os.path.join(ROOT, "main.py"), "report", "--help"],
+}
+BUDGET_MS = 100
+BUDGETED = ("--version",)
+
+
+def time_command(args, runs, cwd):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def slowest_imports(args, cwd, count=10):
+    # Cumulative import time per top-level module, from python -X importtime
+    result = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            name = parts[2].rstrip()
+            # Top-level imports are indented by a single space
+            if not name.startswith('  '):
+                modules.append((int(parts[1]) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure CLI start-up time")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS,
+                        help=f"Median allowed for {', '.join(BUDGETED)} (default: {BUDGET_MS})")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest imports of --help")
+    args = parser.parse_args(argv)
+
+    cwd = tempfile.mkdtemp(prefix="citation-startup-")
+    over_budget = []
+    print(f"[*] {args.runs} runs per command, from {cwd}")
+    for label, command in COMMANDS.items():
+        # One untimed run so every command starts with warm .pyc files and OS caches
+        time_command(command, 1, cwd)
+        timings = time_command(command, args.runs, cwd)
+        median = statistics.median(timings)
+        print(f"    {label:<15} median {median:6.1f} ms, min {min(timings):6.1f} ms")
+        if label in BUDGETED and median > args.budget_ms:
+            over_budget.append(label)
+
+    if args.importtime:
+        print("[*] Slowest imports of --help (cumulative):")
+        for ms, name in slowest_imports(COMMANDS["--help"], cwd):
+            print(f"    {name:<25} {ms:6.1f} ms")
+    if os.listdir(cwd):
+        print(f"[!] Start-up created files: {', '.join(sorted(os.listdir(cwd)))}")
+    if over_budget:
+        print(f"[-] Over the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    print(f"[+] Within the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
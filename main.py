@@ -1,126 +1,525 @@
 import os
 import sys
-import time
-import glob
+import json
 import argparse
-from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from src.bib_parser import parse_bibtex_file
-from src.verifier import verify_citation
+import threading
+from collections import Counter
+from functools import partial
+
+VERSION = "1.0.0"
+
+# Answered before the src modules load, so a hook asking for the version
+# does not pay for importing the verifier
+if __name__ == "__main__" and sys.argv[1:] == ["--version"]:
+    print(f"{os.path.basename(sys.argv[0])} {VERSION}")
+    sys.exit(0)
+
+from src.bib_parser import iter_bibtex_file
+from src import verifier
+from src.verifier import verify_citation, load_cache, save_cache, resolve_identifiers
+from src.cache import BACKENDS, MAX_ENTRIES, HIT, SHARED_KINDS, DAY
+from src.rate_limiter import configure_rate_limit, parse_rate_spec
+from src.manifest import Manifest, MANIFEST_FILE
+from src.planner import RunPlan, find_bib_files
+from src.local_index import LOCAL_INDEX_FILE, LocalIndex, build_index
+from src.metrics import METRICS, METRICS_FILE
+from src.circuit_breaker import configure_breakers, FAILURE_THRESHOLD, COOL_DOWN
+from src.report import REPORT_FORMATS, ResultStream, load_partial, render_reports, report_base
+from src.http_client import set_run_deadline
+from src.citations import ALL_KEYS, cited_keys
+from src import scheduler
 
 DEFAULT_INPUT_FILE = "input.bib"
 MAX_WORKERS = 5
+ENGINE = "threads"
+CONCURRENCY = 100
+# Worker processes for sharded verification; 1 verifies in this process
+PROCESSES = 1
+MANIFEST = None
+METRICS_PATH = METRICS_FILE
+PROMETHEUS_PATH = None
+REPORT_FORMATS_SELECTED = ["md"]
+RESUME = False
+# Citation keys of a LaTeX project (--cited); None verifies every entry
+CITED = None
+# New references are resolved and handed to the workers in groups of this size
+RESOLVE_BATCH = 200
+MAX_PARSE_WARNINGS = 5
 
-def process_file(file_path):
-    print(f"\n[*] Processing file: {file_path}")
-    
-    if not os.path.exists(file_path):
-        print(f"[-] File not found: {file_path}")
-        return
+def in_scope(entry):
+    return CITED is None or ALL_KEYS in CITED or entry.get('ID') in CITED
 
-    try:
-        entries = parse_bibtex_file(file_path)
-    except Exception as e:
-        print(f"[!] BibTeX parsing failed: {e}")
-        return
+def stream_entries(plan, file_paths):
+    # Parses the inputs entry by entry and yields each reference that still needs
+    # verifying, so lookups start while the rest of a large file is being read.
+    # With --cited only cited entries are planned, and each file's are held
+    # back until it is parsed so the newest (last in the file) go first.
+    from tqdm import tqdm
+    found_keys = set()
+    for file_path in file_paths:
+        tqdm.write(f"\n[*] Processing file: {file_path}")
+        if not os.path.exists(file_path):
+            tqdm.write(f"[-] File not found: {file_path}")
+            continue
+        resumed = load_partial(report_base(file_path) + ".jsonl") if RESUME else None
+        file_plan = plan.start_file(file_path)
+        file_plan.stream = ResultStream(file_path, file_plan.entries)
+        malformed = []
+        held = []
+        not_cited = 0
 
-    if not entries:
-        print(f"[-] No valid BibTeX entries found in {file_path}.")
-        return
+        def on_error(line, message):
+            malformed.append(line)
+            if len(malformed) <= MAX_PARSE_WARNINGS:
+                tqdm.write(f"[!] Skipping malformed entry at {file_path}:{line}: {message}")
 
-    print(f"[+] Found {len(entries)} entries. Verifying in parallel...")
-    
-    results = []
-    valid_count = 0
-    uncertain_count = 0
-    failed_count = 0
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_entry = {executor.submit(verify_citation, entry): entry for entry in entries}
-        
-        for future in tqdm(as_completed(future_to_entry), total=len(entries), desc="Verifying", unit="entry"):
-            entry = future_to_entry[future]
-            try:
-                verification = future.result()
-                results.append((entry, verification))
-                status = verification['status']
-                if status == 'valid':
-                    valid_count += 1
-                elif status == 'uncertain':
-                    uncertain_count += 1
+        try:
+            for entry in iter_bibtex_file(file_path, on_error=on_error):
+                if not in_scope(entry):
+                    not_cited += 1
+                    continue
+                found_keys.add(entry.get('ID'))
+                pending = plan.add_entry(file_plan, entry, resumed)
+                if pending is None:
+                    continue
+                if CITED is None:
+                    yield pending
                 else:
-                    failed_count += 1
-            except Exception as exc:
-                print(f"[!] Error verifying entry {entry.get('ID', 'unknown')}: {exc}")
-                failed_count += 1
-    
-    # Generate Report
-    report_file = f"{file_path}_report.md"
-    with open(report_file, 'w', encoding='utf-8') as f:
-        f.write(f"# Verification Report: {os.path.basename(file_path)}\n\n")
-        f.write(f"**Processed at**: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
-        f.write("## Detailed Results\n\n")
-        for entry, result in results:
-            entry_id = entry.get('ID', 'Unknown')
-            title = entry.get('title', 'No Title').replace('{', '').replace('}', '')
-            status = result['status']
-            
-            if status == 'valid':
-                symbol = "✅ [PASSED]"
-            elif status == 'uncertain':
-                symbol = "⚠️ [DOUBTFUL]"
-            else:
-                symbol = "❌ [NOT FOUND]"
-                
-            f.write(f"### {symbol} ID: {entry_id}\n")
-            f.write(f"- **Original Title**: {title}\n")
-            
-            if status == 'valid':
-                f.write(f"- **Matched Title**: {result.get('title', '')}\n")
-                f.write(f"- **Similarity**: {result.get('score', 0):.2f}%\n")
-                f.write(f"- **Link**: {result.get('url', '')}\n")
-                f.write(f"- **Source**: {result.get('source', '')}\n")
-            elif status == 'uncertain':
-                f.write(f"- **Reason**: {result.get('reason', '')}\n")
-                f.write(f"- **Source**: {result.get('source', '')}\n")
+                    held.append(pending)
+        except OSError as e:
+            tqdm.write(f"[!] BibTeX parsing failed for {file_path}: {e}")
+        yield from reversed(held)
+        if len(malformed) > MAX_PARSE_WARNINGS:
+            tqdm.write(f"[!] {len(malformed)} malformed entries skipped in {file_path}")
+
+        if not file_plan.entries:
+            if not_cited:
+                tqdm.write(f"[-] None of the {not_cited} entries in {file_path} are cited.")
             else:
-                f.write(f"- **Reason**: {result.get('reason', 'No match found above threshold')}\n")
-            
-            f.write("\n---\n\n")
+                tqdm.write(f"[-] No valid BibTeX entries found in {file_path}.")
+            file_plan.stream.discard()
+            plan.drop_file(file_plan)
+            continue
+        reused = f", {file_plan.reused} unchanged reused from {MANIFEST.path}" if file_plan.reused else ""
+        if file_plan.resumed:
+            reused += f", {file_plan.resumed} resumed from {file_plan.stream.path}"
+        cited = f" cited ({not_cited} not cited skipped)" if not_cited else ""
+        tqdm.write(f"[+] Found {len(file_plan.entries)} entries{cited}{reused}.")
+
+    if CITED is not None:
+        missing = [k for k in CITED if k != ALL_KEYS and k not in found_keys]
+        if missing:
+            shown = ', '.join(missing[:10]) + (', ...' if len(missing) > 10 else '')
+            tqdm.write(f"[!] {len(missing)} cited key(s) not found in any .bib file: {shown}")
+
+def entry_batches(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= RESOLVE_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def resolved_batches(entries, totals):
+    # Groups references so their DOIs and arXiv IDs are still resolved with batch
+    # requests, then hands each group over cheapest first
+    for batch in entry_batches(entries):
+        totals.update(resolve_identifiers(batch))
+        yield scheduler.SCHEDULER.order_entries(batch)
 
-        f.write(f"## Summary\n")
-        f.write(f"- **Total**: {len(entries)}\n")
-        f.write(f"- **Passed**: {valid_count}\n")
-        f.write(f"- **Doubtful**: {uncertain_count}\n")
-        f.write(f"- **Not Found**: {failed_count}\n")
+def verify_entries(batches, record, totals=None):
+    # batches: lists of entries, possibly still being produced by the parser.
+    # With several processes the workers resolve identifiers themselves and
+    # add their counts to totals.
+    from tqdm import tqdm
+    lock = threading.Lock()
+    with tqdm(total=0, desc="Verifying", unit="entry") as pbar:
+        def grow(batch):
+            with lock:
+                pbar.total += len(batch)
+                pbar.refresh()
+            return batch
+
+        def on_result(entry, verification, exc):
+            with lock:
+                record(entry, verification, exc)
+                pbar.update(1)
+
+        batches = (grow(batch) for batch in batches)
+        if PROCESSES > 1:
+            from src.sharding import verify_sharded, worker_settings
+            settings = worker_settings(ENGINE, MAX_WORKERS, CONCURRENCY)
+            verify_sharded(batches, PROCESSES, settings, on_result, totals if totals is not None else Counter())
+        elif ENGINE == "async":
+            from src.async_engine import verify_citation_batches
+            verify_citation_batches(batches, concurrency=CONCURRENCY, on_result=on_result)
+        else:
+            from concurrent.futures import ThreadPoolExecutor, wait
+
+            def done(future, entry):
+                if future.cancelled():
+                    return
+                try:
+                    on_result(entry, future.result(), None)
+                except Exception as exc:
+                    on_result(entry, None, exc)
+
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = []
+                try:
+                    for batch in batches:
+                        for entry in batch:
+                            future = executor.submit(verify_citation, entry)
+                            future.add_done_callback(partial(done, entry=entry))
+                            futures.append(future)
+                    wait(futures)
+                except KeyboardInterrupt:
+                    # Only wait for the lookups already running, not the whole queue
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+def write_report(file_plan):
+    file_path = file_plan.path
+    entries = file_plan.entries
+    stream = file_plan.stream
+    stream.close()
+
+    for i, exc in file_plan.errors.items():
+        print(f"[!] Error verifying entry {entries[i].get('ID', 'unknown')}: {exc}")
+    counts = stream.summary()
+    reports = render_reports(stream.path, REPORT_FORMATS_SELECTED, counts=counts)
 
     # Console Summary
     print(f"\n{'-'*30}")
-    print(f"   VERIFICATION SUMMARY")
+    print(f"   VERIFICATION SUMMARY: {file_path}")
     print(f"{'-'*30}")
     print(f" Total Entries: {len(entries)}")
-    print(f" [✅] Passed:    {valid_count}")
-    print(f" [⚠️] Doubtful:  {uncertain_count}")
-    print(f" [❌] Not Found: {failed_count}")
+    print(f" [✅] Passed:    {counts['valid']}")
+    print(f" [⚠️] Doubtful:  {counts['uncertain']}")
+    if counts['unavailable']:
+        print(f" [🔌] Unchecked: {counts['unavailable']}")
+    print(f" [❌] Not Found: {counts['failed']}")
     print(f" {'-'*30}")
-    print(f" Report generated: {report_file}\n")
+    print(f" Report generated: {', '.join(reports + [stream.path])}\n")
+
+def human_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+def report_metrics():
+    summary = METRICS.summary()
+    if summary["sources"]:
+        print("[*] Requests by source:")
+    for name, m in summary["sources"].items():
+        latency = m["latency_seconds"]
+        line = f"    {name}: {m['requests']} requests"
+        if latency["p50"] is not None:
+            line += f", p50 <= {latency['p50']}s, p95 <= {latency['p95']}s"
+        if m["bytes"]:
+            line += f", {human_bytes(m['bytes'])} received"
+        if m["retries"]:
+            line += f", {m['retries']} retries"
+        if m["rate_limit_wait_seconds"]:
+            line += f", {m['rate_limit_wait_seconds']:.1f}s rate-limit wait"
+        if m["cache"]["hit_rate"] is not None:
+            line += f", cache hit rate {m['cache']['hit_rate']:.0%}"
+        if m["coalesced"]:
+            line += f", {m['coalesced']} coalesced"
+        if m["failures"]:
+            line += ", failed: " + ", ".join(f"{k} {v}" for k, v in m["failures"].items())
+        print(line)
+
+    searches = [m["searches"] for m in summary["sources"].values()]
+    made = sum(s["made"] for s in searches)
+    fixed = sum(s["fixed_order_min"] for s in searches)
+    if scheduler.SCHEDULE == scheduler.ADAPTIVE and fixed:
+        # Only outcomes this run saw are counted: what the fixed order would have
+        # done after a source that was never asked is not known
+        skipped = sum(s["skipped"] for s in searches)
+        extra = made - fixed + skipped
+        saved = f", {fixed - made} avoided" if fixed > made else ""
+        print(f"[*] Source scheduling: {made} search requests, against at least {fixed} in the fixed Crossref, "
+              f"arXiv, Semantic Scholar order ({skipped} of its requests skipped, {extra} made that it might "
+              f"not have needed{saved})")
+
+    for host, breaker in summary["circuit_breakers"].items():
+        if breaker["times_opened"]:
+            print(f"[!] {host} was skipped {breaker['times_opened']} time(s) after repeated failures "
+                  f"(now {breaker['state'].replace('_', '-')})")
+
+    if METRICS_PATH:
+        METRICS.write_json(METRICS_PATH)
+        print(f"[+] Metrics written to {METRICS_PATH}")
+    if PROMETHEUS_PATH:
+        METRICS.write_prometheus(PROMETHEUS_PATH)
+
+def run_files(file_paths):
+    plan = RunPlan(MANIFEST)
+    resolved = Counter()
+    entries = stream_entries(plan, file_paths)
+    if PROCESSES > 1:
+        print(f"[*] Verifying while parsing ({PROCESSES} processes, {ENGINE} engine)...")
+        batches = entry_batches(entries)
+    else:
+        print(f"[*] Verifying while parsing ({ENGINE} engine)...")
+        batches = resolved_batches(entries, resolved)
+    try:
+        verify_entries(batches, plan.record, resolved)
+    except KeyboardInterrupt:
+        save_cache()
+        for file_plan in plan.files:
+            file_plan.stream.close()
+        print("\n[!] Interrupted. Verdicts so far are kept in the _report.jsonl files; rerun with --resume to continue.")
+        sys.exit(130)
+
+    if not plan.files:
+        return
+    print(f"\n[+] {plan.entry_count} entries in {len(plan.files)} file(s); {plan.pending_count} needed checking, "
+          f"{len(plan.unique)} unique references.")
+    if any(resolved.values()):
+        print(f"[+] Resolved identifiers in bulk: {resolved['doi']} DOIs (Crossref), "
+              f"{resolved['arxiv']} arXiv IDs, {resolved['s2']} Semantic Scholar/PubMed IDs.")
+    save_cache()
+
+    for file_plan in plan.files:
+        METRICS.record_verdicts(r for _, r in file_plan.ordered_results())
+        if MANIFEST is not None:
+            MANIFEST.update(file_plan.path, file_plan.ordered_results(), replace=CITED is None)
+        write_report(file_plan)
+    if MANIFEST is not None:
+        MANIFEST.save()
+    report_metrics()
+
+def process_file(file_path):
+    run_files([file_path])
+
+def cache_command(argv):
+    from src.cache_share import PACK_FILE, export_pack, import_pack
+
+    parser = argparse.ArgumentParser(prog="main.py cache", description="Inspect, prune or share the verification cache")
+    parser.add_argument("action", choices=["stats", "prune", "export", "import"])
+    parser.add_argument("packs", nargs="*", metavar="PACK",
+                        help=f"export: pack file to write (default: {PACK_FILE}); import: pack files to merge")
+    parser.add_argument("--cache-backend", choices=sorted(BACKENDS), help="Cache storage backend (default: sqlite)")
+    parser.add_argument("--cache-file", help="Path of the cache database/file")
+    parser.add_argument("--max-entries", type=int, default=MAX_ENTRIES,
+                        help=f"Evict least recently used entries beyond this count (default: {MAX_ENTRIES})")
+    parser.add_argument("--hits-only", action="store_true", help="export: leave out negative (not found) results")
+    parser.add_argument("--max-age", type=float, metavar="DAYS", help="export: leave out lookups older than DAYS")
+    args = parser.parse_args(argv)
+    if args.action == "export" and len(args.packs) > 1:
+        parser.error("export writes a single pack")
+    if args.action == "import" and not args.packs:
+        parser.error("import needs at least one pack file")
+
+    cache = load_cache(args.cache_backend, args.cache_file)
+    if args.action == "prune":
+        removed = cache.prune(args.max_entries)
+        print(f"[+] Removed {removed['expired']} expired and evicted {removed['evicted']} least recently used entries.")
+    elif args.action == "export":
+        path = args.packs[0] if args.packs else PACK_FILE
+        kinds = (HIT,) if args.hits_only else SHARED_KINDS
+        max_age = args.max_age * DAY if args.max_age is not None else None
+        by_source = export_pack(cache, path, kinds, max_age)
+        print(f"[+] Exported {sum(by_source.values())} entries to {path} ({os.path.getsize(path)} bytes)"
+              + "".join(f"\n    {source}: {n}" for source, n in sorted(by_source.items())))
+        return
+    elif args.action == "import":
+        for path in args.packs:
+            try:
+                counts = import_pack(cache, path)
+            except (OSError, EOFError, ValueError) as e:
+                print(f"[-] Could not import {path}: {e}")
+                continue
+            print(f"[+] {path}: {counts['added']} added, {counts['updated']} updated, "
+                  f"{counts['kept']} kept (local copy as fresh), {counts['expired']} expired"
+                  + (f", {counts['invalid']} unreadable" if counts['invalid'] else ""))
+    print(json.dumps(cache.stats(), indent=2))
+    save_cache()
+
+def index_command(argv):
+    parser = argparse.ArgumentParser(prog="main.py index", description="Build or inspect the offline snapshot index")
+    parser.add_argument("action", choices=["build", "stats"])
+    parser.add_argument("--crossref", nargs="+", default=[], help="Crossref snapshot files or directories (.json/.jsonl, optionally .gz)")
+    parser.add_argument("--arxiv", nargs="+", default=[], help="arXiv metadata snapshot files (JSON Lines, optionally .gz)")
+    parser.add_argument("--output", default=LOCAL_INDEX_FILE, help=f"Path of the index database (default: {LOCAL_INDEX_FILE})")
+    args = parser.parse_args(argv)
+
+    if args.action == "build":
+        if not args.crossref and not args.arxiv:
+            parser.error("build needs at least one --crossref or --arxiv snapshot")
+        build_index(args.output, args.crossref, args.arxiv)
+    print(json.dumps(LocalIndex(args.output).stats(), indent=2))
+
+def parse_formats(value):
+    formats = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in REPORT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"unknown report format(s) {', '.join(unknown) or value!r}; choose from {', '.join(REPORT_FORMATS)}")
+    return formats
+
+def report_command(argv):
+    parser = argparse.ArgumentParser(prog="main.py report", description="Render reports from a JSON Lines verification report")
+    parser.add_argument("jsonl", nargs="+", help="_report.jsonl files written by a verification run")
+    parser.add_argument("--format", type=parse_formats, default=["md"], help=f"Comma-separated report formats: {', '.join(REPORT_FORMATS)} (default: md)")
+    args = parser.parse_args(argv)
+
+    for path in args.jsonl:
+        if not os.path.exists(path):
+            print(f"[-] File not found: {path}")
+            continue
+        print(f"[+] {path} -> {', '.join(render_reports(path, args.format))}")
+
+def add_lookup_options(parser):
+    parser.add_argument("--cache-backend", choices=sorted(BACKENDS), help="Cache storage backend (default: sqlite)")
+    parser.add_argument("--cache-file", help="Path of the cache database/file")
+    parser.add_argument("--cache-remote", metavar="URL",
+                        help="Shared cache to read through on local misses, e.g. http://cache-host:8377/cache")
+    parser.add_argument("--sources", choices=verifier.SOURCE_MODES, default=verifier.SOURCE_MODE,
+                        help="Query search sources one by one, all at once, or hedged (default: sequential)")
+    parser.add_argument("--hedge-delay", type=float, default=verifier.HEDGE_DELAY,
+                        help=f"Seconds before a hedged query starts the next source (default: {verifier.HEDGE_DELAY})")
+    parser.add_argument("--schedule", choices=scheduler.SCHEDULES, default=scheduler.SCHEDULE,
+                        help="Order entries and search sources by expected cost, learned during the run, "
+                             "or keep the file order and Crossref, arXiv, Semantic Scholar (default: adaptive)")
+    parser.add_argument("--rate", action="append", default=[], metavar="HOST=RPS[:BURST]",
+                        help="Override the request rate for an API host, e.g. api.crossref.org=20:40")
+    parser.add_argument("--index", help="Offline snapshot index to consult before the online APIs (see 'main.py index build')")
+    parser.add_argument("--offline", action="store_true", help="Verify against the local index only, without any network requests")
+    parser.add_argument("--entry-timeout", type=float, help="Seconds one entry may spend on lookups before the rest are skipped")
+    parser.add_argument("--breaker-threshold", type=int, default=FAILURE_THRESHOLD,
+                        help=f"Consecutive failures after which a source is skipped for a while (default: {FAILURE_THRESHOLD})")
+    parser.add_argument("--breaker-cooldown", type=float, default=COOL_DOWN,
+                        help=f"Seconds to skip a failing source before probing it again (default: {COOL_DOWN:.0f})")
+
+def apply_lookup_options(parser, args):
+    verifier.SOURCE_MODE = args.sources
+    verifier.HEDGE_DELAY = args.hedge_delay
+    verifier.ENTRY_DEADLINE = args.entry_timeout
+    scheduler.SCHEDULE = args.schedule
+    configure_breakers(args.breaker_threshold, args.breaker_cooldown)
+    for spec in args.rate:
+        try:
+            configure_rate_limit(*parse_rate_spec(spec))
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.cache_backend or args.cache_file or args.cache_remote:
+        load_cache(args.cache_backend, args.cache_file, args.cache_remote)
+    if args.cache_remote:
+        print(f"[*] Reading through the shared cache at {args.cache_remote}")
+
+    if args.offline and not args.index and os.path.exists(LOCAL_INDEX_FILE):
+        args.index = LOCAL_INDEX_FILE
+    if args.offline and not args.index:
+        parser.error("--offline needs a local index (--index PATH)")
+    if args.index:
+        try:
+            verifier.load_local_index(args.index)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(str(e))
+        verifier.OFFLINE = args.offline
+        print(f"[*] Using local index {args.index}{' (offline)' if args.offline else ''}")
+
+def serve_command(argv):
+    from src.server import serve, DEFAULT_HOST, DEFAULT_PORT
+
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Run a local verification service over HTTP/JSON")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"Parallel verification workers (default: {MAX_WORKERS})")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    add_lookup_options(parser)
+    args = parser.parse_args(argv)
+
+    apply_lookup_options(parser, args)
+    serve(args.host, args.port, args.socket, args.workers, args.verbose)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        cache_command(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        index_command(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "report":
+        report_command(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_command(sys.argv[2:])
+        sys.exit(0)
+
     parser = argparse.ArgumentParser(description="Citation Accuracy Checker")
-    parser.add_argument("input", nargs="?", help="Input .bib file (default: scan current dir)")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {VERSION}")
+    parser.add_argument("input", nargs="*", help="Input .bib files or directories (default: scan current dir)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Scan directories recursively for .bib files")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"Parallel verification workers (default: {MAX_WORKERS})")
+    parser.add_argument("--engine", choices=["threads", "async"], default=ENGINE,
+                        help="Verification engine: thread pool or asyncio with pooled connections (default: threads)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help=f"In-flight entries for the async engine (default: {CONCURRENCY})")
+    parser.add_argument("--processes", type=int, default=PROCESSES,
+                        help="Shard the references across this many worker processes, each with its own workers (default: 1)")
+    parser.add_argument("--full", action="store_true", help="Re-verify every entry, ignoring the manifest of previous verdicts")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help=f"Manifest of previous verdicts (default: {MANIFEST_FILE})")
+    parser.add_argument("--format", type=parse_formats, default=REPORT_FORMATS_SELECTED,
+                        help=f"Comma-separated report formats rendered from the JSON Lines report: {', '.join(REPORT_FORMATS)} (default: md)")
+    parser.add_argument("--resume", action="store_true", help="Keep verdicts from an interrupted run's _report.jsonl for unchanged entries")
+    parser.add_argument("--cited", nargs="+", metavar="PATH",
+                        help="Only verify entries cited by these LaTeX sources: .tex files, project directories, .aux or .bcf files")
+    parser.add_argument("--deadline", type=float, help="Seconds for the whole run; entries not checked in time are reported as unchecked")
+    add_lookup_options(parser)
+    parser.add_argument("--metrics", default=METRICS_FILE, help=f"JSON file for per-source request metrics (default: {METRICS_FILE})")
+    parser.add_argument("--prometheus", help="Also write the metrics in Prometheus text format to this file")
     args = parser.parse_args()
 
-    if args.input:
-        process_file(args.input)
+    MAX_WORKERS = args.workers
+    ENGINE = args.engine
+    CONCURRENCY = args.concurrency
+    PROCESSES = args.processes
+    METRICS_PATH = args.metrics
+    PROMETHEUS_PATH = args.prometheus
+    REPORT_FORMATS_SELECTED = args.format
+    RESUME = args.resume
+    set_run_deadline(args.deadline)
+    apply_lookup_options(parser, args)
+    if PROCESSES < 1:
+        parser.error("--processes must be at least 1")
+    if PROCESSES > 1 and verifier.get_cache().name != "sqlite":
+        parser.error(f"--processes needs the sqlite cache backend; the {verifier.get_cache().name} cache "
+                     "cannot be shared between processes")
+
+    # --full still records fresh verdicts so the next incremental run can use them
+    MANIFEST = Manifest(args.manifest, reuse=not args.full)
+
+    inputs = args.input
+    if args.cited:
+        CITED, sources, bibliographies = cited_keys(args.cited)
+        if not sources:
+            parser.error("--cited found no .tex, .aux or .bcf files to read")
+        print(f"[*] Citation scope: {len(CITED)} key(s) cited in {len(sources)} file(s)"
+              + (" (\\nocite{*}: all entries)" if ALL_KEYS in CITED else ""))
+        if not inputs:
+            # The bibliographies the project names, or else the .bib files next to its sources
+            inputs = [b for b in bibliographies if os.path.exists(b)]
+            if not inputs:
+                inputs = [p for p in args.cited if os.path.isdir(p)]
+                args.recursive = True
+
+    bib_files = find_bib_files(inputs, recursive=args.recursive)
+    if not bib_files and not inputs:
+        print("[-] No .bib files found in current directory.")
+        # Create default if empty
+        with open(DEFAULT_INPUT_FILE, 'w', encoding='utf-8') as f:
+            f.write("% Paste your BibTeX content here\n")
+        print(f"[+] Created {DEFAULT_INPUT_FILE} for you.")
+    elif not bib_files:
+        print("[-] No .bib files found.")
     else:
-        bib_files = glob.glob("*.bib")
-        if not bib_files:
-            print("[-] No .bib files found in current directory.")
-            # Create default if empty
-            with open(DEFAULT_INPUT_FILE, 'w', encoding='utf-8') as f:
-                f.write("% Paste your BibTeX content here\n")
-            print(f"[+] Created {DEFAULT_INPUT_FILE} for you.")
-        else:
-            for bib_file in bib_files:
-                process_file(bib_file)
+        run_files(bib_files)
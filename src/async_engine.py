@@ -0,0 +1,246 @@
+import asyncio
+import time
+from src import verifier
+from src.verifier import (
+    Flight, Request, Pause, Join, SourceRace, SEARCH_SOURCES, coalesced_outcome, cache_lookup, search_steps,
+    verification_steps,
+)
+from src.http_client import MAX_RETRIES, STREAM_CHUNK_SIZE, DeadlineExceeded, request_budget, observe_health, time_left
+from src.rate_limiter import get_bucket, observe_response, backoff_delay, host_of
+from src.metrics import METRICS, DEADLINE, lookup_failed
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+DEFAULT_CONCURRENCY = 100
+CONNECTIONS_PER_HOST = 20
+
+
+class AsyncHttpClient:
+    def __init__(self, connections_per_host=CONNECTIONS_PER_HOST):
+        if aiohttp is None:
+            raise RuntimeError("The async engine requires aiohttp (pip install aiohttp)")
+        self.connections_per_host = connections_per_host
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.connections_per_host, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def get(self, url, params=None, headers=None, timeout=20, max_retries=MAX_RETRIES, source=None):
+        return await self.request("GET", url, params=params, headers=headers, timeout=timeout,
+                                  max_retries=max_retries, source=source)
+
+    async def post(self, url, json=None, params=None, headers=None, timeout=20, max_retries=MAX_RETRIES, source=None):
+        return await self.request("POST", url, params=params, headers=headers, json=json,
+                                  timeout=timeout, max_retries=max_retries, source=source)
+
+    async def request(self, method, url, params=None, headers=None, json=None, timeout=20, max_retries=MAX_RETRIES,
+                      source=None, on_chunk=None):
+        # Same contract as http_client.http_request, but waits on the shared
+        # token bucket with asyncio.sleep instead of blocking a thread. A 200
+        # body given to on_chunk is returned as None.
+        if params:
+            params = {k: str(v) for k, v in params.items()}
+        source = source or host_of(url)
+        bucket = get_bucket(url)
+        for attempt in range(max_retries + 1):
+            request_timeout, clamped = request_budget(url, timeout)
+            wait = bucket.reserve()
+            left = time_left()
+            if left is not None and wait > left:
+                bucket.refund()
+                raise DeadlineExceeded(url)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                METRICS.record_wait(source, wait)
+            started = time.monotonic()
+            try:
+                async with self._session.request(method, url, params=params, headers=headers, json=json,
+                                                 timeout=aiohttp.ClientTimeout(total=request_timeout)) as response:
+                    status = response.status
+                    retry_after = observe_response(url, status, response.headers)
+                    if on_chunk is not None and status == 200:
+                        body = None
+                        received = 0
+                        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                            received += len(chunk)
+                            on_chunk(chunk)
+                    else:
+                        body = await response.read()
+                        received = len(body)
+            except asyncio.TimeoutError as e:
+                # A source that cannot answer within the entry's budget still counts against its breaker
+                observe_health(url, exc=e)
+                if clamped:
+                    raise DeadlineExceeded(url) from e
+                METRICS.record_exception(source, e)
+                raise
+            except Exception as e:
+                METRICS.record_exception(source, e)
+                observe_health(url, exc=e)
+                raise
+            METRICS.record_request(source, status, time.monotonic() - started, received)
+            observe_health(url, status)
+            if status not in (429, 503) or attempt == max_retries:
+                return status, body
+
+            METRICS.record_retry(source)
+            wait = backoff_delay(attempt, retry_after)
+            print(f" [!] {host_of(url)} rate limited ({status}), waiting {wait:.1f}s...")
+            bucket.block_for(wait)
+        return status, body
+
+
+# Lookups in flight on this event loop, the asyncio counterpart of verifier.join_flight
+_flights = {}
+
+
+async def cache_lookup_async(source, cache_key, legacy_key=None):
+    # A remote cache tier may answer a local miss over the network; keep the loop free meanwhile
+    if getattr(verifier.get_cache(), 'remote', None):
+        return await asyncio.to_thread(cache_lookup, source, cache_key, legacy_key)
+    return cache_lookup(source, cache_key, legacy_key)
+
+
+async def join_flight_async(source, cache_key, legacy_key=None):
+    found, cached = await cache_lookup_async(source, cache_key, legacy_key)
+    if found:
+        return Flight(cache_key, True, cached)
+    while True:
+        leader = _flights.get(cache_key)
+        if leader is None:
+            flight = Flight(cache_key)
+            flight.event = _flights[cache_key] = asyncio.Event()
+            flight.registry = _flights
+            return flight
+        METRICS.record_coalesced(source)
+        remaining = time_left()
+        try:
+            await asyncio.wait_for(leader.wait(), None if remaining is None else max(remaining, 0))
+        except asyncio.TimeoutError:
+            return Flight(cache_key, True, lookup_failed(source, DEADLINE))
+        flight = coalesced_outcome(source, cache_key)
+        if flight is not None:
+            return flight
+
+
+async def answer_step_async(client, step):
+    if isinstance(step, Request):
+        return await client.request(step.method, step.url, params=step.params, headers=step.headers, json=step.json,
+                                    timeout=step.timeout, source=step.source, on_chunk=step.on_chunk)
+    if isinstance(step, Pause):
+        return await asyncio.sleep(step.seconds)
+    if isinstance(step, Join):
+        return await join_flight_async(step.source, step.key, step.legacy_key)
+    return await run_race_async(client, step.lookups, step.mode)
+
+
+async def run_steps_async(client, steps):
+    # verifier.run_steps on the event loop; a cancelled task has the
+    # CancelledError thrown into the steps too, so their flights still land
+    reply = error = None
+    while True:
+        try:
+            step = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        try:
+            reply = await answer_step_async(client, step)
+        except BaseException as e:
+            error = e
+
+
+async def run_race_async(client, lookups, mode):
+    # verifier.run_race with tasks; losing lookups are cancelled outright
+    def launch(i):
+        tasks[asyncio.ensure_future(run_steps_async(client, lookups[i]))] = i
+
+    race = SourceRace(len(lookups), mode)
+    tasks = {}
+    for i in range(race.launched):
+        launch(i)
+
+    try:
+        while True:
+            outcome = race.outcome()
+            if outcome is not None:
+                return outcome
+
+            cutoff = race.cut_off()
+            if cutoff is not None:
+                for task, i in tasks.items():
+                    if i > cutoff:
+                        task.cancel()
+
+            running = [t for t, i in tasks.items() if i in race.pending]
+            done = set()
+            if running:
+                done, _ = await asyncio.wait(running, timeout=race.timeout(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                race.answered(tasks[task], None if task.cancelled() or task.exception() else task.result())
+
+            hedge = race.hedge([tasks[t] for t in done])
+            if hedge is not None:
+                launch(hedge)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def search_sources_async(client, clean_t, author, year, sources=None, mode=None):
+    sources = sources or SEARCH_SOURCES
+    return await run_steps_async(client, search_steps([search(clean_t, author, year) for search in sources], mode))
+
+
+async def verify_citation_async(client, entry):
+    return await run_steps_async(client, verification_steps(entry))
+
+
+async def verify_batches_async(batches, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    # batches is a (blocking) iterator of entry lists, e.g. a parser still reading
+    # the file; it is advanced in a worker thread so lookups already started keep going
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    batches = iter(batches)
+    results = []
+
+    async with AsyncHttpClient() as client:
+        async def run(entry):
+            async with semaphore:
+                try:
+                    outcome = entry, await verify_citation_async(client, entry), None
+                except Exception as exc:
+                    outcome = entry, None, exc
+            if on_result:
+                on_result(*outcome)
+            results.append(outcome)
+
+        tasks = []
+        while True:
+            batch = await loop.run_in_executor(None, next, batches, None)
+            if batch is None:
+                break
+            tasks.extend(asyncio.ensure_future(run(entry)) for entry in batch)
+        await asyncio.gather(*tasks)
+    return results
+
+
+async def verify_entries_async(entries, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    return await verify_batches_async([entries], concurrency, on_result)
+
+
+def verify_citations(entries, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    # Blocking entry point for callers that are not running an event loop
+    return asyncio.run(verify_entries_async(entries, concurrency, on_result))
+
+
+def verify_citation_batches(batches, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    return asyncio.run(verify_batches_async(batches, concurrency, on_result))
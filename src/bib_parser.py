@@ -1,16 +1,206 @@
-import bibtexparser
-from bibtexparser.bparser import BibTexParser
-from bibtexparser.customization import convert_to_unicode
+import io
+import re
+from src.identifiers import ID_FIELDS
+
+# Only these fields are decoded by the streaming parser; everything else in an
+# entry is skipped over without being converted. The venue fields tell the
+# scheduler which source to search first.
+VERIFY_FIELDS = frozenset(['title', 'author', 'year', 'archiveprefix', 'eprinttype',
+                           'booktitle', 'publisher', 'institution'] + ID_FIELDS)
+
+ENTRY_START_RE = re.compile(r'^\s*@\s*[A-Za-z]+')
+# Inside an open entry only a complete "@type{" / "@type(" head starts the next
+# one, so a field value with a line beginning with "@" stays in its entry
+NEXT_ENTRY_RE = re.compile(r'^\s*@\s*[A-Za-z]+\s*[{(]')
+ENTRY_HEAD_RE = re.compile(r'@\s*([A-Za-z]+)\s*([{(])')
+FIELD_NAME_RE = re.compile(r'\s*([^\s=,{}()"#]+)\s*=\s*')
+NUMBER_OR_MACRO_RE = re.compile(r'[^\s,#{}()"]+')
+LINE_BREAK_RE = re.compile(r'[ \t]*\n\s*')
+DELIMITER_RES = {'{': re.compile(r'[{}]'), '(': re.compile(r'[()]')}
+
+
+class MalformedEntry(ValueError):
+    pass
+
+
+def skip_space(text, pos):
+    while pos < len(text) and text[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+def read_braced(text, pos):
+    # text[pos] is "{"; returns the content without the outer braces
+    depth = 0
+    for i in range(pos, len(text)):
+        c = text[i]
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return text[pos + 1:i], i + 1
+    raise MalformedEntry("unbalanced braces")
+
+
+def read_quoted(text, pos):
+    depth = 0
+    for i in range(pos + 1, len(text)):
+        c = text[i]
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        elif c == '"' and depth == 0 and text[i - 1] != '\\':
+            return text[pos + 1:i], i + 1
+    raise MalformedEntry("unterminated quoted value")
+
+
+def read_value(text, pos, macros):
+    # A value is one or more parts joined by "#": {braced}, "quoted", a number or a @string macro
+    parts = []
+    while True:
+        pos = skip_space(text, pos)
+        if pos >= len(text):
+            raise MalformedEntry("missing value")
+        c = text[pos]
+        if c == '{':
+            part, pos = read_braced(text, pos)
+        elif c == '"':
+            part, pos = read_quoted(text, pos)
+        else:
+            match = NUMBER_OR_MACRO_RE.match(text, pos)
+            if not match:
+                raise MalformedEntry(f"unexpected {c!r}")
+            word = match.group()
+            part = macros.get(word.lower(), word)
+            pos = match.end()
+        parts.append(part)
+        pos = skip_space(text, pos)
+        if pos < len(text) and text[pos] == '#':
+            pos += 1
+            continue
+        return ''.join(parts), pos
+
+
+def latex_to_unicode(text):
+    # bibtexparser pulls in pyparsing, a good part of the CLI's start-up time;
+    # it is imported when the first value with LaTeX markup turns up
+    from bibtexparser.latexenc import latex_to_unicode as convert
+    return convert(text)
+
+
+def decode_value(value):
+    value = LINE_BREAK_RE.sub('\n', value.strip())
+    return latex_to_unicode(value) if '\\' in value or '{' in value else value
+
+
+def parse_entry(text, macros, fields=VERIFY_FIELDS):
+    # Returns the entry dict, or None for @string/@comment/@preamble blocks
+    text = text.lstrip()
+    head = ENTRY_HEAD_RE.match(text)
+    if not head:
+        raise MalformedEntry("not an entry")
+    kind = head.group(1).lower()
+    closer = '}' if head.group(2) == '{' else ')'
+    pos = head.end()
+    if kind in ('comment', 'preamble'):
+        return None
+    if kind == 'string':
+        name = FIELD_NAME_RE.match(text, pos)
+        if not name:
+            raise MalformedEntry("malformed @string")
+        value, _ = read_value(text, name.end(), macros)
+        macros[name.group(1).lower()] = value
+        return None
+
+    comma = text.find(',', pos)
+    key = text[pos:comma].strip() if comma >= 0 else ''
+    if not key or any(c in key for c in '{}()="\n'):
+        raise MalformedEntry("missing citation key")
+    entry = {'ENTRYTYPE': kind, 'ID': key}
+    pos = comma + 1
+    while True:
+        pos = skip_space(text, pos)
+        while pos < len(text) and text[pos] == ',':
+            pos = skip_space(text, pos + 1)
+        if pos >= len(text) or text[pos] == closer:
+            return entry
+        name = FIELD_NAME_RE.match(text, pos)
+        if not name:
+            raise MalformedEntry(f"expected a field near {text[pos:pos + 20]!r}")
+        value, pos = read_value(text, name.end(), macros)
+        field = name.group(1).lower()
+        if fields is None or field in fields:
+            entry[field] = decode_value(value)
+
+
+def iter_bibtex(lines, fields=VERIFY_FIELDS, on_error=None):
+    # Yields entries as soon as their closing delimiter is read; whatever
+    # follows it on the same line may start the next entry. An entry that
+    # never closes ends where the next "@type{" line starts, so one broken
+    # record costs only itself; on_error(line_number, message) is told about it.
+    macros = {}
+    block = None
+    opener = closer = delimiters = None
+    depth = scanned = start = 0
+
+    def finish(text, line_number):
+        try:
+            return parse_entry(text, macros, fields)
+        except MalformedEntry as e:
+            if on_error is not None:
+                on_error(line_number, str(e))
+            return None
+
+    for number, line in enumerate(lines, 1):
+        if block is not None and NEXT_ENTRY_RE.match(line):
+            entry = finish(block, start)
+            block = None
+            if entry is not None:
+                yield entry
+
+        text = line
+        while text:
+            if block is None:
+                if not ENTRY_START_RE.match(text):
+                    # Text between entries is a comment in BibTeX
+                    break
+                block, opener, depth, start = '', None, 0, number
+            block += text
+            text = ''
+            if opener is None:
+                head = ENTRY_HEAD_RE.search(block)
+                if not head:
+                    break
+                opener = head.group(2)
+                closer = '}' if opener == '{' else ')'
+                delimiters = DELIMITER_RES[opener]
+                scanned = head.start(2)
+            for match in delimiters.finditer(block, scanned):
+                depth += 1 if match.group() == opener else -1
+                if depth == 0:
+                    end = match.end()
+                    entry = finish(block[:end], start)
+                    text, block = block[end:], None
+                    if entry is not None:
+                        yield entry
+                    break
+            else:
+                scanned = len(block)
+    if block is not None:
+        entry = finish(block, start)
+        if entry is not None:
+            yield entry
+
+
+def iter_bibtex_file(file_path, fields=VERIFY_FIELDS, on_error=None):
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        yield from iter_bibtex(f, fields, on_error)
+
 
 def parse_bibtex_string(bib_string):
-    parser = BibTexParser()
-    parser.customization = convert_to_unicode
-    bib_database = bibtexparser.loads(bib_string, parser=parser)
-    return bib_database.entries
+    return list(iter_bibtex(io.StringIO(bib_string)))
 
 def parse_bibtex_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as bibtex_file:
-        parser = BibTexParser()
-        parser.customization = convert_to_unicode
-        bib_database = bibtexparser.load(bibtex_file, parser=parser)
-    return bib_database.entries
+    return list(iter_bibtex_file(file_path))
@@ -0,0 +1,553 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = "sqlite"
+CACHE_DB_FILE = ".citation_cache.db"
+LEGACY_CACHE_FILE = ".citation_cache.json"
+
+# Writes are buffered and committed in one transaction once either limit is hit
+COMMIT_BATCH_SIZE = 50
+COMMIT_INTERVAL = 2.0
+
+SQLITE_BUSY_TIMEOUT_MS = 30000
+
+# Kinds of cached lookups. A "negative" entry records that a source answered
+# but had no match; an "error" entry records a timeout/5xx/429 and is kept only
+# briefly so that a flaky source is retried on the next run instead of being
+# remembered as "not found".
+HIT = "hit"
+NEGATIVE = "negative"
+ERROR = "error"
+
+DAY = 86400
+TTL = {
+    HIT: 180 * DAY,
+    NEGATIVE: 7 * DAY,
+    ERROR: 600,
+}
+
+# Entries worth handing to another machine; errors are local and short-lived
+SHARED_KINDS = (HIT, NEGATIVE)
+
+# Keys per "WHERE key IN (...)" query, below SQLite's bound parameter limit
+SQL_CHUNK = 500
+
+# Least recently used entries beyond this many are evicted by prune()
+MAX_ENTRIES = 200000
+AUTO_PRUNE_INTERVAL = DAY
+
+
+def is_expired(kind, created, now=None):
+    ttl = TTL.get(kind, 0)
+    return ttl <= 0 or (now or time.time()) - created > ttl
+
+
+class CacheBackend:
+    name = "base"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def lookup_kind(self, key):
+        # Returns (kind, value); kind is None when nothing usable is cached
+        raise NotImplementedError
+
+    def lookup(self, key):
+        # Returns (found, value); value is None for negative and error entries
+        kind, value = self.lookup_kind(key)
+        return kind is not None, value
+
+    def get(self, key):
+        return self.lookup(key)[1]
+
+    def set(self, key, value, kind=HIT, source=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def items(self):
+        raise NotImplementedError
+
+    def records(self):
+        # (key, kind, created, value, source) for every stored entry
+        raise NotImplementedError
+
+    def lookup_records(self, keys):
+        # Records of the given keys that are shareable: unexpired hits and negatives
+        raise NotImplementedError
+
+    def merge(self, records):
+        # Adds (key, kind, created, value, source) records fetched elsewhere,
+        # keeping whichever of the local and the incoming copy is fresher.
+        # Returns {"added": n, "updated": n, "kept": n}.
+        raise NotImplementedError
+
+    def prefetch(self, keys):
+        # Hint that these keys are about to be looked up
+        pass
+
+    def has_legacy_entries(self):
+        # Whether any entry has no source: migrated from the JSON cache of the
+        # original client, or written before sources were recorded
+        raise NotImplementedError
+
+    def prune(self, max_entries=None):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def __contains__(self, key):
+        return self.lookup(key)[0]
+
+    def _count(self, found):
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+
+class MemoryCache(CacheBackend):
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        # key -> [kind, created, value, source], kept in least-recently-used order
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup_kind(self, key):
+        with self._lock:
+            record = self._data.get(key)
+            if record is None or is_expired(record[0], record[1]):
+                self._count(False)
+                return None, None
+            self._data.move_to_end(key)
+            self._count(True)
+            return record[0], record[2]
+
+    def set(self, key, value, kind=HIT, source=None):
+        with self._lock:
+            self._data[key] = [kind, time.time(), value, source]
+            self._data.move_to_end(key)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self):
+        with self._lock:
+            return [(k, r[2]) for k, r in self._data.items() if r[0] == HIT]
+
+    def records(self):
+        with self._lock:
+            return [(k, r[0], r[1], r[2], r[3]) for k, r in self._data.items()]
+
+    def lookup_records(self, keys):
+        now = time.time()
+        with self._lock:
+            found = [(k, self._data.get(k)) for k in keys]
+        return [(k, r[0], r[1], r[2], r[3]) for k, r in found
+                if r is not None and r[0] in SHARED_KINDS and not is_expired(r[0], r[1], now)]
+
+    def has_legacy_entries(self):
+        with self._lock:
+            return any(r[3] is None for r in self._data.values())
+
+    def merge(self, records):
+        counts = {"added": 0, "updated": 0, "kept": 0}
+        with self._lock:
+            for key, kind, created, value, source in records:
+                current = self._data.get(key)
+                if current is not None and current[1] >= created:
+                    counts["kept"] += 1
+                    continue
+                counts["updated" if current is not None else "added"] += 1
+                self._data[key] = [kind, created, value, source]
+        return counts
+
+    def prune(self, max_entries=None):
+        max_entries = MAX_ENTRIES if max_entries is None else max_entries
+        now = time.time()
+        with self._lock:
+            expired = [k for k, r in self._data.items() if is_expired(r[0], r[1], now)]
+            for k in expired:
+                del self._data[k]
+            evicted = 0
+            while len(self._data) > max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        return {"expired": len(expired), "evicted": evicted}
+
+    def stats(self):
+        now = time.time()
+        kinds = {}
+        expired = 0
+        with self._lock:
+            for kind, created, _, _ in self._data.values():
+                kinds[kind] = kinds.get(kind, 0) + 1
+                if is_expired(kind, created, now):
+                    expired += 1
+            total = len(self._data)
+        return {"backend": self.name, "entries": total, "by_kind": kinds, "expired": expired,
+                "session_hits": self.hits, "session_misses": self.misses}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class JsonCache(MemoryCache):
+    # Single-file format, kept for users who want a human-readable cache.
+    # Unlike the old save_cache() it only rewrites the file on flush() and does
+    # so atomically, so a crash can no longer leave a truncated file behind.
+    name = "json"
+    FORMAT_VERSION = 2
+
+    def __init__(self, path=LEGACY_CACHE_FILE):
+        super().__init__()
+        self.path = path
+        self._dirty = False
+        data = load_json_cache(path)
+        if data.get("version") == self.FORMAT_VERSION and isinstance(data.get("entries"), dict):
+            for key, record in data["entries"].items():
+                # Records written before sources were kept have no fourth field
+                self._data[key] = (list(record) + [None])[:4]
+        else:
+            # Pre-TTL files map keys straight to positive results
+            now = time.time()
+            for key, value in data.items():
+                self._data[key] = [HIT, now, value, None]
+
+    def set(self, key, value, kind=HIT, source=None):
+        super().set(key, value, kind, source)
+        self._dirty = True
+
+    def delete(self, key):
+        super().delete(key)
+        self._dirty = True
+
+    def merge(self, records):
+        counts = super().merge(records)
+        if counts["added"] or counts["updated"]:
+            self._dirty = True
+        return counts
+
+    def prune(self, max_entries=None):
+        result = super().prune(max_entries)
+        if result["expired"] or result["evicted"]:
+            self._dirty = True
+        return result
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = {"version": self.FORMAT_VERSION, "entries": dict(self._data)}
+            self._dirty = False
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[!] Failed to write cache file {self.path}: {e}")
+
+
+class SqliteCache(CacheBackend):
+    name = "sqlite"
+
+    def __init__(self, path=CACHE_DB_FILE, legacy_path=LEGACY_CACHE_FILE):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._touched = set()
+        self._last_commit = time.monotonic()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        if "kind" not in columns:
+            conn.execute(f"ALTER TABLE cache ADD COLUMN kind TEXT NOT NULL DEFAULT '{HIT}'")
+        if "accessed" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+        if "source" not in columns:
+            conn.execute("ALTER TABLE cache ADD COLUMN source TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_kind_created ON cache (kind, created)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        conn.commit()
+
+        if legacy_path:
+            self._migrate_legacy(legacy_path)
+        self._auto_prune()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, name):
+        row = self._connect().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _migrate_legacy(self, legacy_path):
+        conn = self._connect()
+        if self._meta('legacy_migrated') or not os.path.exists(legacy_path):
+            return
+
+        data = load_json_cache(legacy_path)
+        now = time.time()
+        with conn:
+            # BEGIN IMMEDIATE so that two processes starting together migrate only once
+            conn.execute("BEGIN IMMEDIATE")
+            if self._meta('legacy_migrated'):
+                return
+            conn.executemany(
+                "INSERT OR IGNORE INTO cache (key, value, created, kind, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(k, json.dumps(v, ensure_ascii=False), now, HIT, now) for k, v in data.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (name, value) VALUES ('legacy_migrated', ?)",
+                (legacy_path,)
+            )
+        try:
+            os.replace(legacy_path, legacy_path + ".migrated")
+        except OSError:
+            pass
+        print(f"[+] Migrated {len(data)} cache entries from {legacy_path} to {self.path}")
+
+    def _auto_prune(self):
+        last = self._meta('last_prune')
+        if last and time.time() - float(last) < AUTO_PRUNE_INTERVAL:
+            return
+        try:
+            self.prune()
+        except sqlite3.Error as e:
+            print(f"[!] Cache prune skipped: {e}")
+
+    def lookup_kind(self, key):
+        with self._lock:
+            if key in self._pending:
+                self._count(True)
+                return self._pending[key][:2]
+        row = self._connect().execute(
+            "SELECT value, kind, created FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or is_expired(row[1], row[2]):
+            with self._lock:
+                self._count(False)
+            return None, None
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            with self._lock:
+                self._count(False)
+            return None, None
+        with self._lock:
+            self._count(True)
+            self._touched.add(key)
+        return row[1], value
+
+    def set(self, key, value, kind=HIT, source=None):
+        with self._lock:
+            self._pending[key] = (kind, value, source)
+            due = (len(self._pending) >= COMMIT_BATCH_SIZE
+                   or time.monotonic() - self._last_commit >= COMMIT_INTERVAL)
+        if due:
+            self.flush()
+
+    def delete(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def items(self):
+        self.flush()
+        rows = self._connect().execute("SELECT key, value FROM cache WHERE kind = ?", (HIT,)).fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def records(self):
+        self.flush()
+        rows = self._connect().execute("SELECT key, kind, created, value, source FROM cache")
+        for k, kind, created, v, source in rows:
+            yield k, kind, created, json.loads(v), source
+
+    def lookup_records(self, keys):
+        # Entries not yet committed are answered from the pending buffer rather
+        # than by flushing it, which would commit once per call
+        now = time.time()
+        found = []
+        with self._lock:
+            pending = {k: self._pending[k] for k in keys if k in self._pending}
+        for k, (kind, v, source) in pending.items():
+            if kind in SHARED_KINDS:
+                found.append((k, kind, now, v, source))
+        conn = self._connect()
+        keys = [k for k in dict.fromkeys(keys) if k not in pending]
+        for i in range(0, len(keys), SQL_CHUNK):
+            chunk = keys[i:i + SQL_CHUNK]
+            rows = conn.execute(
+                f"SELECT key, kind, created, value, source FROM cache WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.extend((k, kind, created, json.loads(v), source) for k, kind, created, v, source in rows
+                         if kind in SHARED_KINDS and not is_expired(kind, created, now))
+        return found
+
+    def has_legacy_entries(self):
+        self.flush()
+        return self._connect().execute("SELECT 1 FROM cache WHERE source IS NULL LIMIT 1").fetchone() is not None
+
+    def merge(self, records):
+        # One upsert per record; the WHERE clause keeps the fresher copy
+        self.flush()
+        conn = self._connect()
+        with conn:
+            before = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            changes = conn.total_changes
+            merged = 0
+            for key, kind, created, value, source in records:
+                merged += 1
+                conn.execute(
+                    "INSERT INTO cache (key, value, created, kind, accessed, source) VALUES (?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET value = excluded.value, created = excluded.created,"
+                    " kind = excluded.kind, source = excluded.source WHERE excluded.created > cache.created",
+                    (key, json.dumps(value, ensure_ascii=False), created, kind, created, source)
+                )
+            changed = conn.total_changes - changes
+            added = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - before
+        return {"added": added, "updated": changed - added, "kept": merged - changed}
+
+    def __len__(self):
+        self.flush()
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def flush(self):
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            batch = self._pending
+            touched = self._touched
+            self._pending = {}
+            self._touched = set()
+            self._last_commit = time.monotonic()
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache (key, value, created, kind, accessed, source) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(k, json.dumps(v, ensure_ascii=False), now, kind, now, source)
+                     for k, (kind, v, source) in batch.items()]
+                )
+                conn.executemany("UPDATE cache SET accessed = ? WHERE key = ?", [(now, k) for k in touched])
+        except sqlite3.Error as e:
+            print(f"[!] Failed to commit {len(batch)} cache entries: {e}")
+            with self._lock:
+                for k, v in batch.items():
+                    self._pending.setdefault(k, v)
+
+    def prune(self, max_entries=None):
+        max_entries = MAX_ENTRIES if max_entries is None else max_entries
+        self.flush()
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            expired = 0
+            for kind, ttl in TTL.items():
+                expired += conn.execute(
+                    "DELETE FROM cache WHERE kind = ? AND created < ?", (kind, now - ttl)
+                ).rowcount
+            expired += conn.execute(
+                f"DELETE FROM cache WHERE kind NOT IN ({','.join('?' * len(TTL))})", list(TTL)
+            ).rowcount
+            total = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            evicted = 0
+            if total > max_entries:
+                evicted = conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                    (total - max_entries,)
+                ).rowcount
+            conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('last_prune', ?)", (str(now),))
+        return {"expired": expired, "evicted": evicted}
+
+    def stats(self):
+        self.flush()
+        now = time.time()
+        conn = self._connect()
+        kinds = dict(conn.execute("SELECT kind, COUNT(*) FROM cache GROUP BY kind").fetchall())
+        expired = 0
+        for kind, ttl in TTL.items():
+            expired += conn.execute(
+                "SELECT COUNT(*) FROM cache WHERE kind = ? AND created < ?", (kind, now - ttl)
+            ).fetchone()[0]
+        size = sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+        return {"backend": self.name, "path": self.path, "entries": sum(kinds.values()), "by_kind": kinds,
+                "expired": expired, "size_bytes": size,
+                "session_hits": self.hits, "session_misses": self.misses}
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def load_json_cache(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError) as e:
+        print(f"[!] Ignoring unreadable cache file {path}: {e}")
+        return {}
+
+
+BACKENDS = {
+    "sqlite": SqliteCache,
+    "json": JsonCache,
+    "memory": MemoryCache,
+}
+
+
+def open_cache(backend=None, path=None):
+    backend = backend or CACHE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown cache backend: {backend} (choose from {', '.join(BACKENDS)})")
+    cls = BACKENDS[backend]
+    if path and cls is not MemoryCache:
+        return cls(path)
+    return cls()
@@ -0,0 +1,236 @@
+import gzip
+import json
+import os
+import threading
+import time
+from src.cache import CacheBackend, HIT, SHARED_KINDS, is_expired
+from src.http_client import http_post
+from src.rate_limiter import RATE_LIMITS, host_of
+from src.verifier import CACHE_KEY_VERSION
+
+# Sharing cached lookups between machines, so CI runners and colleagues do not
+# each fetch the same popular references again.
+#
+# A cache pack is a gzip-compressed JSON Lines snapshot: a header line with the
+# pack format and the cache key version, then one record per cached lookup:
+#   {"key": ..., "source": "crossref_doi", "kind": "hit", "fetched": 1760000000, "value": {...}}
+# Importing merges it into the local cache, keeping the fresher copy of each key.
+#
+# The remote tier reads through to a cache server ('main.py serve' answers
+# POST /cache/lookup from its cache) whenever the local cache misses.
+
+PACK_FORMAT = "citation-cache-pack"
+PACK_VERSION = 1
+PACK_FILE = "citation_cache_pack.jsonl.gz"
+MERGE_BATCH = 5000
+
+REMOTE_TIMEOUT = 2.0
+# Keys per lookup request when prefetching identifiers
+REMOTE_BATCH = 500
+# The cache server is ours, not a public API: a far higher default budget
+REMOTE_RATE_LIMIT = (200.0, 50)
+
+
+def pack_line(record):
+    key, kind, created, value, source = record
+    return {"key": key, "source": source, "kind": kind, "fetched": int(created), "value": value}
+
+
+def read_record(line):
+    return str(line["key"]), line["kind"], float(line["fetched"]), line.get("value"), line.get("source")
+
+
+def shareable(kind, created, now):
+    return kind in SHARED_KINDS and not is_expired(kind, created, now)
+
+
+def pack_header():
+    return {"format": PACK_FORMAT, "version": PACK_VERSION, "key_version": CACHE_KEY_VERSION,
+            "created": int(time.time())}
+
+
+def check_header(header):
+    if not isinstance(header, dict) or header.get("format") != PACK_FORMAT:
+        raise ValueError("not a cache pack")
+    if header.get("version") != PACK_VERSION:
+        raise ValueError(f"unsupported pack version {header.get('version')}")
+    if header.get("key_version") != CACHE_KEY_VERSION:
+        raise ValueError(f"pack uses cache key version {header.get('key_version')}, "
+                         f"this version uses {CACHE_KEY_VERSION}")
+
+
+def export_pack(cache, path=PACK_FILE, kinds=SHARED_KINDS, max_age=None):
+    # Written to a temporary file and renamed, so a shared pack is never half-written
+    now = time.time()
+    by_source = {}
+    opener = gzip.open if path.endswith('.gz') else open
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with opener(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(pack_header()) + "\n")
+        for record in cache.records():
+            _, kind, created, _, source = record
+            if kind not in kinds or not shareable(kind, created, now):
+                continue
+            if max_age is not None and now - created > max_age:
+                continue
+            f.write(json.dumps(pack_line(record), ensure_ascii=False, separators=(',', ':')) + "\n")
+            by_source[source or "unknown"] = by_source.get(source or "unknown", 0) + 1
+    os.replace(tmp_path, path)
+    return by_source
+
+
+def read_pack(path):
+    # Yields the pack's records, None for each line that cannot be read
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = None
+        check_header(header)
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield read_record(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                yield None
+
+
+def import_pack(cache, path):
+    # Returns counts of records added, updated (the pack's copy was fresher),
+    # kept (the local copy was as fresh), expired and unreadable
+    counts = {"added": 0, "updated": 0, "kept": 0, "expired": 0, "invalid": 0}
+    now = time.time()
+    batch = []
+
+    def flush():
+        for name, n in cache.merge(batch).items():
+            counts[name] += n
+        batch.clear()
+
+    for record in read_pack(path):
+        if record is None:
+            counts["invalid"] += 1
+        elif not shareable(record[1], record[2], now):
+            counts["expired"] += 1
+        else:
+            batch.append(record)
+            if len(batch) >= MERGE_BATCH:
+                flush()
+    flush()
+    return counts
+
+
+class RemoteCache(CacheBackend):
+    # Read-through tier in front of the local cache. Records found remotely are
+    # merged into the local cache; lookups made here are only written locally.
+    # An unreachable server costs one short timeout per request until its
+    # circuit breaker opens, after which lookups go straight to the APIs.
+
+    def __init__(self, local, url):
+        super().__init__()
+        self.local = local
+        self.remote = url.rstrip('/')
+        self.name = local.name
+        self.path = getattr(local, 'path', None)
+        self.remote_hits = 0
+        self.remote_misses = 0
+        self.disabled = False
+        self._warned = False
+        self._lock = threading.Lock()
+        RATE_LIMITS.setdefault(host_of(self.remote), REMOTE_RATE_LIMIT)
+
+    def _warn(self, message):
+        with self._lock:
+            warned, self._warned = self._warned, True
+        if not warned:
+            print(f" [!] Remote cache {self.remote}: {message}")
+
+    def fetch(self, keys):
+        # {key: record} for the keys the server has, after storing them locally
+        found = {}
+        for i in range(0, len(keys), REMOTE_BATCH):
+            if self.disabled:
+                break
+            chunk = keys[i:i + REMOTE_BATCH]
+            try:
+                response = http_post(f"{self.remote}/lookup", json={"key_version": CACHE_KEY_VERSION, "keys": chunk},
+                                     timeout=REMOTE_TIMEOUT, max_retries=0, source="cache_remote")
+                if response.status_code == 409:
+                    # Keys mean something else on the server; asking again will not help
+                    self.disabled = True
+                    self._warn(f"{response.json().get('error')}, not using it")
+                    break
+                if response.status_code != 200:
+                    self._warn(f"HTTP {response.status_code}")
+                    break
+                records = [read_record(r) for r in response.json()["records"]]
+            except Exception as e:
+                self._warn(f"not reachable ({type(e).__name__}), looking up without it meanwhile")
+                break
+            now = time.time()
+            records = [r for r in records if shareable(r[1], r[2], now)]
+            if records:
+                self.local.merge(records)
+            found.update((r[0], r) for r in records)
+        with self._lock:
+            self.remote_hits += len(found)
+            self.remote_misses += len(keys) - len(found)
+        return found
+
+    def lookup_kind(self, key):
+        kind, value = self.local.lookup_kind(key)
+        if kind is None and not self.disabled:
+            record = self.fetch([key]).get(key)
+            if record is not None:
+                kind, value = record[1], record[3]
+        return kind, value
+
+    def prefetch(self, keys):
+        # One request per REMOTE_BATCH keys missing locally instead of one per key
+        if self.disabled:
+            return
+        present = {r[0] for r in self.local.lookup_records(keys)}
+        missing = [k for k in dict.fromkeys(keys) if k not in present]
+        if missing:
+            self.fetch(missing)
+
+    def set(self, key, value, kind=HIT, source=None):
+        self.local.set(key, value, kind, source)
+
+    def delete(self, key):
+        self.local.delete(key)
+
+    def items(self):
+        return self.local.items()
+
+    def records(self):
+        return self.local.records()
+
+    def lookup_records(self, keys):
+        return self.local.lookup_records(keys)
+
+    def has_legacy_entries(self):
+        return self.local.has_legacy_entries()
+
+    def merge(self, records):
+        return self.local.merge(records)
+
+    def prune(self, max_entries=None):
+        return self.local.prune(max_entries)
+
+    def stats(self):
+        stats = self.local.stats()
+        stats["remote"] = {"url": self.remote, "hits": self.remote_hits, "misses": self.remote_misses,
+                           "disabled": self.disabled}
+        return stats
+
+    def __len__(self):
+        return len(self.local)
+
+    def flush(self):
+        self.local.flush()
+
+    def close(self):
+        self.local.close()
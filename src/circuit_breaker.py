@@ -0,0 +1,106 @@
+import threading
+import time
+from src.rate_limiter import host_of
+
+# A host is skipped after this many consecutive failed requests (timeouts,
+# connection errors, 5xx) and probed again with a single request once the
+# cool-down has passed. Each failed probe doubles the cool-down.
+ENABLED = True
+FAILURE_THRESHOLD = 5
+COOL_DOWN = 30.0
+MAX_COOL_DOWN = 600.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, threshold=None, cool_down=None):
+        # Defaults are read here, so configure_breakers() also applies to breakers created later
+        threshold = FAILURE_THRESHOLD if threshold is None else threshold
+        cool_down = COOL_DOWN if cool_down is None else cool_down
+        self.name = name
+        self.threshold = threshold
+        self.base_cool_down = cool_down
+        self.cool_down = cool_down
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._changed = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        if not ENABLED:
+            return True
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._changed < self.cool_down:
+                return False
+            # Let one probe through; if it never reports back another one is
+            # allowed after the next cool-down
+            self.state = HALF_OPEN
+            self._changed = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            recovered = self.state != CLOSED
+            self.state = CLOSED
+            self.failures = 0
+            self.cool_down = self.base_cool_down
+        if recovered:
+            print(f" [+] {self.name} is answering again, resuming requests")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probe_failed = self.state == HALF_OPEN
+            if probe_failed:
+                self.cool_down = min(self.cool_down * 2, MAX_COOL_DOWN)
+            elif self.state == OPEN or self.failures < self.threshold:
+                return
+            self.state = OPEN
+            self.opened += 1
+            self._changed = time.monotonic()
+            cool_down = self.cool_down
+        if probe_failed:
+            print(f" [!] {self.name} is still failing, skipping it for {cool_down:.0f}s")
+        else:
+            print(f" [!] {self.name} failed {self.threshold} times in a row, skipping it for {cool_down:.0f}s")
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.opened}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(url):
+    host = host_of(url)
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(host)
+        return breaker
+
+
+def configure_breakers(threshold=None, cool_down=None):
+    global FAILURE_THRESHOLD, COOL_DOWN
+    if threshold is not None:
+        FAILURE_THRESHOLD = threshold
+    if cool_down is not None:
+        COOL_DOWN = cool_down
+    with _breakers_lock:
+        for breaker in _breakers.values():
+            breaker.threshold = FAILURE_THRESHOLD
+            breaker.base_cool_down = breaker.cool_down = COOL_DOWN
+
+
+def breaker_states():
+    with _breakers_lock:
+        return {host: b.snapshot() for host, b in sorted(_breakers.items())}
@@ -0,0 +1,167 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+from src.planner import SKIP_DIRS
+
+# Citation keys a LaTeX project actually uses, read from its .tex sources or
+# from the .aux/.bcf files a LaTeX/biber run leaves behind. "*" (\nocite{*})
+# stands for every entry.
+
+ALL_KEYS = "*"
+
+# \cite, \citep, \citet, \parencite, \textcite, \autocite, \footcite, \nocite, ...
+# and the capitalized forms for the start of a sentence: \Cite, \Citet, \Autocite, ...
+CITE_RE = re.compile(r'\\([A-Za-z]*[Cc]ite[A-Za-z]*)\*?')
+# Commands containing "cite" that do not take keys
+NOT_CITATIONS = {'citestyle', 'citeindextrue', 'citeindexfalse'}
+COMMENT_RE = re.compile(r'(?<!\\)%.*')
+# \bibliography{refs,more} and biblatex's \addbibresource{refs.bib}
+BIBLIOGRAPHY_RE = re.compile(r'\\(?:bibliography|addbibresource)(?:\[[^\]]*\])?\{([^}]*)\}')
+INPUT_RE = re.compile(r'\\(?:input|include|subfile)\{([^}]*)\}')
+AUX_CITATION_RE = re.compile(r'\\citation\{([^}]*)\}')
+# biblatex writes \abx@aux@cite{key} or, since 3.x, \abx@aux@cite{refsection}{key}
+AUX_BIBLATEX_RE = re.compile(r'\\abx@aux@cite(?:\{\d+\})?\{([^}]*)\}')
+
+
+def split_keys(text):
+    return [k.strip() for k in text.split(',') if k.strip()]
+
+
+def skip_group(text, pos, opener, closer):
+    # text[pos] is opener; returns the position after the matching closer
+    depth = 0
+    for i in range(pos, len(text)):
+        if text[i] == opener:
+            depth += 1
+        elif text[i] == closer:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(text)
+
+
+def cite_arguments(text, pos, multi):
+    # Key lists after a cite command at pos, skipping [pre]/[post] notes and
+    # biblatex's (multi)cite (pre)/(post) notes. Multicite commands such as
+    # \textcites take several {keys} groups.
+    keys = []
+    while pos < len(text):
+        while pos < len(text) and text[pos] in ' \t\n':
+            pos += 1
+        if pos >= len(text):
+            break
+        c = text[pos]
+        if c == '[':
+            pos = skip_group(text, pos, '[', ']')
+        elif c == '(' and multi:
+            pos = skip_group(text, pos, '(', ')')
+        elif c == '{':
+            end = skip_group(text, pos, '{', '}')
+            keys.extend(split_keys(text[pos + 1:end - 1]))
+            pos = end
+            if not multi:
+                break
+        else:
+            break
+    return keys
+
+
+def tex_citations(text):
+    text = COMMENT_RE.sub('', text)
+    keys = []
+    for match in CITE_RE.finditer(text):
+        command = match.group(1).lower()
+        if command in NOT_CITATIONS:
+            continue
+        keys.extend(cite_arguments(text, match.end(), command.endswith('cites')))
+    return keys
+
+
+def tex_bibliographies(text, base):
+    files = []
+    for match in BIBLIOGRAPHY_RE.finditer(COMMENT_RE.sub('', text)):
+        for name in split_keys(match.group(1)):
+            name = name if name.endswith('.bib') else name + '.bib'
+            files.append(os.path.normpath(os.path.join(base, name)))
+    return files
+
+
+def aux_citations(text):
+    keys = []
+    for line in text.splitlines():
+        for regex in (AUX_CITATION_RE, AUX_BIBLATEX_RE):
+            for match in regex.finditer(line):
+                keys.extend(split_keys(match.group(1)))
+    return keys
+
+
+def bcf_citations(path):
+    # biber control file: <bcf:citekey order="1">key</bcf:citekey> per citation
+    keys = []
+    for _, element in ET.iterparse(path):
+        if element.tag.endswith('}citekey') or element.tag == 'citekey':
+            if element.text and element.text.strip():
+                keys.append(element.text.strip())
+        element.clear()
+    return keys
+
+
+def find_tex_files(path):
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith('.'))
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.tex'))
+    return files
+
+
+def tex_inputs(text, base):
+    files = []
+    for match in INPUT_RE.finditer(COMMENT_RE.sub('', text)):
+        name = match.group(1).strip()
+        name = name if name.endswith('.tex') else name + '.tex'
+        files.append(os.path.normpath(os.path.join(base, name)))
+    return files
+
+
+def read_citations(path, root):
+    # (cited keys, .bib files the source names, .tex files it pulls in).
+    # LaTeX resolves names relative to the directory it runs in, the main file's.
+    if path.endswith('.bcf'):
+        return bcf_citations(path), [], []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    if path.endswith('.aux'):
+        return aux_citations(text), [], []
+    return tex_citations(text), tex_bibliographies(text, root), tex_inputs(text, root)
+
+
+def cited_keys(paths):
+    # Returns ({key: None} in order of first citation, source files read,
+    # .bib files named by \bibliography/\addbibresource). A directory is
+    # searched recursively for .tex files, a .tex file is followed through
+    # \input/\include, and .aux and .bcf files are read as LaTeX/biber wrote them.
+    queue = []
+    for path in paths:
+        if os.path.isdir(path):
+            queue.extend((f, path) for f in find_tex_files(path))
+        else:
+            queue.append((path, os.path.dirname(path)))
+    keys = {}
+    read = []
+    bibliographies = {}
+    seen = set()
+    while queue:
+        path, root = queue.pop(0)
+        if os.path.realpath(path) in seen:
+            continue
+        seen.add(os.path.realpath(path))
+        try:
+            found, bibs, inputs = read_citations(path, root)
+        except (OSError, ET.ParseError) as e:
+            print(f"[!] Could not read citations from {path}: {e}")
+            continue
+        read.append(path)
+        keys.update(dict.fromkeys(found))
+        bibliographies.update(dict.fromkeys(bibs))
+        queue.extend((f, root) for f in inputs if os.path.exists(f))
+    return keys, read, list(bibliographies)
@@ -0,0 +1,172 @@
+import contextvars
+import threading
+import time
+from src.rate_limiter import get_bucket, observe_response, backoff_delay, host_of
+from src.metrics import METRICS, TIMEOUT, CONNECTION, CIRCUIT_OPEN, DEADLINE, classify_exception
+from src.circuit_breaker import get_breaker
+
+MAX_RETRIES = 3
+POOL_MAXSIZE = 10
+# Bytes handed to a streaming consumer at a time (see http_request's on_chunk)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_local = threading.local()
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class LookupSkipped(Exception):
+    # Raised instead of sending (or finishing) a request; the lookup has no
+    # answer but nothing is cached for it either
+    kind = "skipped"
+
+
+class SourceUnavailable(LookupSkipped):
+    kind = CIRCUIT_OPEN
+
+
+class DeadlineExceeded(LookupSkipped):
+    kind = DEADLINE
+
+
+# Absolute time.monotonic() limits: one for the whole run, one for the entry
+# being verified (a context variable, so it follows asyncio tasks)
+RUN_DEADLINE = None
+_entry_deadline = contextvars.ContextVar("entry_deadline", default=None)
+
+
+def set_run_deadline(seconds):
+    global RUN_DEADLINE
+    RUN_DEADLINE = time.monotonic() + seconds if seconds else None
+
+
+def start_entry_deadline(seconds):
+    _entry_deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def time_left():
+    deadlines = [d for d in (RUN_DEADLINE, _entry_deadline.get()) if d is not None]
+    return min(deadlines) - time.monotonic() if deadlines else None
+
+
+def run_deadline_passed():
+    return RUN_DEADLINE is not None and time.monotonic() >= RUN_DEADLINE
+
+
+def request_budget(url, timeout):
+    # Returns the timeout to use and whether the deadline shortened it
+    if not get_breaker(url).allow():
+        raise SourceUnavailable(host_of(url))
+    left = time_left()
+    if left is None:
+        return timeout, False
+    if left <= 0:
+        raise DeadlineExceeded(url)
+    return min(timeout, left), left < timeout
+
+
+def observe_health(url, status=None, exc=None):
+    breaker = get_breaker(url)
+    if exc is not None:
+        if classify_exception(exc) in (TIMEOUT, CONNECTION):
+            breaker.record_failure()
+    elif status >= 500:
+        breaker.record_failure()
+    elif status != 429:
+        breaker.record_success()
+
+
+def set_cancel_event(event):
+    # Requests issued from this thread are abandoned once the event is set
+    # (used to drop outstanding source queries after another source won)
+    _local.cancel = event
+
+
+def get_session():
+    # One keep-alive session per worker thread; the adapters keep a connection
+    # pool per host so consecutive lookups skip the TCP/TLS handshake.
+    session = getattr(_local, 'session', None)
+    if session is None:
+        # requests is the heaviest import of the CLI; it is loaded with the first session
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+def read_body(response, on_chunk):
+    # Returns the bytes received. A 200 body is passed to on_chunk piece by
+    # piece as it arrives and is not kept on the response.
+    if on_chunk is None or response.status_code != 200:
+        return len(response.content)
+    received = 0
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            received += len(chunk)
+            on_chunk(chunk)
+    finally:
+        response.close()
+    return received
+
+
+def http_request(method, url, params=None, headers=None, json=None, timeout=20, max_retries=MAX_RETRIES, source=None,
+                 on_chunk=None):
+    # Every outgoing request goes through the shared per-host token bucket.
+    # 429/503 answers are retried here, honouring Retry-After, and the wait is
+    # applied to the whole host so other workers back off as well.
+    import requests
+    source = source or host_of(url)
+    bucket = get_bucket(url)
+    response = None
+    cancel = getattr(_local, 'cancel', None)
+    for attempt in range(max_retries + 1):
+        request_timeout, clamped = request_budget(url, timeout)
+        waiting = time.monotonic()
+        if not bucket.acquire(cancel, max_wait=time_left()):
+            if cancel is not None and cancel.is_set():
+                raise RequestCancelled(url)
+            raise DeadlineExceeded(url)
+        started = time.monotonic()
+        METRICS.record_wait(source, started - waiting)
+        try:
+            response = get_session().request(method, url, params=params, headers=headers, json=json,
+                                             timeout=request_timeout, stream=on_chunk is not None)
+            received = read_body(response, on_chunk)
+        except requests.exceptions.Timeout as e:
+            # A source that cannot answer within the entry's budget still counts against its breaker
+            observe_health(url, exc=e)
+            if clamped:
+                raise DeadlineExceeded(url) from e
+            METRICS.record_exception(source, e)
+            raise
+        except Exception as e:
+            METRICS.record_exception(source, e)
+            observe_health(url, exc=e)
+            raise
+        METRICS.record_request(source, response.status_code, time.monotonic() - started, received)
+        observe_health(url, response.status_code)
+        retry_after = observe_response(url, response.status_code, response.headers)
+        if response.status_code not in (429, 503) or attempt == max_retries:
+            return response
+
+        METRICS.record_retry(source)
+        wait = backoff_delay(attempt, retry_after)
+        print(f" [!] {host_of(url)} rate limited ({response.status_code}), waiting {wait:.1f}s...")
+        bucket.block_for(wait)
+    return response
+
+
+def http_get(url, params=None, headers=None, timeout=20, max_retries=MAX_RETRIES, source=None):
+    return http_request("GET", url, params=params, headers=headers, timeout=timeout, max_retries=max_retries,
+                        source=source)
+
+
+def http_post(url, json=None, params=None, headers=None, timeout=20, max_retries=MAX_RETRIES, source=None):
+    return http_request("POST", url, params=params, headers=headers, json=json, timeout=timeout,
+                        max_retries=max_retries, source=source)
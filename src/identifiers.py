@@ -0,0 +1,80 @@
+import re
+
+# Fields that may carry an identifier, in the order they are trusted
+ID_FIELDS = ['doi', 'eprint', 'arxivid', 'arxiv', 'pmid', 's2id', 'url', 'note', 'howpublished', 'journal']
+
+ARXIV_ID = r'(\d{4}\.\d{4,5}|[a-z][a-z\-]*(?:\.[A-Za-z]{2})?/\d{7})(?:v\d+)?'
+ARXIV_BARE_RE = re.compile(rf'^\s*(?:arxiv:)?\s*{ARXIV_ID}\s*$', re.IGNORECASE)
+ARXIV_TEXT_RE = re.compile(rf'(?:arxiv\.org/(?:abs|pdf)/|arxiv:\s*){ARXIV_ID}', re.IGNORECASE)
+
+DOI_RE = re.compile(r'\b(10\.\d{4,9}/[^\s"<>{}]+)', re.IGNORECASE)
+
+PMID_TEXT_RE = re.compile(r'(?:pubmed\.ncbi\.nlm\.nih\.gov/|ncbi\.nlm\.nih\.gov/pubmed/|pmid:?\s*)(\d{1,9})', re.IGNORECASE)
+S2_URL_RE = re.compile(r'semanticscholar\.org/paper/(?:[^/\s]+/)?([0-9a-f]{40})', re.IGNORECASE)
+S2_CORPUS_RE = re.compile(r'corpusid:?\s*(\d+)', re.IGNORECASE)
+
+
+def normalize_arxiv_id(arxiv_id):
+    return re.sub(r'v\d+$', '', arxiv_id.strip())
+
+
+def clean_doi(doi):
+    # URLs and notes often end a DOI with punctuation that is not part of it
+    return doi.rstrip('.,;)]')
+
+
+def extract_identifiers(entry):
+    ids = {}
+
+    for field in ID_FIELDS:
+        value = entry.get(field)
+        if not value:
+            continue
+        value = value.replace('{', '').replace('}', '')
+
+        if 'doi' not in ids:
+            match = DOI_RE.search(value)
+            if match and (field in ('doi', 'url', 'note', 'howpublished')):
+                ids['doi'] = clean_doi(match.group(1))
+            elif field == 'doi':
+                ids['doi'] = value.strip()
+
+        if 'arxiv' not in ids:
+            if field in ('eprint', 'arxivid', 'arxiv'):
+                match = ARXIV_BARE_RE.match(value)
+                # An eprint field is only an arXiv ID unless the entry names another archive
+                archive = entry.get('archiveprefix', entry.get('eprinttype', 'arxiv')).lower()
+                if match and 'arxiv' in archive:
+                    ids['arxiv'] = normalize_arxiv_id(match.group(1))
+            else:
+                match = ARXIV_TEXT_RE.search(value)
+                if match:
+                    ids['arxiv'] = normalize_arxiv_id(match.group(1))
+
+        if 'pmid' not in ids:
+            if field == 'pmid' and value.strip().isdigit():
+                ids['pmid'] = value.strip()
+            else:
+                match = PMID_TEXT_RE.search(value)
+                if match:
+                    ids['pmid'] = match.group(1)
+
+        if 's2' not in ids:
+            match = S2_URL_RE.search(value)
+            if match:
+                ids['s2'] = match.group(1).lower()
+            else:
+                match = S2_CORPUS_RE.search(value)
+                if match:
+                    ids['s2'] = f"CorpusId:{match.group(1)}"
+
+    return ids
+
+
+def s2_lookup_id(ids):
+    # Identifier understood by the Semantic Scholar /paper/batch endpoint
+    if 's2' in ids:
+        return ids['s2']
+    if 'pmid' in ids:
+        return f"PMID:{ids['pmid']}"
+    return None
@@ -0,0 +1,247 @@
+import gzip
+import json
+from array import array
+from collections import Counter
+from itertools import chain, groupby, islice
+import os
+import re
+import sqlite3
+import threading
+import time
+
+LOCAL_INDEX_FILE = ".citation_index.db"
+INDEX_VERSION = 2
+
+# Only the rarest few title tokens are looked up; together they are selective
+# enough to find the record. Each token's postings are stored as one packed
+# array of record ids, so a query reads one row per token
+QUERY_TOKENS = 4
+MAX_CANDIDATES = 20
+MMAP_SIZE = 1 << 30
+INSERT_BATCH = 5000
+
+TOKEN_RE = re.compile(r'\w+')
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'into', 'onto', 'via', 'using', 'its', 'are', 'our',
+    'that', 'this', 'these', 'their', 'over', 'under', 'between', 'towards', 'toward', 'through',
+}
+
+
+def title_tokens(title):
+    tokens = TOKEN_RE.findall((title or '').replace('{', '').replace('}', '').casefold())
+    return list(dict.fromkeys(t for t in tokens if len(t) > 2 and t not in STOPWORDS))
+
+
+def open_records(path):
+    # Crossref public data files are {"items": [...]} documents; arXiv
+    # snapshots and most exports are JSON Lines and are streamed line by line
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        first = f.readline()
+        try:
+            head = json.loads(first)
+        except ValueError:
+            head = json.loads(first + f.read())
+        if isinstance(head, dict) and isinstance(head.get('items'), list):
+            yield from head['items']
+            return
+        yield head
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def expand_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(('.json', '.jsonl', '.json.gz', '.jsonl.gz')):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def crossref_record(item):
+    title = (item.get('title') or [''])[0]
+    year = None
+    for field in ('published', 'issued', 'published-print', 'published-online'):
+        parts = (item.get(field) or {}).get('date-parts')
+        if parts and parts[0] and parts[0][0]:
+            year = parts[0][0]
+            break
+    authors = [{k: a[k] for k in ('family', 'given', 'name') if k in a} for a in item.get('author', [])]
+    doi = (item.get('DOI') or '').lower()
+    return title, authors, year, doi, None, item.get('URL') or (f"https://doi.org/{doi}" if doi else '')
+
+
+def arxiv_record(item):
+    title = re.sub(r'\s+', ' ', item.get('title') or '').strip()
+    authors = []
+    for parts in item.get('authors_parsed') or []:
+        author = {'family': parts[0]}
+        if len(parts) > 1 and parts[1]:
+            author['given'] = parts[1]
+        authors.append(author)
+    if not authors and item.get('authors'):
+        authors = [{'name': a.strip()} for a in re.split(r',| and ', item['authors']) if a.strip()]
+
+    year = None
+    versions = item.get('versions') or []
+    if versions:
+        match = re.search(r'\b(\d{4})\b', versions[0].get('created', ''))
+        year = int(match.group(1)) if match else None
+    if year is None and item.get('update_date'):
+        year = int(item['update_date'][:4])
+
+    arxiv_id = item.get('id', '')
+    doi = (item.get('doi') or '').split()[0].lower() if item.get('doi') else None
+    return title, authors, year, doi, arxiv_id, f"http://arxiv.org/abs/{arxiv_id}"
+
+
+def build_index(output, crossref_paths=(), arxiv_paths=()):
+    tmp_output = output + ".building"
+    if os.path.exists(tmp_output):
+        os.remove(tmp_output)
+    conn = sqlite3.connect(tmp_output)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript("""
+        CREATE TABLE records (id INTEGER PRIMARY KEY, title TEXT, authors TEXT, year INTEGER,
+                              doi TEXT, arxiv_id TEXT, url TEXT, source TEXT);
+        CREATE TABLE postings (token TEXT, rec INTEGER);
+        CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT);
+    """)
+
+    started = time.time()
+    count = 0
+    records, postings = [], []
+
+    def flush():
+        conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+        conn.executemany("INSERT INTO postings VALUES (?, ?)", postings)
+        records.clear()
+        postings.clear()
+
+    sources = [(p, crossref_record, "Crossref") for p in expand_paths(crossref_paths)]
+    sources += [(p, arxiv_record, "arXiv") for p in expand_paths(arxiv_paths)]
+    for path, convert, source in sources:
+        print(f"[*] Ingesting {source} snapshot: {path}")
+        for item in open_records(path):
+            try:
+                title, authors, year, doi, arxiv_id, url = convert(item)
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+            tokens = title_tokens(title)
+            if not tokens:
+                continue
+            count += 1
+            records.append((count, title, json.dumps(authors, ensure_ascii=False), year, doi, arxiv_id, url, source))
+            postings.extend((t, count) for t in tokens)
+            if len(records) >= INSERT_BATCH:
+                flush()
+    flush()
+
+    print("[*] Building lookup tables...")
+    conn.execute("CREATE TABLE title_index (token TEXT PRIMARY KEY, df INTEGER, recs BLOB) WITHOUT ROWID")
+    rows = conn.execute("SELECT token, rec FROM postings ORDER BY token, rec")
+    batch = []
+    for token, group in groupby(rows, key=lambda r: r[0]):
+        recs = array('I', (r[1] for r in group))
+        batch.append((token, len(recs), recs.tobytes()))
+        if len(batch) >= INSERT_BATCH:
+            conn.executemany("INSERT INTO title_index VALUES (?, ?, ?)", batch)
+            batch.clear()
+    conn.executemany("INSERT INTO title_index VALUES (?, ?, ?)", batch)
+    conn.executescript("""
+        DROP TABLE postings;
+        CREATE INDEX records_doi ON records (doi) WHERE doi IS NOT NULL AND doi != '';
+        CREATE INDEX records_arxiv ON records (arxiv_id) WHERE arxiv_id IS NOT NULL;
+    """)
+    conn.execute("INSERT INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+    conn.execute("INSERT INTO meta VALUES ('records', ?)", (str(count),))
+    conn.execute("INSERT INTO meta VALUES ('built', ?)", (time.strftime('%Y-%m-%dT%H:%M:%S'),))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp_output, output)
+    print(f"[+] Indexed {count} records into {output} in {time.time() - started:.1f}s")
+    return count
+
+
+class LocalIndex:
+    def __init__(self, path=LOCAL_INDEX_FILE):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Local index not found: {path} (build it with 'main.py index build')")
+        self.path = path
+        self._local = threading.local()
+        version = self._connect().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if not version or int(version[0]) != INDEX_VERSION:
+            raise ValueError(f"Unsupported local index version in {path}, please rebuild it")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = f"file:{os.path.abspath(self.path)}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+        return conn
+
+    def _to_item(self, row, authors=None):
+        # Records are handed out in Crossref's /works item shape so the
+        # existing Crossref parsers and scoring apply unchanged
+        _, title, authors_json, year, doi, arxiv_id, url, source = row
+        item = {"title": [title], "author": json.loads(authors_json) if authors is None else authors,
+                "URL": url, "DOI": doi or '', "source": source}
+        if year:
+            item["issued"] = {"date-parts": [[year]]}
+        if arxiv_id:
+            item["arxiv_id"] = arxiv_id
+        return item
+
+    def by_doi(self, doi):
+        # Repeats the partial index's condition so SQLite can use it
+        row = self._connect().execute("SELECT * FROM records WHERE doi = ? AND doi != '' LIMIT 1",
+                                      (doi.lower(),)).fetchone()
+        return self._to_item(row) if row else None
+
+    def by_arxiv_id(self, arxiv_id):
+        row = self._connect().execute("SELECT * FROM records WHERE arxiv_id = ? LIMIT 1", (arxiv_id,)).fetchone()
+        return self._to_item(row) if row else None
+
+    def search(self, title, limit=MAX_CANDIDATES):
+        tokens = title_tokens(title)
+        if not tokens:
+            return []
+        conn = self._connect()
+        placeholders = ','.join('?' * len(tokens))
+        postings = conn.execute(
+            f"SELECT recs FROM title_index WHERE token IN ({placeholders}) ORDER BY df LIMIT ?",
+            (*tokens, QUERY_TOKENS)
+        ).fetchall()
+        if not postings:
+            return []
+        hits = Counter(chain.from_iterable(array('I', recs) for recs, in postings))
+        # Records sharing several rare tokens first; the rest keep the order of
+        # the rarest token's postings
+        ids = sorted((rec for rec, n in hits.items() if n > 1), key=hits.__getitem__, reverse=True)[:limit]
+        if len(ids) < limit:
+            ids += islice((rec for rec, n in hits.items() if n == 1), limit - len(ids))
+        rows = {row[0]: row for row in conn.execute(
+            f"SELECT * FROM records WHERE id IN ({','.join('?' * len(ids))})", ids)}
+        rows = [rows[rec] for rec in ids]
+        # One decode for all the candidates' author lists
+        authors = json.loads('[' + ','.join(row[2] for row in rows) + ']')
+        return [self._to_item(row, a) for row, a in zip(rows, authors)]
+
+    def stats(self):
+        conn = self._connect()
+        meta = dict(conn.execute("SELECT name, value FROM meta").fetchall())
+        by_source = dict(conn.execute("SELECT source, COUNT(*) FROM records GROUP BY source").fetchall())
+        meta.update({"path": self.path, "size_bytes": os.path.getsize(self.path), "by_source": by_source})
+        return meta
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import re
+import time
+from src.identifiers import extract_identifiers
+
+MANIFEST_FILE = ".citation_manifest.json"
+MANIFEST_VERSION = 1
+
+# Verdicts that describe the reference itself and can be reused while the entry
+# is unchanged; anything else (e.g. a source being down) is checked again
+REUSABLE_STATUSES = ('valid', 'uncertain', 'not_found', 'error')
+
+
+def normalize_field(value):
+    value = (value or '').replace('{', '').replace('}', '')
+    return re.sub(r'\s+', ' ', value).strip().casefold()
+
+
+def entry_hash(entry):
+    ids = extract_identifiers(entry)
+    key = {
+        "title": normalize_field(entry.get('title')),
+        "author": normalize_field(entry.get('author')),
+        "year": normalize_field(entry.get('year')),
+        "ids": {k: v.casefold() for k, v in sorted(ids.items())},
+    }
+    raw = json.dumps(key, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def compact_result(result):
+    # Candidate author lists are only used for scoring, the report never shows them
+    result = {k: v for k, v in result.items() if k != 'authors'}
+    if isinstance(result.get('best_guess'), dict):
+        result['best_guess'] = {k: v for k, v in result['best_guess'].items() if k != 'authors'}
+    return result
+
+
+class Manifest:
+    def __init__(self, path=MANIFEST_FILE, reuse=True):
+        self.path = path
+        self.reuse = reuse
+        self.files = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files = data.get("files", {})
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"[!] Ignoring unreadable manifest {path}: {e}")
+
+    def _file_key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path))
+
+    def lookup(self, file_path, entry):
+        if not self.reuse:
+            return None
+        record = self.files.get(self._file_key(file_path), {}).get(entry_hash(entry))
+        if record and record['result'].get('status') in REUSABLE_STATUSES:
+            return record['result']
+        return None
+
+    def update(self, file_path, results, replace=True):
+        # Replaces the file's records so entries removed from the .bib drop out;
+        # a run over only some entries (--cited) adds to them instead
+        records = {} if replace else dict(self.files.get(self._file_key(file_path), {}))
+        for entry, result in results:
+            records[entry_hash(entry)] = {
+                "id": entry.get('ID', ''),
+                "checked": time.strftime('%Y-%m-%dT%H:%M:%S'),
+                "result": compact_result(result),
+            }
+        self.files[self._file_key(file_path)] = records
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"[!] Failed to write manifest {self.path}: {e}")
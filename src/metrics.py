@@ -0,0 +1,337 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from src.circuit_breaker import breaker_states
+
+METRICS_FILE = ".citation_metrics.json"
+
+# Upper bounds (seconds) of the request latency histogram, as in Prometheus
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Why a lookup ended without an answer. "recent_error" means the cache still
+# holds a failure from the last few minutes, so the source was not asked again;
+# "circuit_open" and "deadline" mean the request was skipped or cut short.
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+RATE_LIMITED = "rate_limited"
+SERVER_ERROR = "server_error"
+CLIENT_ERROR = "client_error"
+PARSE_ERROR = "parse_error"
+RECENT_ERROR = "recent_error"
+CIRCUIT_OPEN = "circuit_open"
+DEADLINE = "deadline"
+OTHER = "other"
+
+
+def classify_exception(exc):
+    import requests
+    if getattr(exc, 'kind', None):
+        return exc.kind
+    if isinstance(exc, (requests.exceptions.Timeout, TimeoutError)):
+        return TIMEOUT
+    if isinstance(exc, (requests.exceptions.ConnectionError, ConnectionError)):
+        return CONNECTION
+    # aiohttp is optional, so its exceptions are recognised by name
+    name = type(exc).__name__
+    if 'Timeout' in name:
+        return TIMEOUT
+    if 'Connect' in name or 'Disconnected' in name:
+        return CONNECTION
+    if isinstance(exc, (ValueError, KeyError, TypeError, IndexError, SyntaxError)):
+        return PARSE_ERROR
+    return OTHER
+
+
+def classify_status(status):
+    # None for answers that settle the lookup (a match, or a definite "no match")
+    if status in (200, 404):
+        return None
+    if status == 429:
+        return RATE_LIMITED
+    if status >= 500:
+        return SERVER_ERROR
+    return CLIENT_ERROR
+
+
+class SourceMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.statuses = Counter()
+        self.exceptions = Counter()
+        self.retries = 0
+        self.rate_limit_wait = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        # Response bodies received, as decoded by the HTTP client
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.coalesced = 0
+        self.failures = Counter()
+        # Search requests made, and those the fixed source order is estimated to need
+        self.searches = 0
+        self.fixed_order_searches = 0
+        self.skipped_searches = 0
+
+    def latency_quantile(self, q):
+        # Upper bound of the bucket holding the q-th request, like histogram_quantile()
+        count = sum(self.latency_buckets)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), self.latency_buckets):
+            seen += n
+            if seen >= rank:
+                return bound if bound != float('inf') else LATENCY_BUCKETS[-1]
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        count = sum(self.latency_buckets)
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "requests": self.requests,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "exceptions": dict(self.exceptions),
+            "retries": self.retries,
+            "rate_limit_wait_seconds": round(self.rate_limit_wait, 3),
+            "bytes": self.bytes,
+            "latency_seconds": {
+                "mean": round(self.latency_sum / count, 4) if count else None,
+                "p50": self.latency_quantile(0.5),
+                "p95": self.latency_quantile(0.95),
+                "p99": self.latency_quantile(0.99),
+            },
+            "cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": round(self.cache_hits / lookups, 3) if lookups else None,
+            },
+            "coalesced": self.coalesced,
+            "failures": dict(self.failures),
+            "searches": {"made": self.searches, "fixed_order_min": self.fixed_order_searches,
+                         "skipped": self.skipped_searches},
+        }
+
+    def add(self, other):
+        self.requests += other.requests
+        self.statuses.update(other.statuses)
+        self.exceptions.update(other.exceptions)
+        self.retries += other.retries
+        self.rate_limit_wait += other.rate_limit_wait
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other.latency_buckets)]
+        self.latency_sum += other.latency_sum
+        self.bytes += other.bytes
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.coalesced += other.coalesced
+        self.failures.update(other.failures)
+        self.searches += other.searches
+        self.fixed_order_searches += other.fixed_order_searches
+        self.skipped_searches += other.skipped_searches
+
+
+def combine_breaker_states(states):
+    # Each worker process has its own breakers; a host counts as skipped if any of them skipped it
+    rank = {"closed": 0, "half_open": 1, "open": 2}
+    combined = {}
+    for snapshot in states:
+        for host, s in snapshot.items():
+            c = combined.setdefault(host, {"state": "closed", "consecutive_failures": 0, "times_opened": 0})
+            if rank.get(s["state"], 0) > rank.get(c["state"], 0):
+                c["state"] = s["state"]
+            c["consecutive_failures"] = max(c["consecutive_failures"], s["consecutive_failures"])
+            c["times_opened"] += s["times_opened"]
+    return dict(sorted(combined.items()))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.sources = {}
+            self.verdicts = Counter()
+            self.worker_breakers = {}
+            self.started = time.time()
+
+    def _source(self, source):
+        metrics = self.sources.get(source)
+        if metrics is None:
+            metrics = self.sources[source] = SourceMetrics()
+        return metrics
+
+    def record_request(self, source, status, seconds, size=0):
+        with self._lock:
+            metrics = self._source(source)
+            metrics.requests += 1
+            metrics.statuses[status] += 1
+            metrics.bytes += size
+            metrics.latency_sum += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    metrics.latency_buckets[i] += 1
+                    break
+            else:
+                metrics.latency_buckets[-1] += 1
+
+    def record_exception(self, source, exc):
+        kind = classify_exception(exc)
+        with self._lock:
+            metrics = self._source(source)
+            metrics.requests += 1
+            metrics.exceptions[kind] += 1
+        return kind
+
+    def record_retry(self, source):
+        with self._lock:
+            self._source(source).retries += 1
+
+    def record_wait(self, source, seconds):
+        if seconds > 0.001:
+            with self._lock:
+                self._source(source).rate_limit_wait += seconds
+
+    def record_cache(self, source, hit):
+        with self._lock:
+            metrics = self._source(source)
+            if hit:
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+
+    def record_coalesced(self, source):
+        with self._lock:
+            self._source(source).coalesced += 1
+
+    def record_failure(self, source, kind):
+        with self._lock:
+            self._source(source).failures[kind] += 1
+
+    def record_searches(self, made, fixed, skipped):
+        with self._lock:
+            for source, n in made.items():
+                self._source(source).searches += n
+            for source, n in fixed.items():
+                self._source(source).fixed_order_searches += n
+            for source, n in skipped.items():
+                self._source(source).skipped_searches += n
+
+    def record_verdicts(self, results):
+        with self._lock:
+            self.verdicts.update(r['status'] for r in results)
+
+    def drain(self):
+        # Hands over the source metrics so far and starts counting again;
+        # worker processes send these to the parent with every shard
+        with self._lock:
+            sources, self.sources = self.sources, {}
+        return sources
+
+    def merge(self, sources, worker=None, breakers=None):
+        with self._lock:
+            for name, metrics in sources.items():
+                self._source(name).add(metrics)
+            if worker is not None:
+                self.worker_breakers[worker] = breakers
+
+    def summary(self):
+        with self._lock:
+            return {
+                "started": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                "duration_seconds": round(time.time() - self.started, 3),
+                "verdicts": dict(self.verdicts),
+                "sources": {name: m.summary() for name, m in sorted(self.sources.items())},
+                "circuit_breakers": combine_breaker_states([breaker_states()] + list(self.worker_breakers.values())),
+            }
+
+    def prometheus(self):
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP citation_{name} {help_text}")
+            lines.append(f"# TYPE citation_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"citation_{name}{{{label_text}}} {value}")
+
+        with self._lock:
+            sources = sorted(self.sources.items())
+            metric("requests_total", "counter", "HTTP responses received, by source and status",
+                   [({"source": s, "status": st}, n) for s, m in sources for st, n in sorted(m.statuses.items())])
+            metric("response_bytes_total", "counter", "Response body bytes received, by source",
+                   [({"source": s}, m.bytes) for s, m in sources])
+            metric("request_exceptions_total", "counter", "Requests that raised instead of answering, by class",
+                   [({"source": s, "kind": k}, n) for s, m in sources for k, n in sorted(m.exceptions.items())])
+            histogram = []
+            for s, m in sources:
+                cumulative = 0
+                for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), m.latency_buckets):
+                    cumulative += n
+                    histogram.append(({"source": s, "le": bound}, cumulative))
+            lines.append("# HELP citation_request_duration_seconds Latency of answered requests")
+            lines.append("# TYPE citation_request_duration_seconds histogram")
+            for labels, value in histogram:
+                lines.append(f'citation_request_duration_seconds_bucket{{source="{labels["source"]}",le="{labels["le"]}"}} {value}')
+            for s, m in sources:
+                lines.append(f'citation_request_duration_seconds_sum{{source="{s}"}} {m.latency_sum:.6f}')
+                lines.append(f'citation_request_duration_seconds_count{{source="{s}"}} {sum(m.latency_buckets)}')
+            metric("retries_total", "counter", "Requests repeated after a 429/503", [({"source": s}, m.retries) for s, m in sources])
+            metric("rate_limit_wait_seconds_total", "counter", "Time spent waiting for the per-host rate limiter",
+                   [({"source": s}, f"{m.rate_limit_wait:.3f}") for s, m in sources])
+            metric("cache_lookups_total", "counter", "Cache lookups, by source and result",
+                   [({"source": s, "result": r}, n) for s, m in sources
+                    for r, n in (("hit", m.cache_hits), ("miss", m.cache_misses))])
+            metric("coalesced_lookups_total", "counter", "Lookups that waited for an identical lookup in flight",
+                   [({"source": s}, m.coalesced) for s, m in sources])
+            metric("lookup_failures_total", "counter", "Lookups that ended without an answer, by class",
+                   [({"source": s, "kind": k}, n) for s, m in sources for k, n in sorted(m.failures.items())])
+            metric("scheduled_searches_total", "counter",
+                   "Search requests made, those the fixed source order would certainly have made, and those of them skipped",
+                   [({"source": s, "order": o}, n) for s, m in sources
+                    for o, n in (("scheduled", m.searches), ("fixed_min", m.fixed_order_searches),
+                                   ("skipped", m.skipped_searches))])
+            metric("verdicts_total", "counter", "Verification verdicts", [({"status": k}, n) for k, n in sorted(self.verdicts.items())])
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, content):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[!] Failed to write metrics {path}: {e}")
+
+    def write_json(self, path=METRICS_FILE):
+        self.write(path, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, path):
+        self.write(path, self.prometheus())
+
+
+METRICS = Metrics()
+
+# Lookup failures of the entry being verified; a context variable so that it
+# follows the entry into asyncio tasks and (when copied) source worker threads
+_failures = contextvars.ContextVar("lookup_failures", default=None)
+
+
+def track_failures():
+    failures = {}
+    _failures.set(failures)
+    return failures
+
+
+def lookup_failed(source, kind):
+    METRICS.record_failure(source, kind)
+    failures = _failures.get()
+    if failures is not None:
+        failures[source] = kind
+    return None
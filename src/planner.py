@@ -0,0 +1,156 @@
+import glob
+import os
+import re
+import threading
+from src.identifiers import extract_identifiers, s2_lookup_id
+from src.manifest import compact_result, entry_hash
+from src.verifier import clean_title, normalize_doi
+
+SKIP_DIRS = {'.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv'}
+
+
+def find_bib_files(paths, recursive=False):
+    files = []
+    for path in paths or ['.']:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, names in os.walk(path):
+                    dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS and not d.startswith('.'))
+                    files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.bib'))
+            else:
+                files.extend(sorted(glob.glob(os.path.join(path, '*.bib'))))
+        else:
+            files.append(path)
+
+    # The same file reached through two arguments is still processed once
+    unique = {}
+    for path in files:
+        unique.setdefault(os.path.realpath(path), os.path.normpath(path))
+    return list(unique.values())
+
+
+def first_author_surname(author):
+    # Same first-author rule as verifier.entry_surname: "Smith, John", "John Smith", "Smith"
+    if not author:
+        return ""
+    author = author.replace('{', '').replace('}', '')
+    first = author.split(',')[0].split(' and ')[0].strip()
+    return (first.split()[-1] if ' ' in first else first).casefold()
+
+
+def reference_fingerprint(entry):
+    year = re.search(r'\d{4}', entry.get('year', '') or '')
+    year = year.group() if year else ''
+    title = re.sub(r'[^\w\s]', ' ', clean_title(entry.get('title', '')).casefold())
+    title = re.sub(r'\s+', ' ', title).strip()
+    key = f"title:{title}|{first_author_surname(entry.get('author', ''))}|{year}"
+    # Identifier lookups still compare the title (and fall back to a title search),
+    # so an entry reusing a real paper's ID must not inherit that paper's verdict
+    ids = extract_identifiers(entry)
+    s2_id = s2_lookup_id(ids)
+    if s2_id:
+        key = f"s2:{s2_id.casefold()}|{key}"
+    if 'arxiv' in ids:
+        key = f"arxiv:{ids['arxiv'].casefold()}|{key}"
+    if 'doi' in ids:
+        key = f"doi:{normalize_doi(ids['doi'])}|{key}"
+    return key
+
+
+class FilePlan:
+    def __init__(self, path, entries=None):
+        self.path = path
+        self.entries = entries if entries is not None else []
+        self.results = [None] * len(self.entries)
+        self.errors = {}
+        self.reused = 0
+        self.resumed = 0
+        # Optional ResultStream that receives each verdict as soon as it is known
+        self.stream = None
+
+    def set_result(self, i, verification, exc=None):
+        if exc is not None:
+            self.errors[i] = exc
+        else:
+            # Candidate author lists are dropped right away; large runs keep only what the report shows
+            self.results[i] = compact_result(verification)
+        if self.stream is not None:
+            self.stream.write(i, verification, exc)
+
+    def ordered_results(self):
+        return [(e, r) for e, r in zip(self.entries, self.results) if r is not None]
+
+
+class RunPlan:
+    # Verifies each distinct reference once and fans the verdict back out to
+    # every entry (in every file) that shares it. Entries can be added while
+    # verification is already running: a reference seen again after its
+    # verdict came in gets that verdict straight away.
+    def __init__(self, manifest=None):
+        self.manifest = manifest
+        self.files = []
+        self.unique = {}
+        self.members = {}
+        self.finished = {}
+        self._lock = threading.Lock()
+
+    def start_file(self, path):
+        plan = FilePlan(path)
+        with self._lock:
+            self.files.append(plan)
+        return plan
+
+    def drop_file(self, plan):
+        with self._lock:
+            self.files.remove(plan)
+
+    def add_entry(self, plan, entry, resumed=None):
+        # Returns the entry if it is a reference that still needs verifying.
+        # resumed: {index: (hash, result)} from an interrupted run's JSON Lines report
+        with self._lock:
+            i = len(plan.entries)
+            plan.entries.append(entry)
+            plan.results.append(None)
+            previous = resumed.get(i) if resumed else None
+            if previous is not None and previous[0] == entry_hash(entry):
+                plan.set_result(i, previous[1])
+                plan.resumed += 1
+                return None
+            previous = self.manifest.lookup(plan.path, entry) if self.manifest is not None else None
+            if previous is not None:
+                plan.set_result(i, previous)
+                plan.reused += 1
+                return None
+            fingerprint = reference_fingerprint(entry)
+            self.members.setdefault(fingerprint, []).append((plan, i))
+            if fingerprint in self.finished:
+                plan.set_result(i, *self.finished[fingerprint])
+                return None
+            if fingerprint in self.unique:
+                return None
+            self.unique[fingerprint] = entry
+            return entry
+
+    def add_file(self, path, entries, resumed=None):
+        plan = self.start_file(path)
+        for entry in entries:
+            self.add_entry(plan, entry, resumed)
+        return plan
+
+    @property
+    def entry_count(self):
+        return sum(len(p.entries) for p in self.files)
+
+    @property
+    def pending_count(self):
+        return sum(len(m) for m in self.members.values())
+
+    def pending_entries(self):
+        return list(self.unique.values())
+
+    def record(self, entry, verification, exc):
+        fingerprint = reference_fingerprint(entry)
+        with self._lock:
+            self.finished[fingerprint] = (compact_result(verification) if exc is None else None, exc)
+            for plan, i in self.members[fingerprint]:
+                plan.set_result(i, verification, exc)
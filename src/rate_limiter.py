@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+# requests/second and burst size per API host. These are starting values:
+# hosts that advertise their budget (Crossref's X-Rate-Limit-* headers) are
+# re-tuned from the first response onwards.
+RATE_LIMITS = {
+    "api.crossref.org": (10.0, 10),
+    "export.arxiv.org": (1 / 3, 1),  # arXiv asks for one request every 3 seconds
+    "api.semanticscholar.org": (1.0, 1),
+}
+DEFAULT_RATE_LIMIT = (2.0, 2)
+
+# Share of each host's budget this process may use; worker processes of a
+# sharded run split it between them
+RATE_SHARE = 1.0
+
+ADAPT_TO_HEADERS = True
+DEFAULT_RETRY_WAIT = 3
+MAX_RETRY_WAIT = 120
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        # Takes a token immediately (possibly going into debt) and returns how
+        # long the caller must wait before using it. Callers sleep outside the
+        # lock, so threads and coroutines can share one bucket.
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, cancel=None, max_wait=None):
+        # With a cancel event the wait ends early once it is set; the token is
+        # handed back and False returned so the caller can skip the request.
+        # The same happens up front when the wait would exceed max_wait.
+        wait = self.reserve()
+        if max_wait is not None and wait > max_wait:
+            self.refund()
+            return False
+        if wait > 0:
+            if cancel is None:
+                time.sleep(wait)
+            elif cancel.wait(wait):
+                self.refund()
+                return False
+        if cancel is not None and cancel.is_set():
+            self.refund()
+            return False
+        return True
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def update(self, rate, burst=None):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(1, int(burst))
+                self._tokens = min(self._tokens, self.burst)
+
+    def block_for(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def host_of(url):
+    # Services on different ports of one host (e.g. local stand-ins) get their own bucket
+    parts = urlsplit(url)
+    if not parts.hostname:
+        return url
+    return f"{parts.hostname}:{parts.port}" if parts.port else parts.hostname
+
+
+def get_bucket(url):
+    host = host_of(url)
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            rate, burst = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+            bucket = _buckets[host] = TokenBucket(rate * RATE_SHARE, burst * RATE_SHARE)
+        return bucket
+
+
+def configure_rate_limit(host, rate, burst=None):
+    if rate <= 0:
+        raise ValueError(f"Rate for {host} must be positive")
+    burst = burst or max(1, int(rate))
+    RATE_LIMITS[host] = (rate, burst)
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+    if bucket is not None:
+        bucket.update(rate * RATE_SHARE, burst * RATE_SHARE)
+
+
+def set_rate_share(share):
+    global RATE_SHARE
+    RATE_SHARE = share
+    with _buckets_lock:
+        buckets = list(_buckets.items())
+    for host, bucket in buckets:
+        rate, burst = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+        bucket.update(rate * share, burst * share)
+
+
+def parse_rate_spec(spec):
+    # "api.crossref.org=20" or "api.crossref.org=20:40"
+    host, _, value = spec.partition('=')
+    if not host or not value:
+        raise ValueError(f"Invalid rate limit '{spec}', expected HOST=RPS[:BURST]")
+    rate, _, burst = value.partition(':')
+    return host.strip(), float(rate), int(burst) if burst else None
+
+
+def parse_interval(value):
+    value = value.strip().lower()
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    for suffix in ('ms', 's', 'm', 'h'):
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * units[suffix]
+    return float(value)
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # HTTP-date form; rare enough that email.utils is only imported for it
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def observe_response(url, status_code, headers):
+    bucket = get_bucket(url)
+    if ADAPT_TO_HEADERS:
+        limit = headers.get('X-Rate-Limit-Limit')
+        interval = headers.get('X-Rate-Limit-Interval')
+        if limit and interval:
+            try:
+                limit = int(limit)
+                rate = limit / parse_interval(interval) * RATE_SHARE
+                burst = max(1, int(limit * RATE_SHARE))
+                if rate > 0 and (abs(rate - bucket.rate) > 1e-6 or burst != bucket.burst):
+                    bucket.update(rate, burst)
+            except (ValueError, ZeroDivisionError):
+                pass
+
+    if status_code in (429, 503):
+        return parse_retry_after(headers.get('Retry-After'))
+    return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return min(retry_after, MAX_RETRY_WAIT)
+    return min(DEFAULT_RETRY_WAIT * (2 ** attempt) + random.uniform(0, 1), MAX_RETRY_WAIT)
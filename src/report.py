@@ -0,0 +1,228 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from src.manifest import REUSABLE_STATUSES, compact_result, entry_hash
+
+REPORT_FORMATS = ("md", "csv", "junit")
+
+# Results are appended to <file>_report.jsonl as they complete, one JSON object
+# per line after a header line. The Markdown, CSV and JUnit reports are
+# rendered from that file once the run is over, and an interrupted run can
+# pick up from it with --resume.
+
+
+def report_base(file_path):
+    return f"{file_path}_report"
+
+
+def clean_entry_title(entry):
+    return entry.get('title', 'No Title').replace('{', '').replace('}', '')
+
+
+def load_partial(path):
+    # Verdicts of a previous (possibly interrupted) run as {index: (entry hash, result)};
+    # the plan only reuses one if the entry at that index is unchanged
+    if not os.path.exists(path):
+        return {}
+    resumed = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The line being written when the run was killed
+                continue
+            result = record.get('result')
+            if isinstance(record.get('index'), int) and result and result.get('status') in REUSABLE_STATUSES:
+                resumed[record['index']] = (record.get('hash'), result)
+    return resumed
+
+
+class ResultStream:
+    def __init__(self, file_path, entries):
+        self.file_path = file_path
+        self.entries = entries
+        self.path = report_base(file_path) + ".jsonl"
+        self.counts = Counter()
+        self.errors = 0
+        self._file = open(self.path, 'w', encoding='utf-8')
+        # Entries are still being parsed; their count goes in the closing line
+        self._write({"report": os.path.basename(file_path), "started": time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # Flushed line by line so a crash or Ctrl+C keeps everything verified so far
+        self._file.flush()
+
+    def write(self, index, result=None, error=None):
+        entry = self.entries[index]
+        record = {"index": index, "id": entry.get('ID', 'Unknown'), "hash": entry_hash(entry),
+                  "title": clean_entry_title(entry)}
+        if error is not None:
+            record["error"] = str(error)
+            self.errors += 1
+        else:
+            record["result"] = compact_result(result)
+            self.counts[result['status']] += 1
+        self._write(record)
+
+    def summary(self):
+        return {
+            "valid": self.counts['valid'],
+            "uncertain": self.counts['uncertain'],
+            "unavailable": self.counts['unavailable'],
+            "failed": self.errors + sum(n for k, n in self.counts.items() if k not in ('valid', 'uncertain', 'unavailable')),
+        }
+
+    def discard(self):
+        self._file.close()
+        os.remove(self.path)
+
+    def close(self):
+        if not self._file.closed:
+            self._write({"entries": len(self.entries), "finished": time.strftime('%Y-%m-%dT%H:%M:%S')})
+            self._file.close()
+
+
+def read_records(path):
+    header = {"report": os.path.basename(path)}
+    records = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'index' in record:
+                records[record['index']] = record
+            else:
+                header.update(record)
+    # A report cut short has no closing line with the entry count
+    header.setdefault("entries", len(records))
+    return header, [records[i] for i in sorted(records)]
+
+
+def summary_counts(records):
+    counts = Counter()
+    for record in records:
+        if 'error' in record:
+            counts['not_found'] += 1
+        else:
+            counts[record['result']['status']] += 1
+    return {
+        "valid": counts['valid'],
+        "uncertain": counts['uncertain'],
+        "unavailable": counts['unavailable'],
+        "failed": sum(n for k, n in counts.items() if k not in ('valid', 'uncertain', 'unavailable')),
+    }
+
+
+def render_markdown(path, header, records, counts):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"# Verification Report: {header['report']}\n\n")
+        f.write(f"**Processed at**: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+        f.write("## Detailed Results\n\n")
+        for record in records:
+            if 'error' in record:
+                continue
+            result = record['result']
+            status = result['status']
+
+            if status == 'valid':
+                symbol = "✅ [PASSED]"
+            elif status == 'uncertain':
+                symbol = "⚠️ [DOUBTFUL]"
+            elif status == 'unavailable':
+                symbol = "🔌 [UNCHECKED]"
+            else:
+                symbol = "❌ [NOT FOUND]"
+
+            f.write(f"### {symbol} ID: {record['id']}\n")
+            f.write(f"- **Original Title**: {record['title']}\n")
+
+            if status == 'valid':
+                f.write(f"- **Matched Title**: {result.get('title', '')}\n")
+                f.write(f"- **Similarity**: {result.get('score', 0):.2f}%\n")
+                f.write(f"- **Link**: {result.get('url', '')}\n")
+                f.write(f"- **Source**: {result.get('source', '')}\n")
+            elif status == 'uncertain':
+                f.write(f"- **Reason**: {result.get('reason', '')}\n")
+                f.write(f"- **Source**: {result.get('source', '')}\n")
+            else:
+                f.write(f"- **Reason**: {result.get('reason', 'No match found above threshold')}\n")
+
+            f.write("\n---\n\n")
+
+        f.write("## Summary\n")
+        f.write(f"- **Total**: {header['entries']}\n")
+        f.write(f"- **Passed**: {counts['valid']}\n")
+        f.write(f"- **Doubtful**: {counts['uncertain']}\n")
+        f.write(f"- **Unchecked (lookup failed)**: {counts['unavailable']}\n")
+        f.write(f"- **Not Found**: {counts['failed']}\n")
+
+
+def render_csv(path, header, records, counts):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "status", "original_title", "matched_title", "score", "source", "url", "reason"])
+        for record in records:
+            result = record.get('result') or {"status": "error", "reason": record.get('error', '')}
+            score = result.get('score')
+            writer.writerow([record['id'], result['status'], record['title'], result.get('title', ''),
+                             f"{score:.2f}" if isinstance(score, (int, float)) else '',
+                             result.get('source', ''), result.get('url', ''), result.get('reason', '')])
+
+
+def render_junit(path, header, records, counts):
+    # One test case per entry: not found entries fail, unchecked ones are skipped
+    # and entries whose check raised are errors; the totals are counted the same way.
+    # saxutils imports urllib.request, so it is only loaded when JUnit is asked for.
+    from xml.sax.saxutils import escape, quoteattr
+    statuses = Counter(r['result']['status'] if r.get('result') is not None else None for r in records)
+    errors = statuses.pop(None, 0)
+    skipped = statuses['unavailable']
+    failures = sum(n for status, n in statuses.items() if status not in ('valid', 'uncertain', 'unavailable'))
+    name = quoteattr(header['report'])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<testsuites name="citation-check" tests="{len(records)}" failures="{failures}" errors="{errors}">\n')
+        f.write(f'  <testsuite name={name} tests="{len(records)}" failures="{failures}" '
+                f'errors="{errors}" skipped="{skipped}">\n')
+        for record in records:
+            f.write(f'    <testcase classname={name} name={quoteattr(record["id"])}>\n')
+            result = record.get('result')
+            if result is None:
+                f.write(f'      <error message={quoteattr(record.get("error", ""))}/>\n')
+            elif result['status'] == 'unavailable':
+                f.write(f'      <skipped message={quoteattr(result.get("reason", ""))}/>\n')
+            elif result['status'] not in ('valid', 'uncertain'):
+                message = result.get('reason', 'No match found above threshold')
+                f.write(f'      <failure message={quoteattr(message)}>{escape(record["title"])}</failure>\n')
+            elif result['status'] == 'uncertain':
+                f.write(f'      <system-out>{escape(result.get("reason", ""))}</system-out>\n')
+            f.write('    </testcase>\n')
+        f.write('  </testsuite>\n</testsuites>\n')
+
+
+RENDERERS = {
+    "md": render_markdown,
+    "csv": render_csv,
+    "junit": render_junit,
+}
+EXTENSIONS = {"md": ".md", "csv": ".csv", "junit": ".xml"}
+
+
+def render_reports(jsonl_path, formats, base=None, counts=None):
+    header, records = read_records(jsonl_path)
+    counts = counts or summary_counts(records)
+    if base is None:
+        base = jsonl_path[:-len(".jsonl")] if jsonl_path.endswith(".jsonl") else jsonl_path
+    written = []
+    for fmt in formats:
+        path = base + EXTENSIONS[fmt]
+        RENDERERS[fmt](path, header, records, counts)
+        written.append(path)
+    return written
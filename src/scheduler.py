@@ -0,0 +1,229 @@
+import re
+import threading
+import time
+from collections import Counter
+from src import verifier
+from src.cache import HIT
+from src.identifiers import extract_identifiers, s2_lookup_id
+from src.metrics import METRICS
+
+# Cost-aware ordering of a run's lookups. Within each batch, references whose
+# answer is already cached go first, then those with a DOI/arXiv/S2 identifier,
+# then those that need a title search, cheapest expected search first. Each
+# search tries its sources in the order expected to reach an accepted match
+# with the least waiting: a source whose answer is cached is free, preprints
+# start at arXiv and Semantic Scholar, and as the run goes on the order follows
+# each source's measured hit rate and latency (rate-limit waits included).
+
+ADAPTIVE = "adaptive"
+FIXED = "fixed"
+SCHEDULES = (ADAPTIVE, FIXED)
+SCHEDULE = ADAPTIVE
+
+CROSSREF = "crossref_search"
+ARXIV = "arxiv"
+S2 = "semantic_scholar"
+# The order verifier.SEARCH_SOURCES uses without a scheduler
+FIXED_ORDER = (CROSSREF, ARXIV, S2)
+
+PREPRINT = "preprint"
+CS_VENUE = "cs_venue"
+OTHER = "other"
+# Starting order of the sources for each kind of entry
+ROUTES = {
+    PREPRINT: (ARXIV, S2, CROSSREF),
+    CS_VENUE: (S2, ARXIV, CROSSREF),
+    OTHER: FIXED_ORDER,
+}
+VENUE_FIELDS = ('journal', 'booktitle', 'howpublished', 'note', 'publisher', 'institution')
+PREPRINT_RE = re.compile(r'\b(?:arxiv|preprint|corr|biorxiv|medrxiv|ssrn|openreview)\b', re.IGNORECASE)
+# Conference proceedings that Crossref indexes poorly or not at all
+CS_VENUE_RE = re.compile(
+    r'\b(?:neurips|nips|icml|iclr|aaai|ijcai|cvpr|iccv|eccv|wacv|bmvc|acl|emnlp|naacl|eacl|coling|'
+    r'kdd|wsdm|sigir|recsys|uai|aistats|colt|interspeech|icassp|icra|iros|corl|osdi|sosp|nsdi|'
+    r'usenix|ndss|workshop)\b', re.IGNORECASE)
+
+# Estimates lean on these until a source has answered PRIOR_WEIGHT lookups:
+# a guessed latency, and hit rates falling with the position in the route
+PRIOR_WEIGHT = 5
+PRIOR_SECONDS = 0.5
+PRIOR_HIT_RATES = (0.6, 0.4, 0.3)
+MIN_HIT_RATE = 0.02
+
+
+def entry_kind(entry):
+    if 'arxiv' in extract_identifiers(entry):
+        return PREPRINT
+    venue = ' '.join(entry.get(f, '') for f in VENUE_FIELDS)
+    if PREPRINT_RE.search(venue):
+        return PREPRINT
+    if CS_VENUE_RE.search(venue):
+        return CS_VENUE
+    return OTHER
+
+
+def identifier_keys(ids):
+    keys = []
+    if 'doi' in ids:
+        keys.append(verifier.get_cache_key("crossref_doi", verifier.normalize_doi(ids['doi'])))
+    if 'arxiv' in ids:
+        keys.append(verifier.get_cache_key("arxiv_id", ids['arxiv']))
+    s2_id = s2_lookup_id(ids)
+    if s2_id:
+        keys.append(verifier.get_cache_key("s2_id", s2_id))
+    return keys
+
+
+def search_keys(clean_t, author, year):
+    return {name: verifier.search_cache_key(name, clean_t, author, year) for name in FIXED_ORDER}
+
+
+def cached_answers(keys, records):
+    # {name: accepted} for the sources whose answer to this entry is cached
+    answers = {}
+    for name, key in keys.items():
+        if key in records:
+            kind, value = records[key]
+            answers[name] = kind == HIT and verifier.is_accepted(value)
+    return answers
+
+
+class Route:
+    # The search sources one entry tries, and what became of them
+    __slots__ = ('kind', 'order', 'cached', 'outcomes', 'failures')
+
+    def __init__(self, kind, order, cached, failures=None):
+        self.kind = kind
+        self.order = order
+        self.cached = cached
+        self.outcomes = {}
+        self.failures = failures if failures is not None else {}
+
+
+class Scheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # name -> [network calls, seconds]; (kind, name) -> [lookups, accepted]
+            self.latency = {}
+            self.hits = {}
+
+    def estimates(self, kind, name):
+        # (expected seconds of a network lookup, probability it finds an accepted match)
+        position = ROUTES[kind].index(name)
+        with self._lock:
+            calls, seconds = self.latency.get(name, (0, 0.0))
+            lookups, accepted = self.hits.get((kind, name), (0, 0))
+        cost = (seconds + PRIOR_WEIGHT * PRIOR_SECONDS) / (calls + PRIOR_WEIGHT)
+        rate = (accepted + PRIOR_WEIGHT * PRIOR_HIT_RATES[position]) / (lookups + PRIOR_WEIGHT)
+        return cost, max(rate, MIN_HIT_RATE)
+
+    def order(self, kind, cached):
+        if SCHEDULE == FIXED:
+            return FIXED_ORDER
+
+        def rank(name):
+            # Cached answers cost nothing; otherwise seconds per accepted match,
+            # the order that minimises the expected time of a sequential search
+            if name in cached:
+                return 0.0
+            cost, rate = self.estimates(kind, name)
+            return cost / rate
+
+        return tuple(sorted(ROUTES[kind], key=rank))
+
+    def route(self, entry, clean_t, author, year, failures=None):
+        kind = entry_kind(entry)
+        keys = search_keys(clean_t, author, year)
+        records = {r[0]: (r[1], r[3]) for r in verifier.get_cache().lookup_records(list(keys.values()))}
+        cached = cached_answers(keys, records)
+        return Route(kind, self.order(kind, cached), cached, failures)
+
+    def expected_cost(self, route):
+        # Expected seconds of a sequential search along the route
+        total = 0.0
+        reach = 1.0
+        for name in route.order:
+            if name in route.cached:
+                if route.cached[name]:
+                    break
+                continue
+            cost, rate = self.estimates(route.kind, name)
+            total += reach * cost
+            reach *= 1 - rate
+        return total
+
+    def observe(self, route, name, seconds, res):
+        accepted = verifier.is_accepted(res)
+        route.outcomes[name] = accepted
+        if name in route.failures:
+            # Skipped or failed: says nothing about the source's matches
+            return
+        with self._lock:
+            if name not in route.cached:
+                stats = self.latency.setdefault(name, [0, 0.0])
+                stats[0] += 1
+                stats[1] += seconds
+            stats = self.hits.setdefault((route.kind, name), [0, 0])
+            stats[0] += 1
+            stats[1] += accepted
+
+    def timed_lookups(self, route, searches, clean_t, author, year):
+        # searches: {name: lookup}; returns the route's lookup steps, timed
+        def timed(name, lookup):
+            started = time.monotonic()
+            res = yield from lookup
+            self.observe(route, name, time.monotonic() - started, res)
+            return res
+        return [timed(name, searches[name](clean_t, author, year)) for name in route.order]
+
+    def finish(self, route):
+        # Counts the network lookups a sequential search made, against those the
+        # fixed order would certainly have made: it walks the fixed order through
+        # the outcomes this search saw and stops at the first source whose answer
+        # is unknown, which the fixed order would have asked but this search did not
+        made = Counter(name for name in route.outcomes if name not in route.cached)
+        fixed = Counter()
+        skipped = Counter()
+        for name in FIXED_ORDER:
+            if name in route.cached:
+                if route.cached[name]:
+                    break
+                continue
+            fixed[name] += 1
+            if name not in route.outcomes:
+                skipped[name] += 1
+                break
+            if route.outcomes[name]:
+                break
+        METRICS.record_searches(made, fixed, skipped)
+
+    def order_entries(self, entries):
+        # Cheapest first; the sort is stable, so ties keep the file order
+        if SCHEDULE == FIXED:
+            return entries
+        queries = [verifier.entry_query(entry) for entry in entries]
+        ids = [extract_identifiers(entry) for entry in entries]
+        keys = [(identifier_keys(i), search_keys(*q)) for i, q in zip(ids, queries)]
+        wanted = [k for id_keys, s_keys in keys for k in id_keys + list(s_keys.values())]
+        cache = verifier.get_cache()
+        cache.prefetch(wanted)
+        records = {r[0]: (r[1], r[3]) for r in cache.lookup_records(wanted)}
+
+        def cost(i):
+            id_keys, s_keys = keys[i]
+            cached = cached_answers(s_keys, records)
+            if any(records.get(k, (None,))[0] == HIT for k in id_keys) or any(cached.values()):
+                return 0, 0.0
+            if ids[i]:
+                return 1, 0.0
+            kind = entry_kind(entries[i])
+            return 2, self.expected_cost(Route(kind, self.order(kind, cached), cached))
+
+        return [entries[i] for i in sorted(range(len(entries)), key=cost)]
+
+
+SCHEDULER = Scheduler()
@@ -0,0 +1,250 @@
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src import verifier
+from src.bib_parser import parse_bibtex_string
+from src.cache_share import pack_line
+from src.manifest import compact_result
+from src.metrics import METRICS
+from src.planner import reference_fingerprint
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8377
+MAX_BODY = 20 * 1024 * 1024
+MAX_CACHE_KEYS = 5000
+
+# Long-running verification service. One process keeps the cache, the per-host
+# rate limiters, circuit breakers and the workers' keep-alive sessions warm
+# across requests, and streams results back as JSON Lines as they complete.
+#
+#   POST /verify   {"entry": {...}} | {"entries": [...]} | {"bibtex": "..."}
+#                  or a raw .bib body (Content-Type: text/x-bibtex)
+#   POST /cache/lookup  {"key_version": 1, "keys": [...]}: the cached records
+#                  of those keys, for other machines reading through with --cache-remote
+#   GET  /health   liveness, uptime and lookups in flight
+#   GET  /metrics  per-source metrics in Prometheus text format
+
+
+class VerificationService:
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.started = time.time()
+        self.in_flight = {}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def submit(self, entry):
+        # Clients asking about the same reference at the same time share one lookup
+        fingerprint = reference_fingerprint(entry)
+        with self._lock:
+            future = self.in_flight.get(fingerprint)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self.in_flight[fingerprint] = self.executor.submit(verifier.verify_citation, entry)
+        future.add_done_callback(lambda f: self.forget(fingerprint, f))
+        return future
+
+    def forget(self, fingerprint, future):
+        with self._lock:
+            if self.in_flight.get(fingerprint) is future:
+                del self.in_flight[fingerprint]
+
+    def verify(self, entries):
+        # Yields (index, result, exception) in completion order
+        if len(entries) > 1:
+            # Same bulk DOI/arXiv prefetch as a CLI run, so a whole .bib costs a few batch requests
+            verifier.resolve_identifiers(entries)
+        members = {}
+        for i, entry in enumerate(entries):
+            members.setdefault(self.submit(entry), []).append(i)
+        for future in as_completed(members):
+            try:
+                result, exc = future.result(), None
+            except Exception as e:
+                result, exc = None, e
+            for i in members[future]:
+                yield i, result, exc
+
+    def health(self):
+        with self._lock:
+            in_flight = len(self.in_flight)
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "in_flight": in_flight,
+            "coalesced": self.coalesced,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        verifier.save_cache()
+
+
+def cache_lookup(payload):
+    # Returns (status, response body)
+    if not isinstance(payload, dict) or not isinstance(payload.get("keys"), list):
+        return 400, {"error": "expected 'keys'"}
+    if payload.get("key_version") != verifier.CACHE_KEY_VERSION:
+        return 409, {"error": f"cache key version {payload.get('key_version')} requested, "
+                              f"this server uses {verifier.CACHE_KEY_VERSION}"}
+    keys = [str(k) for k in payload["keys"][:MAX_CACHE_KEYS]]
+    records = verifier.get_cache().lookup_records(keys)
+    return 200, {"records": [pack_line(r) for r in records]}
+
+
+def read_entries(content_type, body):
+    if not content_type.startswith("application/json"):
+        return parse_bibtex_string(body.decode('utf-8'))
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("expected a JSON object")
+    if "bibtex" in payload:
+        return parse_bibtex_string(payload["bibtex"])
+    if "entry" in payload:
+        entries = [payload["entry"]]
+    else:
+        entries = payload.get("entries")
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError("expected 'entry', 'entries' or 'bibtex'")
+    # Entries posted as JSON use the same field names as the BibTeX parser
+    return [{str(k): str(v) for k, v in e.items()} for e in entries]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CitationCheck"
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, self.server.service.health())
+        elif self.path == "/metrics":
+            body = METRICS.prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/verify", "/cache/lookup"):
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self.send_json(413, {"error": f"payload larger than {MAX_BODY} bytes"})
+            self.close_connection = True
+            return
+        if self.path == "/cache/lookup":
+            try:
+                payload = json.loads(self.rfile.read(length))
+            except ValueError as e:
+                self.send_json(400, {"error": f"could not read keys: {e}"})
+                return
+            self.send_json(*cache_lookup(payload))
+            return
+        try:
+            entries = read_entries(self.headers.get("Content-Type", ""), self.rfile.read(length))
+        except Exception as e:
+            self.send_json(400, {"error": f"could not read entries: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        counts = {}
+        started = time.perf_counter()
+        try:
+            for i, result, exc in self.server.service.verify(entries):
+                line = {"index": i, "id": entries[i].get('ID')}
+                if exc is not None:
+                    line["error"] = str(exc)
+                    counts["error"] = counts.get("error", 0) + 1
+                else:
+                    line["result"] = compact_result(result)
+                    counts[result['status']] = counts.get(result['status'], 0) + 1
+                    METRICS.record_verdicts([result])
+                self.write_chunk(json.dumps(line, ensure_ascii=False).encode('utf-8') + b"\n")
+            summary = {"done": True, "entries": len(entries), "verdicts": counts,
+                       "seconds": round(time.perf_counter() - started, 3)}
+            self.write_chunk(json.dumps(summary).encode('utf-8') + b"\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; lookups already started still fill the cache
+            self.close_connection = True
+        verifier.save_cache()
+
+
+class HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__(address, RequestHandler)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, RequestHandler)
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, workers=5, verbose=False):
+    service = VerificationService(workers)
+    if socket_path:
+        server = UnixHTTPServer(socket_path, service, verbose)
+        where = f"unix:{socket_path}"
+    else:
+        server = HTTPServer((host, port), service, verbose)
+        where = f"http://{host}:{server.server_address[1]}"
+    print(f"[*] Verification service listening on {where} ({workers} workers). Press Ctrl+C to stop.")
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Service managers stop with SIGTERM; shut down as cleanly as on Ctrl+C
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[*] Shutting down...")
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
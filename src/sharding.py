@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from src import circuit_breaker, http_client, rate_limiter, verifier
+from src.circuit_breaker import breaker_states
+from src.metrics import METRICS
+from src import scheduler
+
+# Sharded verification: the parent parses the inputs and hands shards of
+# references to worker processes. Each worker resolves its shard's identifiers
+# in bulk, verifies it with its own thread pool or event loop, and sends back
+# the verdicts together with its metrics, so scoring and response parsing use
+# every core instead of one. The workers share the SQLite cache (WAL mode
+# allows concurrent readers and writers) and split each host's rate limit.
+
+SHARD_SIZE = 1000
+# Shards queued per worker beyond the one it is verifying, so the parser stays ahead
+SHARDS_AHEAD = 1
+
+WORKER = None
+
+
+def worker_settings(engine, workers, concurrency):
+    # Everything a fresh process needs to verify like this one; spawned
+    # workers start from the module defaults
+    cache = verifier.get_cache()
+    return {
+        "engine": engine,
+        "workers": workers,
+        "concurrency": concurrency,
+        "urls": {name: getattr(verifier, name) for name in
+                 ("CROSSREF_API_URL", "SEMANTIC_SCHOLAR_API_URL", "SEMANTIC_SCHOLAR_BATCH_URL", "ARXIV_API_URL")},
+        "source_mode": verifier.SOURCE_MODE,
+        "crossref_select": verifier.CROSSREF_SELECT,
+        "schedule": scheduler.SCHEDULE,
+        "hedge_delay": verifier.HEDGE_DELAY,
+        "entry_deadline": verifier.ENTRY_DEADLINE,
+        "run_deadline": http_client.time_left() if http_client.RUN_DEADLINE is not None else None,
+        "index": verifier.LOCAL_INDEX.path if verifier.LOCAL_INDEX is not None else None,
+        "offline": verifier.OFFLINE,
+        "cache_backend": cache.name,
+        "cache_path": getattr(cache, 'path', None),
+        "cache_remote": getattr(cache, 'remote', None),
+        "rate_limits": dict(rate_limiter.RATE_LIMITS),
+        "breaker_threshold": circuit_breaker.FAILURE_THRESHOLD,
+        "breaker_cooldown": circuit_breaker.COOL_DOWN,
+    }
+
+
+def init_worker(settings, processes):
+    global WORKER
+    # Ctrl+C is handled by the parent, which terminates the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for name, url in settings["urls"].items():
+        setattr(verifier, name, url)
+    verifier.SOURCE_MODE = settings["source_mode"]
+    verifier.CROSSREF_SELECT = settings["crossref_select"]
+    scheduler.SCHEDULE = settings["schedule"]
+    verifier.HEDGE_DELAY = settings["hedge_delay"]
+    verifier.ENTRY_DEADLINE = settings["entry_deadline"]
+    http_client.set_run_deadline(max(settings["run_deadline"], 0.001) if settings["run_deadline"] is not None else None)
+    verifier.load_cache(settings["cache_backend"], settings["cache_path"], settings["cache_remote"])
+    if settings["index"]:
+        verifier.load_local_index(settings["index"])
+    verifier.OFFLINE = settings["offline"]
+    rate_limiter.RATE_LIMITS.update(settings["rate_limits"])
+    rate_limiter.set_rate_share(1 / processes)
+    circuit_breaker.configure_breakers(settings["breaker_threshold"], settings["breaker_cooldown"])
+
+    WORKER = settings
+    if settings["engine"] == "threads":
+        WORKER["executor"] = ThreadPoolExecutor(max_workers=settings["workers"])
+
+
+def verify_shard(entries):
+    # Runs in a worker process; returns [(result, error message)] in entry order
+    totals = verifier.resolve_identifiers(entries)
+    ordered = scheduler.SCHEDULER.order_entries(entries)
+    positions = {id(entry): i for i, entry in enumerate(entries)}
+    outcomes = [None] * len(entries)
+    if WORKER["engine"] == "async":
+        from src.async_engine import verify_citations
+
+        def on_result(entry, verification, exc):
+            outcomes[positions[id(entry)]] = (verification, None if exc is None else str(exc))
+
+        verify_citations(ordered, concurrency=WORKER["concurrency"], on_result=on_result)
+    else:
+        futures = [(positions[id(entry)], WORKER["executor"].submit(verifier.verify_citation, entry)) for entry in ordered]
+        for i, future in futures:
+            try:
+                outcomes[i] = (future.result(), None)
+            except Exception as exc:
+                outcomes[i] = (None, str(exc))
+    verifier.save_cache()
+    return outcomes, totals, METRICS.drain(), breaker_states(), os.getpid()
+
+
+def shards(batches, size=SHARD_SIZE):
+    shard = []
+    for batch in batches:
+        shard.extend(batch)
+        if len(shard) >= size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def verify_sharded(batches, processes, settings, on_result, totals, on_shard=None):
+    # batches: lists of entries not yet resolved, possibly still being parsed.
+    # on_result(entry, verification, exc) is called with the parent's own entry objects.
+    slots = threading.BoundedSemaphore(processes * (1 + SHARDS_AHEAD))
+
+    def done(shard, payload):
+        try:
+            outcomes, resolved, sources, breakers, worker = payload
+            METRICS.merge(sources, worker, breakers)
+            totals.update(resolved)
+            for entry, (verification, error) in zip(shard, outcomes):
+                on_result(entry, verification, RuntimeError(error) if error is not None else None)
+        finally:
+            slots.release()
+
+    def failed(shard, exc):
+        # The worker died or the shard could not be sent; every entry in it fails
+        try:
+            for entry in shard:
+                on_result(entry, None, exc)
+        finally:
+            slots.release()
+
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(processes, initializer=init_worker, initargs=(settings, processes))
+    try:
+        for shard in shards(batches):
+            slots.acquire()
+            if on_shard is not None:
+                on_shard(shard)
+            pool.apply_async(verify_shard, (shard,), callback=partial(done, shard),
+                             error_callback=partial(failed, shard))
+        for _ in range(processes * (1 + SHARDS_AHEAD)):
+            slots.acquire()
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
@@ -1,16 +1,29 @@
-import requests
+import threading
+import contextvars
 import time
-import re
-import random
 import json
-import os
+import re
+import atexit
 import hashlib
+import unicodedata
 import xml.etree.ElementTree as ET
-from rapidfuzz import fuzz
-from urllib.parse import quote
+from functools import lru_cache
+from src.cache import open_cache, HIT, NEGATIVE, ERROR
+from src.bib_parser import latex_to_unicode
+from src.http_client import (
+    http_get, http_request, set_cancel_event, RequestCancelled, LookupSkipped, start_entry_deadline, run_deadline_passed,
+    time_left,
+)
+from src import scheduler
+from src.identifiers import extract_identifiers, s2_lookup_id
+from src.local_index import LocalIndex
+from src.metrics import (
+    METRICS, OTHER, RECENT_ERROR, CIRCUIT_OPEN, DEADLINE, classify_exception, classify_status, track_failures, lookup_failed,
+)
 
 CROSSREF_API_URL = "https://api.crossref.org/works"
 SEMANTIC_SCHOLAR_API_URL = "https://api.semanticscholar.org/graph/v1/paper/search"
+SEMANTIC_SCHOLAR_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
 ARXIV_API_URL = "http://export.arxiv.org/api/query"
 
 HEADERS = {
@@ -20,461 +33,913 @@ HEADERS = {
 THRESHOLD_VALID = 90
 THRESHOLD_UNCERTAIN = 75
 
-MIN_DELAY = 0.8
-MAX_DELAY = 1.5
+# Opened on first use (or by load_cache with the configured backend), so
+# invocations that never look anything up do not pay for it
+CACHE = None
+_cache_lock = threading.Lock()
+# Whether the open cache may still hold entries under the original client's keys
+LEGACY_ENTRIES = False
+
+def load_cache(backend=None, path=None, remote=None):
+    # remote: URL of a shared cache server read through on local misses
+    global CACHE
+    with _cache_lock:
+        if CACHE is not None:
+            CACHE.close()
+        CACHE = open_cache(backend, path)
+        if remote:
+            from src.cache_share import RemoteCache
+            CACHE = RemoteCache(CACHE, remote)
+        check_legacy_entries(CACHE)
+    return CACHE
 
-CACHE_FILE = ".citation_cache.json"
-CACHE = {}
+def check_legacy_entries(cache):
+    global LEGACY_ENTRIES
+    LEGACY_ENTRIES = cache.has_legacy_entries()
 
-def load_cache():
+def get_cache():
     global CACHE
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                CACHE = json.load(f)
-        except:
-            CACHE = {}
+    if CACHE is None:
+        with _cache_lock:
+            if CACHE is None:
+                CACHE = open_cache()
+                check_legacy_entries(CACHE)
+    return CACHE
 
 def save_cache():
-    try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(CACHE, f, ensure_ascii=False, indent=2)
-    except:
-        pass
+    if CACHE is not None:
+        CACHE.flush()
+
+# Version of the cache key scheme and of the cached values' shape; cache packs
+# and remote caches written with another version are not used
+CACHE_KEY_VERSION = 1
 
 def get_cache_key(prefix, data):
     raw = f"{prefix}:{str(data)}"
     return hashlib.md5(raw.encode('utf-8')).hexdigest()
 
-load_cache()
+def legacy_cache_key(prefix, *query):
+    # The key the original client used: a hash of the raw query strings, e.g.
+    # "crossref_search:<title>_<author>_<year>". Entries migrated from its JSON
+    # cache keep these keys; see adopt_legacy_entry.
+    return get_cache_key(prefix, '_'.join(str(q) for q in query))
+
+def adopt_legacy_entry(cache_key, legacy_key, source):
+    # Re-keys an entry cached under the original client's key, the first time a
+    # lookup that would have used that key misses. Returns (kind, value).
+    records = get_cache().lookup_records([legacy_key])
+    if not records:
+        return None, None
+    _, kind, _, value, _ = records[0]
+    get_cache().set(cache_key, value, kind, source)
+    return kind, value
 
-def api_delay():
-    time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))
+atexit.register(save_cache)
+
+BRACES_QUOTES_RE = re.compile(r'[{}"\']')
+SPACE_RE = re.compile(r'\s+')
+YEAR_RE = re.compile(r'\d{4}')
 
 def clean_title(title):
     if not title:
         return ""
-    title = title.replace('{', '').replace('}', '')
-    title = title.replace('"', '').replace("'", "")
-    title = re.sub(r'\s+', ' ', title).strip()
-    return title
+    return SPACE_RE.sub(' ', BRACES_QUOTES_RE.sub('', title)).strip()
+
+def fold(text):
+    # Casefolded with accents stripped, so "Müller" and "Muller" compare equal
+    if text.isascii():
+        return text.casefold()
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c)).casefold()
+
+def title_key(title):
+    # token_sort_ratio's preprocessing, done once per title: folded words in sorted order
+    return ' '.join(sorted(fold(title).split())) if title else ''
+
+def parse_year(value):
+    if isinstance(value, int):
+        return value
+    match = YEAR_RE.search(str(value)) if value else None
+    return int(match.group()) if match else None
 
 def calculate_similarity(s1, s2):
+    from rapidfuzz import fuzz
     if not s1 or not s2:
         return 0.0
-    return fuzz.token_sort_ratio(s1.lower(), s2.lower())
+    return fuzz.ratio(title_key(s1), title_key(s2))
+
+def check_year_match(entry_year, result_year):
+    y1, y2 = parse_year(entry_year), parse_year(result_year)
+    if y1 is None or y2 is None:
+        return None
+    return abs(y1 - y2) <= 2
 
-def check_author_match(entry_author, result_authors):
-    if not entry_author or not result_authors:
-        return False
+def extract_crossref_year(item):
+    if 'published' in item and 'date-parts' in item['published']:
+        return item['published']['date-parts'][0][0]
+    elif 'issued' in item and 'date-parts' in item['issued']:
+        return item['issued']['date-parts'][0][0]
+    return None
+
+# Each source is split into a request builder and a response parser so the
+# synchronous clients below and the asyncio engine (src/async_engine.py)
+# share the same query construction and scoring.
+
+DOI_PREFIX_RE = re.compile(r'^(?:https?://)?(?:dx\.)?doi\.org/|^doi:\s*', re.IGNORECASE)
+
+def normalize_doi(doi):
+    # DOIs are case-insensitive; strip resolver prefixes so that
+    # "https://doi.org/10.1000/ABC" and "10.1000/abc" share one cache entry
+    if not doi:
+        return ""
+    doi = DOI_PREFIX_RE.sub('', doi.strip())
+    return doi.strip().lower()
+
+def crossref_doi_request(doi):
+    return f"{CROSSREF_API_URL}/{doi}", None
+
+def parse_crossref_doi(data):
+    data = data['message']
+    return {
+        "status": "valid",
+        "source": "Crossref (DOI)",
+        "title": data.get('title', [''])[0],
+        "url": data.get('URL', ''),
+        "year": extract_crossref_year(data),
+        "score": 100
+    }
 
-    # Extract first author's last name from entry
-    # Handles: "Smith, John", "John Smith", "Smith"
+DOI_BATCH_SIZE = 50
+
+# Fields of a work the parsers read. Full records carry reference lists,
+# funders and licenses, often tens of KB per item; list queries (search and
+# DOI filters) return only these. None asks for whole records.
+CROSSREF_SELECT = "DOI,title,author,published,issued,URL"
+
+def crossref_doi_batch_request(dois, cursor="*"):
+    params = {
+        "filter": ",".join(f"doi:{doi}" for doi in dois),
+        "rows": DOI_BATCH_SIZE,
+        "cursor": cursor
+    }
+    if CROSSREF_SELECT:
+        params["select"] = CROSSREF_SELECT
+    return CROSSREF_API_URL, params
+
+# Candidates each search request asks for. All of them are scored in one pass,
+# so a correct paper ranked below the top hit still settles the lookup without
+# a round trip to the next source.
+SEARCH_CANDIDATES = 5
+
+def entry_surname(entry_author):
+    # First author's last name: "Smith, John", "John Smith", "Smith"
+    if '\\' in entry_author:
+        entry_author = latex_to_unicode(entry_author)
     entry_author = entry_author.replace('{', '').replace('}', '')
     first_author_part = entry_author.split(',')[0].split(' and ')[0].strip()
-    entry_last_name = first_author_part.split()[-1].lower() if ' ' in first_author_part else first_author_part.lower()
-    
-    for author in result_authors:
-        found_name = ""
+    return first_author_part.split()[-1] if ' ' in first_author_part else first_author_part
+
+class Citation:
+    # The entry being verified, normalized once and shared by every source's
+    # scorer instead of being re-cleaned for each candidate
+    __slots__ = ('title', 'author', 'year', 'title_key', 'surname', 'year_value')
+
+    def __init__(self, title, author=None, year=None):
+        self.title = title
+        self.author = author
+        self.year = year
+        self.title_key = title_key(title)
+        self.surname = fold(entry_surname(author)) if author else ''
+        self.year_value = parse_year(year)
+
+@lru_cache(maxsize=4096)
+def citation_record(title, author=None, year=None):
+    # Sources are queried with (title, author, year); they all get the same record
+    return Citation(title, author, year)
+
+def search_cache_key(prefix, title, author=None, year=None):
+    # Built from what the lookup actually depends on, so "Deep  Learning",
+    # "deep learning" and "Deep Learning." by "LeCun, Y." or "Yann LeCun" share
+    # an entry. Symbols are kept: "C++ templates" is not "C templates".
+    citation = citation_record(title, author, year)
+    text = ' '.join(fold(title).rstrip(' .').split())
+    return get_cache_key(prefix, f"{text}|{citation.surname}|{citation.year_value or ''}")
+
+def candidate_surnames(authors):
+    surnames = []
+    for author in authors or []:
         if isinstance(author, dict):
-            # Crossref format: {'family': 'Smith', 'given': 'John'}
-            if 'family' in author:
-                 found_name = author['family'].lower()
-            elif 'name' in author:
-                 found_name = author['name'].lower()
-        elif isinstance(author, str):
-             # arXiv/S2 format: "John Smith"
-             found_name = author.split()[-1].lower() if ' ' in author else author.lower()
-        
-        if entry_last_name in found_name or found_name in entry_last_name:
-            return True
-        if fuzz.partial_ratio(entry_last_name, found_name) > 85:
-            return True
-                 
-    return False
+            # Crossref format: {'family': 'Smith', 'given': 'John'}; S2: {'name': 'John Smith'}
+            name = author.get('family') or author.get('name') or ''
+        else:
+            # arXiv format: "John Smith"
+            name = author.split()[-1] if author.strip() else ''
+        if name:
+            surnames.append(fold(name))
+    return surnames
 
-def check_year_match(entry_year, result_year):
-    if not entry_year or not result_year:
-        return None
-    
-    try:
-        y1 = int(re.search(r'\d{4}', str(entry_year)).group())
-        y2 = int(re.search(r'\d{4}', str(result_year)).group())
-        
-        diff = abs(y1 - y2)
-        
-        if diff <= 2:
-            return True
-        return False
-    except:
+def author_matches(surname, surname_lists):
+    from rapidfuzz import fuzz, process
+    if not surname:
+        return [False] * len(surname_lists)
+    # Substring matches are cheap; only the remaining authors go through one fuzzy pass
+    matched = [any(surname in name or name in surname for name in names) for names in surname_lists]
+    flat = [(i, name) for i, names in enumerate(surname_lists) if not matched[i] for name in names]
+    if flat:
+        scores = process.extract(surname, [name for _, name in flat], scorer=fuzz.partial_ratio,
+                                 score_cutoff=85, limit=None)
+        for _, score, k in scores:
+            if score > 85:
+                matched[flat[k][0]] = True
+    return matched
+
+def score_candidates(citation, candidates):
+    # candidates: dicts with title, url, doi, source, authors, year.
+    # Returns the best one with its similarity and final (author/year adjusted) score.
+    # rapidfuzz is imported here rather than with the module to keep start-up fast.
+    from rapidfuzz import fuzz, process
+    if not candidates:
         return None
 
-def verify_by_crossref_doi(doi):
-    cache_key = get_cache_key("crossref_doi", doi)
-    if cache_key in CACHE:
-        return CACHE[cache_key]
+    keys = [title_key(c['title']) for c in candidates]
+    similarities = [0.0] * len(candidates)
+    if citation.title_key:
+        for _, score, i in process.extract(citation.title_key, keys, scorer=fuzz.ratio, limit=None):
+            similarities[i] = score if keys[i] else 0.0
+    matched = author_matches(citation.surname, [candidate_surnames(c['authors']) for c in candidates])
 
-    try:
-        api_delay()
-        url = f"{CROSSREF_API_URL}/{doi}"
-        response = requests.get(url, headers=HEADERS, timeout=20)
-        
-        if response.status_code == 200:
-            data = response.json()['message']
-            
-            year = None
-            if 'published' in data and 'date-parts' in data['published']:
-                year = data['published']['date-parts'][0][0]
-            elif 'issued' in data and 'date-parts' in data['issued']:
-                 year = data['issued']['date-parts'][0][0]
-
-            result = {
-                "status": "valid",
-                "source": "Crossref (DOI)",
-                "title": data.get('title', [''])[0],
-                "url": data.get('URL', ''),
-                "year": year,
-                "score": 100
-            }
-            CACHE[cache_key] = result
-            save_cache()
-            return result
-        return None
-    except requests.exceptions.Timeout:
-        return None
-    except:
-        return None
+    best_match = None
+    for candidate, similarity, is_author_match in zip(candidates, similarities, matched):
+        found_year = parse_year(candidate['year'])
+        year_mismatch = citation.year_value is not None and found_year is not None and abs(citation.year_value - found_year) > 2
 
-def verify_by_crossref_search(title, author=None, year=None):
-    cache_key = get_cache_key("crossref_search", f"{title}_{author}_{year}")
-    if cache_key in CACHE:
-        return CACHE[cache_key]
+        final_score = similarity
+        if is_author_match:
+            final_score += 15
+        if year_mismatch:
+            final_score -= 30
+        final_score = min(max(final_score, 0), 100)
 
-    try:
-        api_delay()
-        query = title
-        if author:
-            first_author = author.split(',')[0].split(' and ')[0].strip()
-            query += f" {first_author}"
-            
-        params = {
-            "query.bibliographic": query,
-            "rows": 3
+        # Strict check for author and year
+        if citation.author and not is_author_match:
+            final_score = 0
+        if year_mismatch:
+            final_score = 0
+
+        if best_match is None or (final_score, similarity) > (best_match['final_score'], best_match['score']):
+            best_match = dict(candidate, score=similarity, final_score=final_score)
+    return best_match
+
+def crossref_search_request(title, author=None):
+    query = title
+    if author:
+        first_author = author.split(',')[0].split(' and ')[0].strip()
+        query += f" {first_author}"
+
+    params = {
+        "query.bibliographic": query,
+        "rows": SEARCH_CANDIDATES
+    }
+    if CROSSREF_SELECT:
+        params["select"] = CROSSREF_SELECT
+    return CROSSREF_API_URL, params
+
+def parse_crossref_search(data, title, author=None, year=None):
+    candidates = [{
+        "title": (item.get('title') or [''])[0],
+        "url": item.get('URL', ''),
+        "doi": item.get('DOI', ''),
+        "source": "Crossref (Search)",
+        "authors": item.get('author', []),
+        "year": extract_crossref_year(item)
+    } for item in data['message']['items']]
+    return score_candidates(citation_record(title, author, year), candidates)
+
+# The Graph API has no "doi" field; the DOI is one of the externalIds
+S2_SEARCH_FIELDS = "title,url,year,authors,externalIds"
+
+def semantic_scholar_request(title):
+    params = {
+        "query": title,
+        "limit": SEARCH_CANDIDATES,
+        "fields": S2_SEARCH_FIELDS
+    }
+    return SEMANTIC_SCHOLAR_API_URL, params
+
+def parse_semantic_scholar(data, title, author=None, year=None):
+    candidates = [{
+        "title": item.get('title') or '',
+        "url": item.get('url', ''),
+        "doi": (item.get('externalIds') or {}).get('DOI', ''),
+        "source": "Semantic Scholar",
+        "authors": item.get('authors', []),
+        "year": item.get('year')
+    } for item in data.get('data') or []]
+    return score_candidates(citation_record(title, author, year), candidates)
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+ATOM_FIELDS = {ATOM + 'id': 'id', ATOM + 'title': 'title', ATOM + 'published': 'published'}
+
+def arxiv_queries(title, author=None):
+    # Primary exact-title query, plus a looser fallback used when it finds nothing
+    clean_t = re.sub(r'[^\w\s]', ' ', title)
+    clean_t = re.sub(r'\s+', ' ', clean_t).strip()
+
+    queries = [f'ti:"{clean_t}"']
+
+    if author:
+        first_author_last = author.split(',')[0].split(' and ')[0].strip()
+        first_author_last = re.sub(r'[^\w\s]', '', first_author_last)
+        if first_author_last:
+            queries[0] += f' AND au:"{first_author_last}"'
+            queries.append(f'all:{clean_t} AND au:{first_author_last}')
+    return queries
+
+def arxiv_request(query):
+    params = {
+        "search_query": query,
+        "start": 0,
+        "max_results": SEARCH_CANDIDATES
+    }
+    return ARXIV_API_URL, params
+
+class ArxivFeed:
+    # Reads the feed as a stream of end tags while it arrives, instead of
+    # building its tree from the whole body: only the id, title, publication
+    # date and author names of each <entry> are kept, and each entry is dropped
+    # once read, abstract and categories included. The feed's own <id> and
+    # <title> come before the first entry, which overwrites them.
+    def __init__(self):
+        self.parser = ET.XMLPullParser(events=('end',))
+        self.entries = []
+        self.fields = {}
+        self.authors = []
+
+    def feed(self, chunk):
+        self.parser.feed(chunk)
+        self.read_events()
+
+    def close(self):
+        self.parser.close()
+        self.read_events()
+        return self.entries
+
+    def read_events(self):
+        for _, element in self.parser.read_events():
+            tag = element.tag
+            if tag in ATOM_FIELDS:
+                self.fields[ATOM_FIELDS[tag]] = (element.text or '').strip()
+            elif tag == ATOM + 'name':
+                self.authors.append(element.text or '')
+            elif tag == ATOM + 'entry':
+                self.fields['authors'] = self.authors
+                self.entries.append(self.fields)
+                self.fields = {}
+                self.authors = []
+                element.clear()
+
+def parse_arxiv_feed(chunks):
+    # chunks: the whole feed, or an iterable of the pieces it arrived in
+    feed = ArxivFeed()
+    for chunk in [chunks] if isinstance(chunks, (bytes, str)) else chunks:
+        feed.feed(chunk)
+    return feed.close()
+
+def arxiv_candidate(entry):
+    published = entry.get('published')
+    return {
+        "title": re.sub(r'\s+', ' ', entry.get('title', '')),
+        "url": entry.get('id', ''),
+        "doi": "",
+        "source": "arXiv API",
+        "authors": entry['authors'],
+        "year": published[:4] if published else None
+    }
+
+def parse_arxiv_entries(entries, title, author=None, year=None):
+    return score_candidates(citation_record(title, author, year), [arxiv_candidate(e) for e in entries])
+
+ARXIV_ID_BATCH_SIZE = 100
+
+def arxiv_id_request(arxiv_ids):
+    params = {
+        "id_list": ",".join(arxiv_ids),
+        "start": 0,
+        "max_results": len(arxiv_ids)
+    }
+    return ARXIV_API_URL, params
+
+def arxiv_id_records(entries):
+    records = {}
+    for entry in entries:
+        # Unknown IDs come back as a pseudo-entry pointing at the error docs
+        if '/api/errors' in entry.get('id', '/api/errors'):
+            continue
+        arxiv_id = re.sub(r'v\d+$', '', entry['id'].split('/abs/')[-1])
+        records[arxiv_id] = dict(arxiv_candidate(entry), source="arXiv (ID)")
+    return records
+
+S2_BATCH_SIZE = 500
+S2_ID_FIELDS = "title,url,year,authors,externalIds"
+
+def s2_batch_request(s2_ids):
+    return SEMANTIC_SCHOLAR_BATCH_URL, {"fields": S2_ID_FIELDS}, {"ids": list(s2_ids)}
+
+def parse_s2_batch(data, s2_ids):
+    # The batch endpoint answers with one item (or null) per requested ID, in order
+    records = {}
+    for s2_id, item in zip(s2_ids, data):
+        if not item:
+            continue
+        records[s2_id] = {
+            "source": "Semantic Scholar (ID)",
+            "title": item.get('title', ''),
+            "url": item.get('url', ''),
+            "doi": (item.get('externalIds') or {}).get('DOI', ''),
+            "authors": item.get('authors', []),
+            "year": item.get('year')
         }
-        
-        response = requests.get(CROSSREF_API_URL, headers=HEADERS, params=params, timeout=20)
-        
-        if response.status_code == 200:
-            data = response.json()['message']
-            if not data['items']:
-                return None
-            
-            best_match = None
-            best_score = 0
-            
-            for item in data['items']:
-                found_title = item.get('title', [''])[0]
-                similarity = calculate_similarity(title, found_title)
-                
-                is_author_match = False
-                if 'author' in item:
-                    is_author_match = check_author_match(author, item['author'])
-                
-                found_year = None
-                if 'published' in item and 'date-parts' in item['published']:
-                    found_year = item['published']['date-parts'][0][0]
-                elif 'issued' in item and 'date-parts' in item['issued']:
-                    found_year = item['issued']['date-parts'][0][0]
-                
-                is_year_match = check_year_match(year, found_year)
-                
-                final_score = similarity
-                
-                if is_author_match:
-                     final_score += 15
-                
-                if year and found_year:
-                    if is_year_match == False:
-                        final_score -= 30
-                
-                if final_score > 100: final_score = 100
-                if final_score < 0: final_score = 0
-                
-                # Strict check for author and year (Add this)
-                if author and not is_author_match:
-                    final_score = 0
-                if year and found_year and is_year_match == False:
-                    final_score = 0
-                
-                if final_score > best_score:
-                    best_score = final_score
-                    best_match = {
-                        "title": found_title,
-                        "url": item.get('URL', ''),
-                        "doi": item.get('DOI', ''),
-                        "score": similarity,
-                        "final_score": final_score,
-                        "source": "Crossref (Search)",
-                        "authors": item.get('author', []),
-                        "year": found_year
-                    }
-
-            if best_match:
-                CACHE[cache_key] = best_match
-                save_cache()
-            return best_match
+    return records
+
+def cache_lookup(source, cache_key, legacy_key=None):
+    kind, value = get_cache().lookup_kind(cache_key)
+    if kind is None and legacy_key and LEGACY_ENTRIES:
+        kind, value = adopt_legacy_entry(cache_key, legacy_key, source)
+    METRICS.record_cache(source, kind is not None)
+    if kind == ERROR:
+        lookup_failed(source, RECENT_ERROR)
+    return kind is not None, value
+
+class Flight:
+    # A lookup of one cache key. done: the outcome is already known (value);
+    # otherwise this thread does the lookup and must land() it when finished.
+    __slots__ = ('key', 'event', 'done', 'value', 'registry')
+
+    def __init__(self, key, done=False, value=None):
+        self.key = key
+        self.event = None
+        self.done = done
+        self.value = value
+        self.registry = None
+
+    def land(self):
+        with _flights_lock:
+            del self.registry[self.key]
+        self.event.set()
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+def coalesced_outcome(source, cache_key):
+    # After waiting for another lookup of the key: its outcome, or None to look it up again
+    kind, value = get_cache().lookup_kind(cache_key)
+    if kind is None:
+        # The other lookup was cancelled or skipped before it had an answer
         return None
-    except requests.exceptions.Timeout:
+    if kind == ERROR:
+        lookup_failed(source, RECENT_ERROR)
+    return Flight(cache_key, True, value)
+
+def join_flight(source, cache_key, legacy_key=None):
+    # Single-flight: while one thread looks a key up, others asking for the same
+    # key (duplicate entries, or one reference queried by several sources at
+    # once) wait for it and read its outcome from the cache instead of repeating it
+    found, cached = cache_lookup(source, cache_key, legacy_key)
+    if found:
+        return Flight(cache_key, True, cached)
+    while True:
+        with _flights_lock:
+            leader = _flights.get(cache_key)
+            if leader is None:
+                flight = Flight(cache_key)
+                flight.event = _flights[cache_key] = threading.Event()
+                flight.registry = _flights
+                return flight
+        METRICS.record_coalesced(source)
+        remaining = time_left()
+        if not leader.wait(None if remaining is None else max(remaining, 0)):
+            return Flight(cache_key, True, lookup_failed(source, DEADLINE))
+        flight = coalesced_outcome(source, cache_key)
+        if flight is not None:
+            return flight
+
+def cache_outcome(cache_key, result, status_code=200, source=None):
+    # A 200 without a match and a 404 are real answers and are remembered as
+    # negative results; 429/5xx are transient and only cached briefly
+    if result:
+        get_cache().set(cache_key, result, HIT, source)
+    elif status_code in (200, 404):
+        get_cache().set(cache_key, None, NEGATIVE, source)
+    else:
+        if source:
+            lookup_failed(source, classify_status(status_code))
+        get_cache().set(cache_key, None, ERROR, source)
+    return result
+
+def cache_error(cache_key, source=None, kind=OTHER):
+    if source:
+        lookup_failed(source, kind)
+    get_cache().set(cache_key, None, ERROR, source)
+    return None
+
+# Every lookup is written once, as a generator of the steps it needs: it
+# yields a Request and is sent (status code, body; None when the body was
+# handed to the request's on_chunk as it arrived), a Pause and is sent None,
+# a Join for a cache key and is sent its Flight, or a Race of search lookups
+# and is sent (result, candidates). An exception raised while answering a step
+# is thrown back into the generator. run_steps answers with blocking calls and
+# async_engine.run_steps_async with coroutines, so the threaded and async
+# engines share the source order, the result checks and the verdicts.
+
+class Request:
+    __slots__ = ('method', 'url', 'params', 'headers', 'json', 'timeout', 'source', 'on_chunk')
+
+    def __init__(self, url, params=None, headers=None, timeout=20, source=None, method="GET", json=None, on_chunk=None):
+        self.method = method
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.json = json
+        self.timeout = timeout
+        self.source = source
+        self.on_chunk = on_chunk
+
+class Pause:
+    __slots__ = ('seconds',)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+class Join:
+    __slots__ = ('source', 'key', 'legacy_key')
+
+    def __init__(self, source, key, legacy_key=None):
+        self.source = source
+        self.key = key
+        self.legacy_key = legacy_key
+
+class Race:
+    __slots__ = ('lookups', 'mode')
+
+    def __init__(self, lookups, mode):
+        self.lookups = lookups
+        self.mode = mode
+
+class SourceFailed(Exception):
+    # The source answered, but not with anything that can be cached as an answer
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.kind = kind
+
+def answer_step(step):
+    if isinstance(step, Request):
+        response = http_request(step.method, step.url, params=step.params, headers=step.headers, json=step.json,
+                                timeout=step.timeout, source=step.source, on_chunk=step.on_chunk)
+        if step.on_chunk is not None and response.status_code == 200:
+            return response.status_code, None
+        return response.status_code, response.content
+    if isinstance(step, Pause):
+        time.sleep(step.seconds)
         return None
-    except:
+    if isinstance(step, Join):
+        return join_flight(step.source, step.key, step.legacy_key)
+    return run_race(step.lookups, step.mode)
+
+def run_steps(steps):
+    reply = error = None
+    while True:
+        try:
+            step = steps.send(reply) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        try:
+            reply = answer_step(step)
+        except BaseException as e:
+            error = e
+
+def source_lookup(source, cache_key, steps, legacy_key=None):
+    # Single-flight, caching and failure accounting around one source's steps,
+    # which return (status code, result)
+    flight = yield Join(source, cache_key, legacy_key)
+    if flight.done:
+        return flight.value
+    try:
+        status, result = yield from steps
+        return cache_outcome(cache_key, result, status, source)
+    except RequestCancelled:
         return None
+    except LookupSkipped as e:
+        return lookup_failed(source, e.kind)
+    except SourceFailed as e:
+        return cache_error(cache_key, source, e.kind)
+    except Exception as e:
+        return cache_error(cache_key, source, classify_exception(e))
+    finally:
+        flight.land()
 
-def verify_by_semantic_scholar(title, author=None, year=None):
-    cache_key = get_cache_key("semantic_scholar", f"{title}_{author}_{year}")
-    if cache_key in CACHE:
-        return CACHE[cache_key]
+def crossref_doi_steps(doi):
+    url, _ = crossref_doi_request(doi)
+    status, body = yield Request(url, headers=HEADERS, timeout=20, source="crossref_doi")
+    return status, parse_crossref_doi(json.loads(body)) if status == 200 else None
 
-    params = {
-        "query": title,
-        "limit": 1,
-        "fields": "title,url,doi,year,authors"
-    }
-    
-    max_retries = 3
-    base_wait = 3
-    
-    for attempt in range(max_retries):
+def crossref_doi_lookup(doi):
+    legacy_key = legacy_cache_key("crossref_doi", doi)
+    doi = normalize_doi(doi)
+    return source_lookup("crossref_doi", get_cache_key("crossref_doi", doi), crossref_doi_steps(doi), legacy_key)
+
+def verify_by_crossref_doi(doi):
+    return run_steps(crossref_doi_lookup(doi))
+
+def resolve_dois(dois):
+    # Commas would split the filter value, leave those to the per-entry lookup
+    raw = {}
+    for doi in dois:
+        raw.setdefault(normalize_doi(doi), doi)
+    dois = [doi for doi in raw if doi and ',' not in doi]
+    get_cache().prefetch([get_cache_key("crossref_doi", doi) for doi in dois])
+    pending = []
+    for doi in dois:
+        cache_key = get_cache_key("crossref_doi", doi)
+        if get_cache().lookup(cache_key)[0]:
+            continue
+        if LEGACY_ENTRIES and adopt_legacy_entry(cache_key, legacy_cache_key("crossref_doi", raw[doi]), "crossref_doi")[0]:
+            continue
+        pending.append(doi)
+
+    resolved = 0
+    for i in range(0, len(pending), DOI_BATCH_SIZE):
+        chunk = pending[i:i + DOI_BATCH_SIZE]
+        found = set()
+        cursor = "*"
         try:
-            api_delay()
-            
-            response = requests.get(SEMANTIC_SCHOLAR_API_URL, headers=HEADERS, params=params, timeout=20)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if not data.get('data'):
-                    return None
-                    
-                item = data['data'][0]
-                found_title = item.get('title', '')
-                similarity = calculate_similarity(title, found_title)
-                
-                is_author_match = False
-                if 'authors' in item:
-                    is_author_match = check_author_match(author, item['authors'])
-                
-                found_year = item.get('year')
-                is_year_match = check_year_match(year, found_year)
-                
-                final_score = similarity
-                if is_author_match:
-                    final_score += 15
-                
-                if year and found_year:
-                    if is_year_match == False:
-                        final_score -= 30
-
-                if final_score > 100: final_score = 100
-                if final_score < 0: final_score = 0
-
-                # Strict check for author and year
-                if author and not is_author_match:
-                    final_score = 0
-                if year and found_year and is_year_match == False:
-                    final_score = 0
-
-                result = {
-                    "title": found_title,
-                    "url": item.get('url', ''),
-                    "doi": item.get('doi', ''),
-                    "score": similarity,
-                    "final_score": final_score,
-                    "source": "Semantic Scholar",
-                    "authors": item.get('authors', []),
-                    "year": found_year
-                }
-                CACHE[cache_key] = result
-                save_cache()
-                return result
-            elif response.status_code == 429:
-                 wait_time = base_wait * (2 ** attempt) + random.uniform(1, 3)
-                 print(f" [!] Semantic Scholar rate limited, waiting {wait_time:.1f}s...")
-                 time.sleep(wait_time)
-                 continue
+            while cursor:
+                url, params = crossref_doi_batch_request(chunk, cursor)
+                response = http_get(url, params=params, headers=HEADERS, timeout=30, source="crossref_doi_batch")
+                if response.status_code != 200:
+                    lookup_failed("crossref_doi_batch", classify_status(response.status_code) or OTHER)
+                    break
+                message = response.json()['message']
+                items = message.get('items', [])
+                for item in items:
+                    doi = normalize_doi(item.get('DOI', ''))
+                    if doi and doi not in found:
+                        found.add(doi)
+                        get_cache().set(get_cache_key("crossref_doi", doi), parse_crossref_doi({'message': item}), HIT, "crossref_doi")
+                cursor = message.get('next-cursor') if len(items) >= DOI_BATCH_SIZE else None
             else:
-                return None
-        except requests.exceptions.Timeout:
-            return None
+                # A DOI missing from a complete batch answer is not registered with Crossref
+                for doi in chunk:
+                    if doi not in found:
+                        get_cache().set(get_cache_key("crossref_doi", doi), None, NEGATIVE, "crossref_doi")
+        except LookupSkipped as e:
+            lookup_failed("crossref_doi_batch", e.kind)
+            break
         except Exception as e:
-            return None
-            
-    return None
+            lookup_failed("crossref_doi_batch", classify_exception(e))
+            print(f"[!] Batch DOI lookup failed, falling back to per-entry requests: {e}")
+        resolved += len(found)
+    return resolved
 
-def verify_by_arxiv(title, author=None, year=None):
-    cache_key = get_cache_key("arxiv", f"{title}_{author}_{year}")
-    if cache_key in CACHE:
-        return CACHE[cache_key]
+def store_id_records(prefix, requested, records):
+    for lookup_id in requested:
+        cache_key = get_cache_key(prefix, lookup_id)
+        if lookup_id in records:
+            get_cache().set(cache_key, records[lookup_id], HIT, prefix)
+        else:
+            get_cache().set(cache_key, None, NEGATIVE, prefix)
+    return len(records)
+
+def pending_ids(prefix, ids):
+    ids = list(dict.fromkeys(ids))
+    get_cache().prefetch([get_cache_key(prefix, lookup_id) for lookup_id in ids])
+    pending = []
+    for lookup_id in ids:
+        if not get_cache().lookup(get_cache_key(prefix, lookup_id))[0]:
+            pending.append(lookup_id)
+    return pending
+
+def arxiv_id_steps(arxiv_ids):
+    url, params = arxiv_id_request(arxiv_ids)
+    feed = ArxivFeed()
+    status, _ = yield Request(url, params=params, timeout=30, source="arxiv_id", on_chunk=feed.feed)
+    return status, arxiv_id_records(feed.close()) if status == 200 else None
+
+def s2_id_steps(s2_ids):
+    url, params, payload = s2_batch_request(s2_ids)
+    status, body = yield Request(url, params=params, headers=HEADERS, timeout=30, source="s2_id",
+                                 method="POST", json=payload)
+    return status, parse_s2_batch(json.loads(body), s2_ids) if status == 200 else None
+
+ID_STEPS = {"arxiv_id": arxiv_id_steps, "s2_id": s2_id_steps}
+
+def resolve_id_steps(prefix, lookup_ids):
+    # Resolves one batch of IDs into the cache; returns how many were found
+    status, records = yield from ID_STEPS[prefix](lookup_ids)
+    if status == 200:
+        return store_id_records(prefix, lookup_ids, records)
+    lookup_failed(prefix, classify_status(status) or OTHER)
+    return 0
+
+def resolve_ids(prefix, lookup_ids, batch_size):
+    resolved = 0
+    pending = pending_ids(prefix, lookup_ids)
+    for i in range(0, len(pending), batch_size):
+        try:
+            resolved += run_steps(resolve_id_steps(prefix, pending[i:i + batch_size]))
+        except LookupSkipped as e:
+            lookup_failed(prefix, e.kind)
+            break
+        except Exception as e:
+            lookup_failed(prefix, classify_exception(e))
+            print(f"[!] Batch {SOURCE_NAMES[prefix]} lookup failed: {e}")
+    return resolved
+
+def resolve_arxiv_ids(arxiv_ids):
+    return resolve_ids("arxiv_id", arxiv_ids, ARXIV_ID_BATCH_SIZE)
 
+def resolve_s2_ids(s2_ids):
+    return resolve_ids("s2_id", s2_ids, S2_BATCH_SIZE)
+
+def resolve_identifiers(entries):
+    if OFFLINE:
+        return {"doi": 0, "arxiv": 0, "s2": 0}
+    dois, arxiv_ids, s2_ids = [], [], []
+    for entry in entries:
+        ids = extract_identifiers(entry)
+        if 'doi' in ids:
+            dois.append(ids['doi'])
+        if 'arxiv' in ids:
+            arxiv_ids.append(ids['arxiv'])
+        s2_id = s2_lookup_id(ids)
+        if s2_id:
+            s2_ids.append(s2_id)
+
+    return {
+        "doi": resolve_dois(dois) if dois else 0,
+        "arxiv": resolve_arxiv_ids(arxiv_ids) if arxiv_ids else 0,
+        "s2": resolve_s2_ids(s2_ids) if s2_ids else 0,
+    }
+
+def id_lookup(prefix, lookup_id):
+    cache_key = get_cache_key(prefix, lookup_id)
+    flight = yield Join(prefix, cache_key)
+    if flight.done:
+        return flight.value
     try:
-        api_delay()
-        clean_t = re.sub(r'[^\w\s]', ' ', title) 
-        clean_t = re.sub(r'\s+', ' ', clean_t).strip()
-        
-        query = f'ti:"{clean_t}"'
-        
-        if author:
-            first_author_last = author.split(',')[0].split(' and ')[0].strip()
-            first_author_last = re.sub(r'[^\w\s]', '', first_author_last)
-            if first_author_last:
-                query += f' AND au:"{first_author_last}"'
-        
-        params = {
-            "search_query": query,
-            "start": 0,
-            "max_results": 1
-        }
-        
-        for _ in range(2):
-            try:
-                response = requests.get(ARXIV_API_URL, params=params, timeout=30)
-                if response.status_code == 200:
-                    break
-            except:
-                time.sleep(1)
-        else:
-            return None
-        
-        if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            ns = {'atom': 'http://www.w3.org/2005/Atom'}
-            
-            entry = root.find('atom:entry', ns)
-            
-            if entry is None and author:
-                 query_fallback = f'all:{clean_t} AND au:{first_author_last}'
-                 params['search_query'] = query_fallback
-                 
-                 for _ in range(2):
-                    try:
-                        response = requests.get(ARXIV_API_URL, params=params, timeout=30)
-                        if response.status_code == 200:
-                            root = ET.fromstring(response.content)
-                            entry = root.find('atom:entry', ns)
-                            if entry is not None:
-                                break
-                    except:
-                        time.sleep(1)
-
-            if entry is None:
-                return None
-                
-            found_title = entry.find('atom:title', ns).text.strip()
-            found_title = re.sub(r'\s+', ' ', found_title)
-            
-            found_authors = []
-            for author_elem in entry.findall('atom:author', ns):
-                name = author_elem.find('atom:name', ns).text
-                found_authors.append(name)
-            
-            found_year = None
-            published = entry.find('atom:published', ns)
-            if published is not None:
-                 found_year = published.text[:4]
-
-            similarity = calculate_similarity(title, found_title)
-            
-            is_author_match = check_author_match(author, found_authors)
-            
-            is_year_match = check_year_match(year, found_year)
-
-            final_score = similarity
-            if is_author_match:
-                final_score += 15
-            
-            if year and found_year:
-                if is_year_match == False:
-                    final_score -= 30
-
-            if final_score > 100: final_score = 100
-            if final_score < 0: final_score = 0
-            
-            # Strict check for author and year
-            if author and not is_author_match:
-                final_score = 0
-            if year and found_year and is_year_match == False:
-                final_score = 0
-                
-            link = entry.find('atom:id', ns).text
-            
-            result = {
-                "title": found_title,
-                "url": link,
-                "doi": "",
-                "score": similarity,
-                "final_score": final_score,
-                "source": "arXiv API",
-                "authors": found_authors,
-                "year": found_year
-            }
-            CACHE[cache_key] = result
-            save_cache()
-            return result
-            
-        return None
+        yield from resolve_id_steps(prefix, [lookup_id])
+    except LookupSkipped as e:
+        lookup_failed(prefix, e.kind)
     except Exception as e:
-        return None
+        lookup_failed(prefix, classify_exception(e))
+    finally:
+        flight.land()
+    return get_cache().get(cache_key)
 
-def verify_citation(entry):
-    raw_title = entry.get('title', '')
-    clean_t = clean_title(raw_title)
-    author = entry.get('author', '')
-    year = entry.get('year', '')
-    
-    if not clean_t:
-         return {"status": "error", "reason": "No Title provided"}
+def verify_by_arxiv_id(arxiv_id):
+    return run_steps(id_lookup("arxiv_id", arxiv_id))
+
+def verify_by_s2_id(s2_id):
+    return run_steps(id_lookup("s2_id", s2_id))
+
+def crossref_search_steps(title, author=None, year=None):
+    url, params = crossref_search_request(title, author)
+    status, body = yield Request(url, params=params, headers=HEADERS, timeout=20, source="crossref_search")
+    return status, parse_crossref_search(json.loads(body), title, author, year) if status == 200 else None
+
+def crossref_search_lookup(title, author=None, year=None):
+    return source_lookup("crossref_search", search_cache_key("crossref_search", title, author, year),
+                         crossref_search_steps(title, author, year), legacy_cache_key("crossref_search", title, author, year))
+
+def verify_by_crossref_search(title, author=None, year=None):
+    return run_steps(crossref_search_lookup(title, author, year))
+
+def semantic_scholar_steps(title, author=None, year=None):
+    url, params = semantic_scholar_request(title)
+    status, body = yield Request(url, params=params, headers=HEADERS, timeout=20, source="semantic_scholar")
+    return status, parse_semantic_scholar(json.loads(body), title, author, year) if status == 200 else None
+
+def semantic_scholar_lookup(title, author=None, year=None):
+    return source_lookup("semantic_scholar", search_cache_key("semantic_scholar", title, author, year),
+                         semantic_scholar_steps(title, author, year), legacy_cache_key("semantic_scholar", title, author, year))
+
+def verify_by_semantic_scholar(title, author=None, year=None):
+    return run_steps(semantic_scholar_lookup(title, author, year))
+
+def arxiv_feed_steps(query):
+    # (True, list of feed entries) once arXiv has answered, otherwise (False, failure class)
+    url, params = arxiv_request(query)
+    failure = OTHER
+    for _ in range(2):
+        try:
+            feed = ArxivFeed()
+            status, _ = yield Request(url, params=params, timeout=30, source="arxiv", on_chunk=feed.feed)
+            if status == 200:
+                return True, feed.close()
+            failure = classify_status(status) or OTHER
+        except (RequestCancelled, LookupSkipped):
+            raise
+        except Exception as e:
+            failure = classify_exception(e)
+            yield Pause(1)
+    return False, failure
+
+def arxiv_steps(title, author=None, year=None):
+    queries = arxiv_queries(title, author)
+    ok, entries = yield from arxiv_feed_steps(queries[0])
+    if ok and not entries and len(queries) > 1:
+        ok, entries = yield from arxiv_feed_steps(queries[1])
+    if not ok:
+        raise SourceFailed(entries)
+    return 200, parse_arxiv_entries(entries, title, author, year) if entries else None
+
+def arxiv_lookup(title, author=None, year=None):
+    return source_lookup("arxiv", search_cache_key("arxiv", title, author, year), arxiv_steps(title, author, year),
+                         legacy_cache_key("arxiv", title, author, year))
+
+def verify_by_arxiv(title, author=None, year=None):
+    return run_steps(arxiv_lookup(title, author, year))
+
+ACCEPTANCE_THRESHOLD = 85
+
+def is_accepted(res):
+    return bool(res) and res.get('final_score', 0) >= ACCEPTANCE_THRESHOLD
+
+def check_doi_result(res, year):
+    # Check if year matches even for DOI lookup
+    if year and res.get('year'):
+         is_year_match = check_year_match(year, res['year'])
+         if is_year_match == False:
+             res['status'] = 'uncertain'
+             res['reason'] = f"DOI valid but Year mismatch (Bib: {year}, DB: {res['year']})"
+             return res
+    return res
+
+def check_identifier_result(record, title, year):
+    # An identifier copied into the wrong entry (or invented outright) still
+    # resolves, so the record it points to must also carry the entry's title
+    res = dict(record)
+    similarity = calculate_similarity(title, res.get('title', ''))
+    res['score'] = similarity
+    res['final_score'] = similarity
+
+    if similarity < THRESHOLD_UNCERTAIN:
+        res['status'] = 'uncertain'
+        res['reason'] = f"{res['source']} resolves to a different title ({similarity:.1f}% similar)"
+        return res
+
+    res['status'] = 'valid'
+    if year and res.get('year') and check_year_match(year, res['year']) == False:
+        res['status'] = 'uncertain'
+        res['reason'] = f"Identifier valid but Year mismatch (Bib: {year}, DB: {res['year']})"
+    return res
+
+SOURCE_NAMES = {
+    "crossref_doi": "Crossref (DOI)",
+    "crossref_doi_batch": "Crossref (DOI batch)",
+    "crossref_search": "Crossref",
+    "semantic_scholar": "Semantic Scholar",
+    "arxiv": "arXiv",
+    "arxiv_id": "arXiv (ID)",
+    "s2_id": "Semantic Scholar (ID)",
+}
+
+FAILURE_NAMES = {
+    CIRCUIT_OPEN: "source unavailable",
+    DEADLINE: "deadline exceeded",
+}
+
+def unavailable_result(failures):
+    details = ", ".join(f"{SOURCE_NAMES.get(source, source)}: {FAILURE_NAMES.get(kind, kind)}"
+                        for source, kind in failures.items())
+    return {
+        "status": "unavailable",
+        "reason": f"Could not be checked, lookups failed ({details})",
+        "failures": dict(failures)
+    }
+
+def run_deadline_result():
+    return {
+        "status": "unavailable",
+        "reason": "Run deadline reached before this entry was checked",
+        "failures": {"run": DEADLINE}
+    }
+
+def summarize_candidates(candidates, searched="Crossref, Semantic Scholar, or arXiv", failures=None):
+    candidates = [c for c in candidates if c]
+
+    # "Not found" only counts when every source actually answered
+    if not candidates and failures:
+        return unavailable_result(failures)
 
-    if 'doi' in entry and entry['doi']:
-        res = verify_by_crossref_doi(entry['doi'])
-        if res:
-            # Check if year matches even for DOI lookup
-            if year and res.get('year'):
-                 is_year_match = check_year_match(year, res['year'])
-                 if is_year_match == False:
-                     res['status'] = 'uncertain'
-                     res['reason'] = f"DOI valid but Year mismatch (Bib: {year}, DB: {res['year']})"
-                     return res
-            return res
-
-    res_crossref = verify_by_crossref_search(clean_t, author, year)
-    
-    ACCEPTANCE_THRESHOLD = 85
-    
-    if res_crossref and res_crossref.get('final_score', 0) >= ACCEPTANCE_THRESHOLD:
-        res_crossref['status'] = 'valid'
-        return res_crossref
-
-    res_arxiv = verify_by_arxiv(clean_t, author, year)
-    
-    if res_arxiv and res_arxiv.get('final_score', 0) >= ACCEPTANCE_THRESHOLD:
-        res_arxiv['status'] = 'valid'
-        return res_arxiv
-
-    res_s2 = verify_by_semantic_scholar(clean_t, author, year)
-    
-    if res_s2 and res_s2.get('final_score', 0) >= ACCEPTANCE_THRESHOLD:
-        res_s2['status'] = 'valid'
-        return res_s2
-
-    candidates = [c for c in [res_crossref, res_arxiv, res_s2] if c]
-    
     if not candidates:
         return {
             "status": "not_found",
-            "reason": "No results from Crossref, Semantic Scholar, or arXiv"
+            "reason": f"No results from {searched}"
         }
-        
+
     best_res = max(candidates, key=lambda x: x.get('final_score', 0))
     best_score = best_res.get('final_score', 0)
-    
+
     if best_score >= THRESHOLD_UNCERTAIN:
         best_res['status'] = 'uncertain'
         reason_str = f"Similarity {best_res['score']:.1f}%"
@@ -484,9 +949,273 @@ def verify_citation(entry):
             reason_str += " (Penalized by Year Mismatch)"
         best_res['reason'] = reason_str + f" (Threshold {ACCEPTANCE_THRESHOLD}%)"
         return best_res
+    elif failures:
+        # A weak match elsewhere does not rule out the source that could not be asked
+        res = unavailable_result(failures)
+        res['best_guess'] = best_res
+        return res
     else:
          return {
             "status": "not_found",
             "reason": f"Best match only {best_res['score']:.1f}% similar (Penalized Score: {best_score:.1f})",
             "best_guess": best_res
         }
+
+# Offline snapshot index (src/local_index.py). When loaded it is consulted
+# before any network source; with OFFLINE set it is the only source.
+LOCAL_INDEX = None
+OFFLINE = False
+
+def load_local_index(path):
+    global LOCAL_INDEX
+    LOCAL_INDEX = LocalIndex(path) if path else None
+    return LOCAL_INDEX
+
+def verify_with_local_index(ids, clean_t, author=None, year=None):
+    # Returns (decisive result, best non-accepted candidate)
+    if LOCAL_INDEX is None:
+        return None, None
+
+    if 'doi' in ids:
+        item = LOCAL_INDEX.by_doi(normalize_doi(ids['doi']))
+        if item:
+            res = parse_crossref_doi({'message': item})
+            res['source'] = "Local Index (DOI)"
+            return check_doi_result(res, year), None
+
+    if 'arxiv' in ids:
+        item = LOCAL_INDEX.by_arxiv_id(ids['arxiv'])
+        if item:
+            record = {
+                "source": "Local Index (arXiv ID)",
+                "title": item['title'][0],
+                "url": item['URL'],
+                "doi": item['DOI'],
+                "authors": item['author'],
+                "year": extract_crossref_year(item)
+            }
+            res = check_identifier_result(record, clean_t, year)
+            if res['status'] == 'valid':
+                return res, None
+
+    items = LOCAL_INDEX.search(clean_t)
+    res = parse_crossref_search({'message': {'items': items}}, clean_t, author, year) if items else None
+    if res:
+        res['source'] = "Local Index"
+        if is_accepted(res):
+            res['status'] = 'valid'
+            return res, None
+    return None, res
+
+def entry_query(entry):
+    return clean_title(entry.get('title', '')), entry.get('author', ''), entry.get('year', '')
+
+SEARCH_SOURCES = [crossref_search_lookup, arxiv_lookup, semantic_scholar_lookup]
+SEARCHES = {
+    "crossref_search": crossref_search_lookup,
+    "arxiv": arxiv_lookup,
+    "semantic_scholar": semantic_scholar_lookup,
+}
+
+# "sequential" tries the sources one after another, "parallel" fires them all
+# at once and "hedged" starts the next source only if the previous one has not
+# produced an accepted match within HEDGE_DELAY seconds.
+# Seconds one entry may spend on lookups before its remaining sources are
+# skipped (None: no limit); see also http_client.set_run_deadline
+ENTRY_DEADLINE = None
+
+SOURCE_MODE = "sequential"
+SOURCE_MODES = ("sequential", "parallel", "hedged")
+HEDGE_DELAY = 1.0
+MAX_SOURCE_WORKERS = 32
+
+_source_executor = None
+_source_executor_lock = threading.Lock()
+
+def get_source_executor():
+    global _source_executor
+    with _source_executor_lock:
+        if _source_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _source_executor = ThreadPoolExecutor(max_workers=MAX_SOURCE_WORKERS, thread_name_prefix="source")
+        return _source_executor
+
+def pick_winner(results, pending):
+    # The first accepted result wins only once every higher-priority source has
+    # answered, so concurrent modes agree with the sequential order
+    for i, res in enumerate(results):
+        if i in pending:
+            return None
+        if is_accepted(res):
+            return i
+    return None
+
+class SourceRace:
+    # The state of a parallel or hedged search, indexed by source priority;
+    # run_race and async_engine.run_race_async only start, wait for and cancel
+    # the lookups it picks
+    def __init__(self, count, mode):
+        self.results = [None] * count
+        self.pending = set(range(count))
+        self.launched = count if mode == "parallel" else 1
+
+    def outcome(self):
+        # (result, candidates) once the search is decided, otherwise None
+        winner = pick_winner(self.results, self.pending)
+        if winner is not None:
+            return self.results[winner], self.results[:winner]
+        if not self.pending:
+            return None, self.results
+        return None
+
+    def cut_off(self):
+        # Sources ranked below an accepted result can no longer win; returns the
+        # rank of that result (every lookup after it is to be cancelled) or None
+        accepted = [i for i, res in enumerate(self.results) if i not in self.pending and is_accepted(res)]
+        if not accepted:
+            return None
+        cutoff = min(accepted)
+        self.pending = {i for i in self.pending if i < cutoff}
+        self.launched = len(self.results)
+        return cutoff
+
+    def timeout(self):
+        return HEDGE_DELAY if self.launched < len(self.results) else None
+
+    def answered(self, i, res):
+        self.pending.discard(i)
+        self.results[i] = res
+
+    def hedge(self, answered):
+        # Hedge: bring in the next source when the running ones are slow or have
+        # answered without an accepted match; returns its rank or None
+        if self.launched < len(self.results) and not any(is_accepted(self.results[i]) for i in answered):
+            self.launched += 1
+            return self.launched - 1
+        return None
+
+def run_race(lookups, mode):
+    cancel = threading.Event()
+
+    def run(lookup):
+        set_cancel_event(cancel)
+        try:
+            return run_steps(lookup)
+        finally:
+            set_cancel_event(None)
+
+    def launch(i):
+        futures[executor.submit(contextvars.copy_context().run, run, lookups[i])] = i
+
+    from concurrent.futures import wait, FIRST_COMPLETED
+    executor = get_source_executor()
+    race = SourceRace(len(lookups), mode)
+    futures = {}
+    for i in range(race.launched):
+        launch(i)
+
+    try:
+        while True:
+            outcome = race.outcome()
+            if outcome is not None:
+                return outcome
+
+            cutoff = race.cut_off()
+            if cutoff is not None:
+                for future, i in futures.items():
+                    if i > cutoff:
+                        future.cancel()
+
+            running = [f for f, i in futures.items() if i in race.pending]
+            done = wait(running, timeout=race.timeout(), return_when=FIRST_COMPLETED).done if running else set()
+            for future in done:
+                try:
+                    res = future.result()
+                except Exception:
+                    res = None
+                race.answered(futures[future], res)
+
+            hedge = race.hedge([futures[f] for f in done])
+            if hedge is not None:
+                launch(hedge)
+    finally:
+        cancel.set()
+        for future in futures:
+            future.cancel()
+
+def search_steps(lookups, mode=None):
+    # (accepted result or None, the candidates ranked above it)
+    mode = mode or SOURCE_MODE
+    if mode != "sequential":
+        return (yield Race(lookups, mode))
+
+    candidates = []
+    for lookup in lookups:
+        res = yield from lookup
+        if is_accepted(res):
+            return res, candidates
+        candidates.append(res)
+    return None, candidates
+
+def search_sources(clean_t, author, year, sources=None, mode=None):
+    return run_steps(search_steps([search(clean_t, author, year) for search in sources or SEARCH_SOURCES], mode))
+
+def identifier_steps(ids, clean_t, year):
+    id_res = None
+    if 'arxiv' in ids:
+        record = yield from id_lookup("arxiv_id", ids['arxiv'])
+        if record:
+            id_res = check_identifier_result(record, clean_t, year)
+
+    s2_id = s2_lookup_id(ids)
+    if s2_id and not (id_res and id_res['status'] == 'valid'):
+        record = yield from id_lookup("s2_id", s2_id)
+        if record:
+            id_res = check_identifier_result(record, clean_t, year)
+    return id_res
+
+def verification_steps(entry):
+    clean_t, author, year = entry_query(entry)
+
+    if not clean_t:
+         return {"status": "error", "reason": "No Title provided"}
+
+    if run_deadline_passed():
+        return run_deadline_result()
+
+    ids = extract_identifiers(entry)
+    failures = track_failures()
+    start_entry_deadline(ENTRY_DEADLINE)
+
+    # The local index is a read-only mmap lookup, cheap enough for either engine to run inline
+    local_res, local_candidate = verify_with_local_index(ids, clean_t, author, year)
+    if local_res:
+        return local_res
+    if OFFLINE:
+        return summarize_candidates([local_candidate], "the local index")
+
+    if 'doi' in ids:
+        res = yield from crossref_doi_lookup(ids['doi'])
+        if res:
+            return check_doi_result(res, year)
+
+    id_res = yield from identifier_steps(ids, clean_t, year)
+    if id_res and id_res['status'] == 'valid':
+        return id_res
+
+    # Sources in the order the scheduler expects to be cheapest for this entry
+    route = scheduler.SCHEDULER.route(entry, clean_t, author, year, failures)
+    res, candidates = yield from search_steps(scheduler.SCHEDULER.timed_lookups(route, SEARCHES, clean_t, author, year))
+    if SOURCE_MODE == "sequential":
+        scheduler.SCHEDULER.finish(route)
+    if res:
+        res['status'] = 'valid'
+        return res
+
+    # A resolvable identifier with a mismatching title says more than a weak search hit
+    if id_res:
+        return id_res
+    return summarize_candidates([local_candidate] + candidates, failures=failures)
+
+def verify_citation(entry):
+    return run_steps(verification_steps(entry))
@@ -0,0 +1,41 @@
+import io
+
+from src.bib_parser import iter_bibtex, parse_bibtex_string
+
+
+def parse_with_errors(text):
+    errors = []
+    entries = list(iter_bibtex(io.StringIO(text), on_error=lambda line, message: errors.append((line, message))))
+    return entries, errors
+
+
+def test_two_entries_on_one_line():
+    entries, errors = parse_with_errors("@article{a,title={A}} @article{b,title={B}}\n")
+    assert [(e['ID'], e['title']) for e in entries] == [('a', 'A'), ('b', 'B')]
+    assert errors == []
+
+
+def test_entry_after_closing_delimiter_of_parenthesized_entry():
+    entries = parse_bibtex_string("@book(a, title={A}) % note\n@misc{b,\n  title={B}\n} @misc{c, title={C}}\n")
+    assert [e['ID'] for e in entries] == ['a', 'b', 'c']
+
+
+def test_at_sign_line_inside_field_value_stays_in_entry():
+    text = (
+        "@article{a,\n"
+        "  title={A},\n"
+        "  abstract={Design still relies on expert knowledge.\n"
+        "@ each design stage, learning shortens the loop.},\n"
+        "  year={2022}\n"
+        "}\n"
+        "@article{b, title={B}}\n"
+    )
+    entries, errors = parse_with_errors(text)
+    assert [(e['ID'], e.get('year')) for e in entries] == [('a', '2022'), ('b', None)]
+    assert errors == []
+
+
+def test_unclosed_entry_is_reported_and_next_entry_kept():
+    entries, errors = parse_with_errors("@article{a, title={A\n@article{b, title={B}}\n")
+    assert [e['ID'] for e in entries] == ['b']
+    assert [line for line, _ in errors] == [1]
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from src import verifier
+
+
+def original_client_key(prefix, data):
+    # How the JSON-cache client keyed its entries
+    return hashlib.md5(f"{prefix}:{data}".encode('utf-8')).hexdigest()
+
+
+def test_search_key_keeps_symbols():
+    key = verifier.search_cache_key
+    assert key("crossref_search", "C++ templates") != key("crossref_search", "C templates")
+    assert key("crossref_search", "Deep  Learning.", "LeCun, Y.", "2015") == \
+        key("crossref_search", "deep learning", "Yann LeCun", "2015")
+
+
+def test_search_key_unchanged_for_plain_titles():
+    # Entries cached before symbols were kept stay reachable
+    words = "attention is all you need"
+    assert verifier.search_cache_key("arxiv", "Attention Is All You Need", "Vaswani, A.", "2017") == \
+        verifier.get_cache_key("arxiv", f"{words}|vaswani|2017")
+
+
+def test_migrated_legacy_entries_are_rekeyed(tmp_path, monkeypatch):
+    title, author, year = "Semi-Supervised Classification with Graph Convolutional Networks", "Kipf, Thomas N", "2016"
+    doi = "https://doi.org/10.1000/ABC"
+    search_hit = {"title": title, "url": "", "doi": "", "score": 100.0, "final_score": 100,
+                  "source": "Crossref (Search)", "authors": [], "year": 2016}
+    doi_hit = {"status": "valid", "source": "Crossref (DOI)", "title": title, "url": "", "year": 2016, "score": 100}
+    monkeypatch.chdir(tmp_path)
+    with open(".citation_cache.json", "w", encoding="utf-8") as f:
+        json.dump({original_client_key("crossref_search", f"{title}_{author}_{year}"): search_hit,
+                   original_client_key("crossref_doi", doi): doi_hit}, f)
+    verifier.load_cache("sqlite", str(tmp_path / "cache.db"))
+    try:
+        assert verifier.LEGACY_ENTRIES
+        assert verifier.verify_by_crossref_search(title, author, year) == search_hit
+        assert verifier.verify_by_crossref_doi(doi) == doi_hit
+        assert verifier.get_cache().get(verifier.search_cache_key("crossref_search", title, author, year)) == search_hit
+        assert verifier.get_cache().get(verifier.get_cache_key("crossref_doi", "10.1000/abc")) == doi_hit
+    finally:
+        verifier.load_cache("memory")
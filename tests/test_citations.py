@@ -0,0 +1,11 @@
+from src.citations import tex_citations
+
+
+def test_capitalized_cite_commands():
+    text = r"\Cite{a} and \Citet{b}; \Citep[p.~3]{c}. \Autocite{d} \Textcites{e}{f} \Parencite*{g}"
+    assert tex_citations(text) == ['a', 'b', 'c', 'd', 'e', 'f', 'g']
+
+
+def test_lowercase_cite_commands_and_non_citations():
+    text = r"\citestyle{authoryear} \citep[see][]{a,b} \nocite{c} % \cite{commented}" + "\n\\textcites(pre)(post){d}{e}"
+    assert tex_citations(text) == ['a', 'b', 'c', 'd', 'e']
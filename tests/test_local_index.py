@@ -0,0 +1,36 @@
+import json
+
+from src.local_index import LocalIndex, build_index
+
+ITEMS = [
+    {"title": ["Attention Is All You Need"], "DOI": "10.5555/Attention", "issued": {"date-parts": [[2017]]},
+     "author": [{"family": "Vaswani", "given": "Ashish"}]},
+    {"title": ["Attention Mechanisms in Graph Networks"], "DOI": "10.5555/graph", "issued": {"date-parts": [[2019]]},
+     "author": [{"family": "Kim", "given": "Jin"}]},
+    {"title": ["Deep Residual Learning for Image Recognition"], "DOI": "", "issued": {"date-parts": [[2016]]},
+     "author": [{"family": "He", "given": "Kaiming"}, {"family": "Zhang", "given": "Xiangyu"}]},
+]
+
+
+def make_index(tmp_path):
+    snapshot = tmp_path / "crossref.jsonl"
+    snapshot.write_text(''.join(json.dumps(item) + "\n" for item in ITEMS), encoding='utf-8')
+    path = str(tmp_path / "index.db")
+    build_index(path, crossref_paths=[str(snapshot)])
+    return LocalIndex(path)
+
+
+def test_search_ranks_records_sharing_most_tokens_first(tmp_path):
+    index = make_index(tmp_path)
+    items = index.search("Attention is all you need")
+    assert [i["title"][0] for i in items] == ["Attention Is All You Need", "Attention Mechanisms in Graph Networks"]
+    assert items[0]["author"] == [{"family": "Vaswani", "given": "Ashish"}]
+    assert items[0]["issued"] == {"date-parts": [[2017]]}
+    assert index.search("Residual image recognition")[0]["author"][1] == {"family": "Zhang", "given": "Xiangyu"}
+    assert index.search("Unrelated words only") == []
+
+
+def test_doi_lookup_skips_records_without_doi(tmp_path):
+    index = make_index(tmp_path)
+    assert index.by_doi("10.5555/ATTENTION")["title"] == ["Attention Is All You Need"]
+    assert index.by_doi("") is None
@@ -0,0 +1,23 @@
+import xml.etree.ElementTree as ET
+
+from src.report import render_junit, summary_counts
+
+
+def test_junit_counts_failures_and_errors_separately(tmp_path):
+    records = [
+        {"id": "ok", "title": "A", "result": {"status": "valid"}},
+        {"id": "missing", "title": "B", "result": {"status": "not_found", "reason": "No match"}},
+        {"id": "offline", "title": "C", "result": {"status": "unavailable", "reason": "timeout"}},
+        {"id": "crashed", "title": "D", "error": "KeyError: 'title'"},
+    ]
+    path = tmp_path / "report.xml"
+    render_junit(str(path), {"report": "refs_report.jsonl"}, records, summary_counts(records))
+
+    root = ET.parse(path).getroot()
+    suite = root.find("testsuite")
+    for element in (root, suite):
+        assert element.get("failures") == "1"
+        assert element.get("errors") == "1"
+    assert suite.get("skipped") == "1"
+    assert len(suite.findall("testcase/failure")) == 1
+    assert len(suite.findall("testcase/error")) == 1